@@ -1,30 +1,78 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-import uvicorn
-from fastapi.staticfiles import StaticFiles
 from routes.image_routes import router as image_router
+from routes.resource_routes import router as resource_router
+from routes.system_routes import router as system_router
+from utils.executor import shutdown_executor, run_blocking
+from utils.static_files import CachedStaticFiles
+from utils.http_client import close_async_client
+from utils.fast_json import FastJSONResponse
+from utils.compression import CompressionMiddleware
+from core.image_generator import get_image_generator
+from core.health import get_health_monitor
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 图像生成器（工作线程）在服务启动时创建，导入模块不产生副作用
+    generator = await run_blocking(get_image_generator)
+    # 恢复上一个进程停止前交接的任务
+    resumed = await run_blocking(generator.resume)
+    if resumed:
+        print(f"已恢复上次停止前未完成的任务: {resumed}")
+    # 预热模板和后端连接，可通过环境变量 STARTUP_WARMUP=0 关闭
+    app.state.warmup = None
+    if os.getenv("STARTUP_WARMUP", "1") != "0":
+        app.state.warmup = await run_blocking(generator.warmup)
+    # 启动时预压缩前端页面资源
+    await run_blocking(web_ui_static.precompress)
+    # 先完成一次就绪检查，之后由后台线程定期刷新
+    health_monitor = get_health_monitor()
+    await run_blocking(health_monitor.probe)
+    health_monitor.start()
+    yield
+    # 排空：等待执行中的任务完成，未完成的任务交给下一个进程，等待时间由 SHUTDOWN_DRAIN_TIMEOUT 控制（秒）
+    drained = await run_blocking(generator.drain, float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30")))
+    print(f"停止前排空完成: 完成 {drained['finished']} 个，交接 {drained['handed_off']} 个")
+    health_monitor.stop()
+    # 关闭共享连接池和线程池
+    await close_async_client()
+    shutdown_executor()
+    generator.shutdown()
 
 # 创建FastAPI应用
-app = FastAPI(title="ComfyUI API", description="ComfyUI API服务，提供图像生成功能")
+app = FastAPI(title="ComfyUI API", description="ComfyUI API服务，提供图像生成功能", lifespan=lifespan,
+              default_response_class=FastJSONResponse)
+
+# 响应压缩（br/gzip），压缩阈值由环境变量 COMPRESS_MIN_SIZE 控制（字节）
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESS_MIN_SIZE", "1024")))
 
 # 注册路由
 app.include_router(image_router)
+app.include_router(system_router)
+# 生成图像的访问路由（支持缩放参数），需在静态文件路由之前注册
+app.include_router(resource_router)
 # 添加静态文件路由
-app.mount("/resources", StaticFiles(directory="resources"), name="resources")
-# 添加web_ui前端页面静态路由
-app.mount("/", StaticFiles(directory="web_ui", html=True), name="web_ui")
-import threading
+app.mount("/resources", CachedStaticFiles(directory="resources", immutable_prefixes=("img",)), name="resources")
+# 添加web_ui前端页面静态路由（预压缩，强ETag）
+web_ui_static = CachedStaticFiles(directory="web_ui", html=True, precompress=True)
+app.mount("/", web_ui_static, name="web_ui")
 def start_proxy():
     from proxy.proxy import run_proxy
     run_proxy()
 if __name__ == "__main__":
-    import os
     import sys
+    import uvicorn
     for arg in sys.argv:
         if arg.startswith("comfyui_server=") and len(arg.split("=")) > 1:
             os.environ["COMFYUI_SERVER"] = arg.split("=")[1]
             break
     # threading.Thread(target=start_proxy).start()
-    uvicorn.run("app:app", host="0.0.0.0", port=8081, reload=True)
\ No newline at end of file
+    # 热重载会额外启动监视进程并扫描文件，只在开发时通过 --reload 或 UVICORN_RELOAD=1 开启
+    reload = "--reload" in sys.argv or os.getenv("UVICORN_RELOAD") == "1"
+    # 多进程部署需同时设置 TASK_STORE=sqlite，各进程共享任务表和待执行队列
+    workers = int(os.getenv("UVICORN_WORKERS", "1"))
+    uvicorn.run("app:app", host="0.0.0.0", port=8081, reload=reload, workers=None if reload else workers)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ComfyUI后端状态快照
+
+每个后端一个后台线程，按各自的间隔刷新队列、历史记录增量、内部日志和系统状态并保存在内存中。
+状态接口、进度查询和等待生成结果的工作线程直接读取最近的快照，不再各自请求后端，
+等待中的任务数增加时后端请求数不变
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+# 数据源 -> 接口路径
+SOURCES = {
+    "queue": "/api/queue",
+    "history": "/api/history",
+    "logs": "/internal/logs/raw",
+    "system_stats": "/api/system_stats",
+}
+
+class Snapshot:
+    """
+    某个数据源最近一次刷新的结果
+    """
+    __slots__ = ("data", "updated_at", "error")
+
+    def __init__(self, data: Any, updated_at: float, error: Optional[str] = None):
+        self.data = data  # 最近一次成功获取的数据
+        self.updated_at = updated_at  # 最近一次成功获取的时间（monotonic）
+        self.error = error  # 最近一次刷新失败的原因，成功后清空
+
+    @property
+    def age(self) -> float:
+        """
+        距最近一次成功刷新的秒数
+        """
+        return time.monotonic() - self.updated_at
+
+class BackendSnapshotRefresher:
+    """
+    后台刷新后端状态快照
+    """
+    def __init__(self, client, intervals: Dict[str, float], history_items: int = 64, history_capacity: int = 1000):
+        """
+        Args:
+            client: ComfyUI客户端，使用其连接池和请求方法
+            intervals: 数据源 -> 刷新间隔（秒），不大于0时不刷新该数据源
+            history_items: 每次刷新获取的最近历史记录条数（增量）
+            history_capacity: 内存中保留的历史记录条数
+        """
+        self.client = client
+        self.intervals = {name: intervals.get(name, 0) for name in SOURCES}
+        self.history_items = history_items
+        self.history_capacity = history_capacity
+        self._snapshots = {}
+        self._history = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        """
+        刷新线程是否在运行
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        启动刷新线程（重复调用无影响）
+        """
+        if self.running or not any(interval > 0 for interval in self.intervals.values()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="comfyui-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止刷新线程
+        """
+        self._stop.set()
+
+    def _run(self):
+        due = dict.fromkeys((name for name, interval in self.intervals.items() if interval > 0), 0.0)
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for name in due:
+                if due[name] <= now:
+                    self.refresh(name)
+                    due[name] = time.monotonic() + self.intervals[name]
+            self._stop.wait(max(0.0, min(due.values()) - time.monotonic()))
+
+    def refresh(self, name: str):
+        """
+        立即刷新一个数据源，失败时保留上一次的数据并记录错误
+        """
+        try:
+            if name == "history":
+                data = self._refresh_history()
+            else:
+                response = self.client._request("GET", SOURCES[name])
+                if response.status_code != 200:
+                    raise Exception(f"HTTP {response.status_code}")
+                data = response.json()
+        except Exception as e:
+            with self._lock:
+                previous = self._snapshots.get(name)
+                if previous is None:
+                    self._snapshots[name] = Snapshot(None, float("-inf"), str(e))
+                else:
+                    previous.error = str(e)
+            return
+        with self._lock:
+            self._snapshots[name] = Snapshot(data, time.monotonic())
+
+    def _refresh_history(self) -> int:
+        """
+        获取最近的历史记录并合并到内存中；返回的记录全部是新的时可能漏掉了更早的记录，再获取一次完整历史
+        """
+        response = self.client._request("GET", SOURCES["history"], params={"max_items": self.history_items})
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}")
+        items = response.json()
+        with self._lock:
+            known = sum(1 for prompt_id in items if prompt_id in self._history)
+            first = "history" not in self._snapshots or self._snapshots["history"].data is None
+        if len(items) >= self.history_items and not known and not first:
+            response = self.client._request("GET", SOURCES["history"])
+            if response.status_code != 200:
+                raise Exception(f"HTTP {response.status_code}")
+            items = response.json()
+        with self._lock:
+            for prompt_id, entry in items.items():
+                self._history[prompt_id] = entry
+                self._history.move_to_end(prompt_id)
+            while len(self._history) > self.history_capacity:
+                self._history.popitem(last=False)
+            return len(self._history)
+
+    def get(self, name: str) -> Optional[Snapshot]:
+        """
+        获取数据源的最近快照，尚未刷新过时返回None
+        """
+        with self._lock:
+            return self._snapshots.get(name)
+
+    def history_entry(self, prompt_id: str) -> Optional[Dict[str, Any]]:
+        """
+        从快照中获取prompt的历史记录，尚未出现时返回None
+        """
+        with self._lock:
+            return self._history.get(prompt_id)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        各数据源的刷新间隔、快照年龄（秒）和最近一次的错误
+        """
+        result = {}
+        with self._lock:
+            for name, interval in self.intervals.items():
+                snapshot = self._snapshots.get(name)
+                age = snapshot.age if snapshot is not None and snapshot.data is not None else None
+                result[name] = {
+                    "interval": interval,
+                    "age": round(age, 3) if age is not None else None,
+                    "error": snapshot.error if snapshot is not None else None,
+                }
+            result["history"]["cached"] = len(self._history)
+        return result
@@ -7,10 +7,21 @@ import json
 import time
 import uuid
 import requests
-from PIL import Image
-from io import BytesIO
 from datetime import datetime, timedelta
 import shutil
+import glob
+import threading
+from utils.output_index import get_output_index, describe_image
+from core.workflow_catalog import get_workflow_catalog, TEMPLATES_DIR
+from utils.metrics import BACKEND_REQUEST_SECONDS, BACKEND_ERRORS
+from client.comfyui_events import NodeProfiler, ComfyUIEventListener
+from client.backend_snapshot import BackendSnapshotRefresher
+
+class TaskCancelledError(Exception):
+    """
+    任务在等待生成结果期间被取消
+    """
+    pass
 
 class ComfyUIClient:
     """
@@ -20,6 +31,13 @@ class ComfyUIClient:
     template_data=None
     def set_workflow(self,flow_id="1.yml"):
         self.template_name=flow_id
+    @property
+    def template_name(self):
+        # 多个工作线程共享同一个客户端，模板名按线程保存，避免互相覆盖
+        return getattr(self._local, "template_name", self._default_template_name)
+    @template_name.setter
+    def template_name(self, value):
+        self._local.template_name = value
     def __init__(self, server_address="http://10.10.10.59:6700",template_name="1.yaml"):
         """
         初始化ComfyUI客户端
@@ -27,20 +45,117 @@ class ComfyUIClient:
         Args:
             server_address (str): ComfyUI服务器地址，默认为http://10.10.10.59:6700
         """
+        self._local = threading.local()
+        self._default_template_name = template_name
         self.template_name=template_name
         self.server_address = server_address
         self.client_id = str(uuid.uuid4())
-        self.node_execution_times = {}  # 记录节点执行时间
+        self.timeout = float(os.getenv("COMFYUI_TIMEOUT", "30"))  # 后端请求超时秒数，避免慢响应无限占用线程
+        # 复用连接池，预热时建立的连接可以被后续请求直接使用
+        pool_size = int(os.getenv("COMFYUI_POOL_SIZE", "10"))
+        self.session = requests.Session()
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.node_profiler = NodeProfiler()  # 按prompt记录节点执行时间
+        self.event_listener = ComfyUIEventListener(server_address, self.client_id, self.node_profiler)
+        # 后端状态快照，各调用方读取快照而不是各自请求后端
+        self.snapshots = BackendSnapshotRefresher(self, {
+            "queue": float(os.getenv("SNAPSHOT_QUEUE_INTERVAL", "1")),
+            "history": float(os.getenv("SNAPSHOT_HISTORY_INTERVAL", "1")),
+            "logs": float(os.getenv("SNAPSHOT_LOGS_INTERVAL", "1")),
+            "system_stats": float(os.getenv("SNAPSHOT_SYSTEM_STATS_INTERVAL", "10")),
+        }, history_items=int(os.getenv("SNAPSHOT_HISTORY_ITEMS", "64")))
         self.task_start_time = None     # 任务开始时间
-    def get_template(self):
-        # 获取当前文件的目录，然后构建绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        template_path = os.path.join(project_root, "resources", "templates", self.template_name)
-        import yaml
+
+    def _request(self, method, endpoint, **kwargs):
+        """
+        向ComfyUI服务器发送请求，记录请求耗时和错误数
+
+        Args:
+            method (str): HTTP方法
+            endpoint (str): 接口路径（不含查询参数），同时用作指标标签，如 /api/prompt
+            label (str): 指标标签，路径中包含ID时传入固定的模板，如 /api/history/{prompt_id}
+
+        Returns:
+            requests.Response: 响应对象
+        """
+        label = kwargs.pop("label", endpoint)
+        start = time.perf_counter()
         try:
-            self.template_data = yaml.load(open(template_path, "r", encoding="utf-8"),Loader=yaml.FullLoader)
-        except:
+            kwargs.setdefault("timeout", self.timeout)
+            response = self.session.request(method, f"{self.server_address}{endpoint}", **kwargs)
+        except requests.Timeout:
+            BACKEND_ERRORS.inc(labels=(label, "timeout"))
+            raise
+        except requests.RequestException:
+            BACKEND_ERRORS.inc(labels=(label, "connection"))
+            raise
+        finally:
+            BACKEND_REQUEST_SECONDS.observe(time.perf_counter() - start, (label,))
+        if response.status_code >= 400:
+            BACKEND_ERRORS.inc(labels=(label, str(response.status_code)))
+        return response
+    @property
+    def node_execution_times(self):
+        """
+        最近执行的prompt的节点耗时: prompt_id -> 节点ID -> {time, cached}
+        """
+        return {prompt_id: self.node_profiler.get(prompt_id) for prompt_id in self.node_profiler.prompt_ids()}
+
+    def start_event_listener(self):
+        """
+        启动执行事件监听（需要安装 websocket-client，设置环境变量 COMFYUI_EVENTS=0 时不启动）
+        """
+        if os.getenv("COMFYUI_EVENTS", "1") != "0":
+            self.event_listener.start()
+
+    def start_snapshot_refresher(self):
+        """
+        启动后端状态快照刷新线程（设置环境变量 BACKEND_SNAPSHOT=0 时不启动，各调用方直接请求后端）
+        """
+        if os.getenv("BACKEND_SNAPSHOT", "1") != "0":
+            self.snapshots.start()
+
+    def get_node_times(self, prompt_id, timeout=1.0):
+        """
+        获取prompt的节点执行耗时
+
+        Args:
+            prompt_id (str): prompt ID
+            timeout (float): 事件监听已连接时，等待结束事件的最长秒数
+
+        Returns:
+            dict: 节点ID -> {time, cached}，未采集到事件时为空
+        """
+        if self.event_listener.connected:
+            self.node_profiler.wait_finished(prompt_id, timeout)
+        return self.node_profiler.get(prompt_id)
+
+    def get_node_meta(self, template_name):
+        """
+        获取模板工作流中各节点的类型和标题
+
+        Returns:
+            dict: 节点ID -> {class_type, title}
+        """
+        data = get_workflow_catalog().get_template(template_name)
+        file = os.path.join(TEMPLATES_DIR, data.get("file", "")) if data else ""
+        if not file or not os.path.isfile(file):
+            return {}
+        workflow = get_workflow_catalog().load_workflow(file)
+        return {
+            node_id: {
+                "class_type": node.get("class_type"),
+                "title": (node.get("_meta") or {}).get("title", node.get("class_type")),
+            }
+            for node_id, node in workflow.items() if isinstance(node, dict)
+        }
+
+    def get_template(self):
+        # 模板配置由模板目录统一缓存，模板文件变化后自动刷新
+        self.template_data = get_workflow_catalog().get_template(self.template_name)
+        if self.template_data is None:
+            template_path = os.path.join(TEMPLATES_DIR, self.template_name)
             print(f"尝试加载的模板路径: {os.path.abspath(template_path)}")
             raise Exception(f"模板文件不存在: {template_path}")
         return self.template_data
@@ -53,15 +168,11 @@ class ComfyUIClient:
     def get_template_file(self):
         data=self.get_template()
         file=data.get("file","")
-        # 获取当前文件的目录，然后构建绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        file=os.path.join(project_root, "resources", "templates", file)
+        file=os.path.join(TEMPLATES_DIR, file)
         if not os.path.exists(file):
             raise Exception(f"模板文件不存在: {file}")
-        with open(file, "r", encoding="utf-8") as f:
-            workflow_template = json.load(f)
-        return workflow_template
+        # 返回缓存的工作流副本，调用方可以直接修改
+        return get_workflow_catalog().load_workflow(file)
     def get_workflow_template(self,params={},**kwargs):
         """
         获取基本的工作流模板
@@ -105,9 +216,31 @@ class ComfyUIClient:
                     workflow[node_id]["inputs"][param_name] = value
         return workflow
     
+    def get_workflow_seed(self, workflow):
+        """
+        读取工作流中实际使用的随机种子
+
+        模板args配置了seed时读取对应节点参数，否则取第一个带seed或noise_seed输入的节点
+
+        Returns:
+            int: 随机种子，工作流中没有时返回None
+        """
+        key = self.get_args().get("seed")
+        if key and "." in key:
+            node_id, param_name = key.split(".", 1)
+            value = workflow.get(node_id, {}).get("inputs", {}).get(param_name)
+            return value if isinstance(value, int) else None
+        for node in workflow.values():
+            inputs = node.get("inputs", {}) if isinstance(node, dict) else {}
+            for param_name in ("seed", "noise_seed"):
+                # 连线的输入是 [节点ID, 输出序号]，不是种子值
+                if isinstance(inputs.get(param_name), int) and not isinstance(inputs.get(param_name), bool):
+                    return inputs[param_name]
+        return None
+
     def generate_image(self, prompt="", negative_prompt="", width=512, height=512, 
                     batch_size=2,
-                    steps=None,cfg=None,seed=None,
+                    steps=None,cfg=None,seed=None,timings=None,submitted=None,
                      **kwargs):
         """
         生成图像
@@ -123,6 +256,8 @@ class ComfyUIClient:
             seed (int): 随机种子，-1表示随机
             model (str): 模型名称
             output_file (str): 输出文件名，如果为None则自动生成
+            timings (dict): 传入时写入各阶段耗时（秒）：render 生成工作流、submit 提交到服务器
+            submitted (dict): 传入时写入实际提交的参数：seed 工作流中的随机种子（未传seed时为模板中的值）
             **kwargs: 其他工作流参数，可以使用节点ID和参数名称的组合作为键，例如：
                      "95.sampler_name": "euler_ancestral" 将设置节点95的sampler_name参数
             
@@ -135,7 +270,10 @@ class ComfyUIClient:
         except Exception as e:
             print(f"自动清理缓存失败: {e}")
         
+        if timings is None:
+            timings = {}
         # 准备工作流
+        stage_start = time.perf_counter()
         workflow = self.get_workflow_template({
             "prompt": prompt,
             "negative_prompt": negative_prompt,
@@ -146,9 +284,9 @@ class ComfyUIClient:
             "cfg": cfg,
             "seed": seed,
         },**kwargs)
-        
-        
-       
+        timings["render"] = time.perf_counter() - stage_start
+        if submitted is not None:
+            submitted["seed"] = self.get_workflow_seed(workflow)
         
         # 发送请求
         prompt_data = {
@@ -156,27 +294,64 @@ class ComfyUIClient:
             "prompt": workflow
         }
         
-        # 发送请求到ComfyUI服务器
-        response = requests.post(f"{self.server_address}/api/prompt", json=prompt_data)
+        # 发送请求到ComfyUI服务器，之前先连接执行事件以记录节点耗时
+        self.start_event_listener()
+        self.start_snapshot_refresher()
+        stage_start = time.perf_counter()
+        response = self._request("POST", "/api/prompt", json=prompt_data)
         if response.status_code != 200:
             print(prompt_data)
             print(response)
             raise Exception(f"请求失败: {response.status_code} {response.text}")
         
         prompt_id = response.json()["prompt_id"]
+        timings["submit"] = time.perf_counter() - stage_start
         print(f"请求已发送，{self.template_name}正在等待生成结果 (Prompt ID: {prompt_id})...")
         print(workflow)
         return prompt_id
         
-    def status(self, prompt_id=None,task_id=""):
+    def status(self, prompt_id=None,task_id="",cancel_event=None,timings=None):
+        """
+        等待prompt执行完成并下载生成的图像
+
+        Args:
+            prompt_id (str): ComfyUI返回的prompt ID
+            task_id (str): 任务ID，用作本地保存目录
+            cancel_event (threading.Event): 取消信号，被设置时停止等待并抛出TaskCancelledError
+            timings (dict): 传入时写入各阶段耗时（秒）：wait 等待执行完成、download 下载输出、save 保存到本地；
+                ComfyUI历史记录带有执行时间戳时，wait 再拆分为 backend_queue（后端排队及轮询延迟）和 execute（后端执行）
+
+        Returns:
+            list: 图像信息列表，每项包含本地访问url
+        """
         if prompt_id is None:
             print("请提供有效的prompt_id")
             return
+        if timings is None:
+            timings = {}
         # 等待生成完成
         start_time = time.time()
+        wait_start = time.perf_counter()
+        # 快照刷新线程运行时读取快照，按快照的刷新间隔检查；定期直接查询一次该prompt，
+        # 覆盖快照增量中没有的记录（如重新关联的早已完成的prompt）
+        use_snapshot = self.snapshots.running
+        poll_interval = self.snapshots.intervals["history"] if use_snapshot else 5
+        next_direct = time.monotonic() + 30
         while True:
-            # 使用封装方法获取队列状态、历史记录和内部日志
-            history = self.get_history()
+            history = None
+            try:
+                if not use_snapshot:
+                    history = self.get_history()
+                else:
+                    entry = self.snapshots.history_entry(prompt_id)
+                    if entry is None and time.monotonic() >= next_direct:
+                        next_direct = time.monotonic() + 30
+                        history = self.get_history_item(prompt_id)
+                    elif entry is not None:
+                        history = {prompt_id: entry}
+            except requests.RequestException as e:
+                # 后端短暂超时或连接失败时继续等待
+                print(f"获取历史记录出错: {e}")
             current_time = time.time()
             elapsed_time = int(current_time - start_time)
             
@@ -187,10 +362,23 @@ class ComfyUIClient:
                 if status["completed"]:
                     elapsed_time = current_time - start_time
                     print(f"\r✅ 图像生成完成！耗时: {elapsed_time:.2f}秒" + " " * 50)
-                    # 打印任务摘要
-                    self.print_task_summary()
                     break
-            time.sleep(5)
+                if status.get("status_str") == "error":
+                    raise Exception(f"ComfyUI执行失败 (Prompt ID: {prompt_id})")
+            if cancel_event is not None:
+                if cancel_event.wait(poll_interval):
+                    raise TaskCancelledError(f"任务已取消 (Prompt ID: {prompt_id})")
+            else:
+                time.sleep(poll_interval)
+        
+        timings["wait"] = time.perf_counter() - wait_start
+        # 打印任务摘要
+        self.print_task_summary(prompt_id)
+        execute_time = self._execution_time(history[prompt_id]["status"])
+        if execute_time is not None:
+            timings["execute"] = execute_time
+            timings["backend_queue"] = max(0.0, timings["wait"] - execute_time)
+        timings["download"] = timings["save"] = 0.0
         
         # 获取生成的图像
         outputs = history[prompt_id]["outputs"]
@@ -200,27 +388,30 @@ class ComfyUIClient:
         
         images = outputs[key]["images"]
         index=0
+        indexed_files = []
         for image_data in images:
             filename = image_data["filename"]
             subfolder = image_data["subfolder"]
             filetype = image_data["type"]
             
-            # 下载图像
-            image_url = f"{self.server_address}/api/view?filename={filename}&subfolder={subfolder}&type={filetype}"
-            
             # 生成本地缓存URL
             output_file = self.get_file(task_id, index, ext=filename[filename.rfind("."):])
-            relative_path = output_file.replace(os.path.dirname(os.path.dirname(__file__)), "").replace("\\", "/")
-            local_url = f"/resources{relative_path}"
+            # 相对项目根目录的路径即为 /resources 静态路由下的访问URL
+            local_url = output_file.replace(os.path.dirname(os.path.dirname(__file__)), "").replace("\\", "/")
             
             # 下载并保存图片到缓存（无论save_images设置如何都要缓存）
-            image_response = requests.get(image_url)
+            stage_start = time.perf_counter()
+            image_response = self._request("GET", "/api/view", params={"filename": filename, "subfolder": subfolder, "type": filetype})
             if image_response.status_code != 200:
                 raise Exception(f"下载图像失败: {image_response.status_code}")
+            timings["download"] += time.perf_counter() - stage_start
             
             # 保存图像到缓存目录
+            stage_start = time.perf_counter()
             with open(output_file, "wb") as f:
                 f.write(image_response.content)
+            indexed_files.append(describe_image(local_url, image_response.content))
+            timings["save"] += time.perf_counter() - stage_start
             
             # 设置图片信息
             images[index]["url"] = local_url
@@ -231,13 +422,42 @@ class ComfyUIClient:
                 print(f"图像已缓存到本地: {local_url}")
             else:
                 print(f"图像已保存到: {output_file}")
+        
+        # 写入输出索引，之后按task_id/prompt_id直接查询，无需扫描目录
+        stage_start = time.perf_counter()
+        get_output_index().record(task_id, prompt_id, indexed_files)
+        timings["save"] += time.perf_counter() - stage_start
         return images
 
     
+    @staticmethod
+    def _execution_time(status):
+        """
+        从历史记录的状态消息中计算prompt在后端的执行耗时
+
+        Args:
+            status (dict): 历史记录中的 status 字段
+
+        Returns:
+            float: 执行耗时（秒），缺少时间戳时返回None
+        """
+        timestamps = {}
+        for message in status.get("messages") or []:
+            if len(message) > 1 and isinstance(message[1], dict) and "timestamp" in message[1]:
+                timestamps[message[0]] = message[1]["timestamp"]
+        if "execution_start" not in timestamps or "execution_success" not in timestamps:
+            return None
+        # ComfyUI的时间戳单位为毫秒，两个时间戳来自同一时钟
+        return max(0.0, (timestamps["execution_success"] - timestamps["execution_start"]) / 1000)
+
     # 打印任务摘要
     
     # 创建保存目录 ./res/img+月份
-    save_dir=os.path.join(os.path.dirname(os.path.dirname(__file__)), f"resources/img/{time.strftime("%m")}/")
+    img_root=os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources/img")
+    @property
+    def save_dir(self):
+        # 每次调用时计算当前月份，避免跨月后仍写入启动时的月份目录
+        return os.path.join(self.img_root, f"{time.strftime('%m')}/")
     def get_file(self,prompt_id,index=0,ext=".png"):
         save_dir = os.path.join(self.save_dir, f"{prompt_id}")
         os.makedirs(save_dir, exist_ok=True)
@@ -246,6 +466,41 @@ class ComfyUIClient:
         output_file = os.path.join(save_dir, f"{index}{ext}")
         return output_file
     
+    def url_to_path(self, url):
+        """
+        将 /resources 下的本地访问URL转换为文件路径
+
+        Args:
+            url (str): 本地访问URL，例如 /resources/img/11/<task_id>/0.png
+
+        Returns:
+            str: 文件绝对路径
+        """
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        resources_dir = os.path.join(project_root, "resources")
+        relative = url.split("?", 1)[0]
+        if not relative.startswith("/resources/"):
+            raise Exception(f"不是本地资源URL: {url}")
+        path = os.path.normpath(os.path.join(project_root, relative.lstrip("/")))
+        # 防止通过 .. 访问资源目录之外的文件
+        if not path.startswith(resources_dir + os.sep):
+            raise Exception(f"非法的资源路径: {url}")
+        return path
+
+    def cancel_prompt(self, prompt_id):
+        """
+        取消ComfyUI中的prompt：从等待队列中删除，正在执行时中断
+
+        Args:
+            prompt_id (str): prompt ID
+        """
+        self._request("POST", "/api/queue", json={"delete": [prompt_id]})
+        # 只有确认正在执行的是该prompt时才中断，避免误中断其他任务
+        queue_status = self.get_queue_status() or {}
+        running_ids = [item[1] for item in queue_status.get("queue_running", []) if len(item) > 1]
+        if prompt_id in running_ids:
+            self._request("POST", "/api/interrupt", json={"prompt_id": prompt_id})
+
     # 清除保存的文件
     def clean_files(self):
         # 删除保存目录及其内容（包括非空目录）
@@ -309,6 +564,7 @@ class ComfyUIClient:
                     else:
                         try:
                             shutil.rmtree(task_path)
+                            get_output_index().remove(task_dir)
                             print(f"已删除目录: {task_path} (修改时间: {datetime.fromtimestamp(dir_mtime).strftime('%Y-%m-%d %H:%M:%S')}, 大小: {self._format_size(dir_size)})")
                             deleted_dirs += 1
                             freed_space += dir_size
@@ -509,47 +765,48 @@ class ComfyUIClient:
         return old_size
     def get_workflows(self):
         """
-        获取template目录下所有的.yml和.yaml文件名
+        获取template目录下所有的.yml和.yaml模板
         
         Returns:
-            list: 工作流模板文件名列表
+            list: 工作流模板列表，每项包含名称和文件名
         """
-        import os
-        import glob
-        import yaml
-        # 获取template目录路径
-        templates_dir = os.path.join("./resources/templates")
-        
-        # 使用glob模块获取所有.yml和.yaml文件
-        yml_files = glob.glob(os.path.join(templates_dir, "*.yml"),recursive=True)
-        yaml_files = glob.glob(os.path.join(templates_dir, "*.yaml"),recursive=True)
-        
-        # 合并文件列表并只保留文件名（不含路径）
-        workflow_files = []
-        for file_path in yml_files + yaml_files:
-            data=yaml.load(open(file_path, "r", encoding="utf-8"), Loader=yaml.FullLoader) if yaml.load(open(file_path, "r", encoding="utf-8"), Loader=yaml.FullLoader)["name"] else os.path.basename(file_path)
-            workflow_files.append({
-                "name": data["name"],
-                "path": os.path.basename(file_path).replace("\\","/")
-            })
-            
-        return workflow_files
-    def get_files(self,prompt_id):
-        save_dir = os.path.join(self.save_dir, f"{prompt_id}")
-        
-        # 检查保存目录是否存在
-        file_root=save_dir.replace(os.path.dirname(os.path.dirname(__file__)),"").replace("\\","/")
-        if not os.path.exists(save_dir):
-            raise Exception(f"文件夹不存在: {file_root}")
-        domain=""
-        # 获取文件夹中的所有图像文件，并返回本地访问URL
-        files = [f"{domain}{os.path.join(file_root, f).replace('\\', '/')}" for f in os.listdir(save_dir) if f.endswith((".png", ".webp", ".jpg", ".jpeg"))]
+        return get_workflow_catalog().list_workflows()
+    def get_output_record(self,prompt_id):
+        """
+        获取任务输出文件的索引记录
+
+        Args:
+            prompt_id (str): 任务ID或ComfyUI的prompt ID
+
+        Returns:
+            dict: 索引记录，包含文件列表和ETag
+        """
+        output_index = get_output_index()
+        record = output_index.get(prompt_id)
+        if record is not None:
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            if all(os.path.exists(os.path.join(project_root, f["url"].lstrip("/"))) for f in record["files"]):
+                return record
+            # 输出文件已被清理
+            output_index.remove(record["task_id"])
+            raise Exception(f"文件已被清理: {prompt_id}")
+        
+        # 索引中没有记录（索引建立之前生成的文件），在所有月份目录中查找并补充索引
+        matches = glob.glob(os.path.join(glob.escape(self.img_root), "*", glob.escape(prompt_id)))
+        if not matches:
+            raise Exception(f"文件夹不存在: {prompt_id}")
+        save_dir = matches[0]
+        file_root = save_dir.replace(os.path.dirname(os.path.dirname(__file__)), "").replace("\\", "/")
+        files = []
+        for name in sorted(os.listdir(save_dir)):
+            if name.endswith((".png", ".webp", ".jpg", ".jpeg")):
+                with open(os.path.join(save_dir, name), "rb") as f:
+                    files.append(describe_image(f"{file_root}/{name}", f.read()))
         if not files:
             raise Exception(f"未找到任何图像文件: {file_root}")
-        
-        # 按文件名排序，确保顺序一致
-        files.sort()
-        return files
+        return output_index.record(prompt_id, None, files)
+    def get_files(self,prompt_id):
+        return [f["url"] for f in self.get_output_record(prompt_id)["files"]]
     def display_image(self, image_path):
         """
         显示生成的图像
@@ -558,19 +815,23 @@ class ComfyUIClient:
             image_path (str): 图像文件路径
         """
         try:
+            from PIL import Image
             img = Image.open(image_path)
             img.show()
         except Exception as e:
             print(f"无法显示图像: {e}")
     
-    def get_queue_status(self):
+    def get_queue_status(self, timeout=None):
         """
         获取ComfyUI服务器的队列状态
         
+        Args:
+            timeout (float): 请求超时秒数，默认使用 COMFYUI_TIMEOUT
+
         Returns:
             dict: 队列状态信息，包含运行中和等待中的任务
         """
-        response = requests.get(f"{self.server_address}/api/queue")
+        response = self._request("GET", "/api/queue", timeout=timeout or self.timeout)
         if response.status_code != 200:
             print(f"获取队列状态失败: {response.status_code}")
             return None
@@ -583,13 +844,45 @@ class ComfyUIClient:
         Returns:
             dict: 历史记录信息，包含已完成的任务
         """
-        response = requests.get(f"{self.server_address}/api/history")
+        response = self._request("GET", "/api/history")
         if response.status_code != 200:
             print(f"获取历史记录失败: {response.status_code}")
             return None
         return response.json()
+
+    def get_history_item(self, prompt_id):
+        """
+        获取单个prompt的历史记录
+        
+        Returns:
+            dict: {prompt_id: 历史记录}，尚未完成时为空字典
+        """
+        response = self._request("GET", f"/api/history/{prompt_id}", label="/api/history/{prompt_id}")
+        if response.status_code != 200:
+            print(f"获取历史记录失败: {response.status_code}")
+            return None
+        return response.json()
+
+    def get_queue_status_cached(self, max_age, timeout=None):
+        """
+        获取队列状态，优先使用后台刷新的快照
+
+        Args:
+            max_age (float): 快照的最大年龄（秒），快照不存在、过期或最近一次刷新失败时直接查询后端
+            timeout (float): 直接查询时的超时秒数
+
+        Returns:
+            dict: 队列状态信息
+        """
+        snapshot = self.snapshots.get("queue")
+        if snapshot is not None and snapshot.error is None and snapshot.age <= max_age:
+            return snapshot.data
+        return self.get_queue_status(timeout=timeout)
+
     def get_progress(self):
-        logs_data=self.get_logs()
+        # 快照刷新线程运行时读取最近的日志快照，不请求后端
+        snapshot = self.snapshots.get("logs") if self.snapshots.running else None
+        logs_data = snapshot.data if snapshot is not None and snapshot.data is not None else self.get_logs()
         if logs_data:
             try:
                 # 查找与当前prompt_id相关的日志
@@ -608,7 +901,7 @@ class ComfyUIClient:
         Returns:
             dict: 内部日志信息，包含详细的执行日志
         """
-        response = requests.get(f"{self.server_address}/internal/logs/raw")
+        response = self._request("GET", "/internal/logs/raw")
         if response.status_code != 200:
             print(f"获取内部日志失败: {response.status_code}")
             return None
@@ -627,98 +920,68 @@ class ComfyUIClient:
         Returns:
             tuple: (进度百分比, 当前节点信息, 节点执行统计, 详细进度信息)
         """
-        # 此方法已被修改，大部分逻辑移至主循环中
-        # 保留此方法以保持向后兼容性
+        # 保留此方法以保持向后兼容性，节点耗时来自执行事件
         
         # 初始化任务开始时间
         if self.task_start_time is None:
             self.task_start_time = current_time
             
-        # 从status中尝试获取进度信息（兼容旧版本）
         progress_percent = 0
         current_node_info = ""
-        node_stats = {}
         detailed_progress_info = None
+        prompt_id = status.get("prompt_id")
         
-        # 首先尝试从内部日志获取详细信息
+        # 从内部日志获取进度信息
         if logs_data:
-            prompt_id = None
-            if "prompt_id" in status:
-                prompt_id = status["prompt_id"]
-                
             for log_entry in logs_data:
                 if isinstance(log_entry, dict) and "prompt_id" in log_entry and log_entry["prompt_id"] == prompt_id:
                     if "progress" in log_entry:
                         progress_percent = int(log_entry["progress"] * 100)
-                    if "node" in log_entry:
-                        node_id = log_entry["node"]
-                        if node_id in self.node_execution_times and "start" in self.node_execution_times[node_id]:
-                            execution_time = current_time - self.node_execution_times[node_id]["start"]
-                            self.node_execution_times[node_id]["time"] = execution_time
-                            self.node_execution_times[node_id]["status"] = "已完成"
-                    
-                    # 获取更详细的进度信息
                     if "step" in log_entry and "total_steps" in log_entry:
-                        step = log_entry["step"]
-                        total_steps = log_entry["total_steps"]
-                        detailed_progress_info = f"步骤: {step}/{total_steps}"
-        
-        # 如果内部日志没有提供足够信息，回退到旧的API格式
-        if "messages" in status and status["messages"]:
-            for msg in status["messages"]:
-                if isinstance(msg, list) and len(msg) > 0:
-                    # 节点执行完成
-                    if msg[0] == "execution_cached" or msg[0] == "executed":
-                        if len(msg) > 1 and isinstance(msg[1], dict) and "node" in msg[1]:
-                            node_id = msg[1]["node"]
-                            if node_id in self.node_execution_times and "start" in self.node_execution_times[node_id]:
-                                execution_time = current_time - self.node_execution_times[node_id]["start"]
-                                self.node_execution_times[node_id]["time"] = execution_time
-                                self.node_execution_times[node_id]["status"] = "已完成"
+                        detailed_progress_info = f"步骤: {log_entry['step']}/{log_entry['total_steps']}"
         
         # 生成节点执行统计
-        for node_id, data in self.node_execution_times.items():
-            if "time" in data:
-                node_title = f"节点 {node_id}"
-                if node_id in workflow and "_meta" in workflow[node_id] and "title" in workflow[node_id]["_meta"]:
-                    node_title = workflow[node_id]["_meta"]["title"]
-                node_stats[node_id] = {
-                    "title": node_title,
-                    "time": data["time"],
-                    "status": data["status"]
-                }
+        node_stats = {}
+        for node_id, data in self.node_profiler.get(prompt_id).items():
+            node_title = f"节点 {node_id}"
+            if node_id in workflow and "_meta" in workflow[node_id] and "title" in workflow[node_id]["_meta"]:
+                node_title = workflow[node_id]["_meta"]["title"]
+            node_stats[node_id] = {
+                "title": node_title,
+                "time": data["time"],
+                "status": "已缓存" if data["cached"] else "已完成"
+            }
         
         return progress_percent, current_node_info, node_stats, detailed_progress_info
         
-    def print_task_summary(self):
+    def print_task_summary(self, prompt_id=None):
         """
-        打印任务执行摘要
+        打印任务执行摘要：各节点的执行耗时
+        
+        Args:
+            prompt_id (str): prompt ID，默认为最近一次执行的prompt
         """
-        if not self.node_execution_times or self.task_start_time is None:
+        if prompt_id is None:
+            prompt_ids = self.node_profiler.prompt_ids()
+            if not prompt_ids:
+                return
+            prompt_id = prompt_ids[-1]
+        node_times = self.get_node_times(prompt_id)
+        if not node_times:
             return
-            
-        total_time = time.time() - self.task_start_time
+        
+        meta = self.get_node_meta(self.template_name)
+        total_time = sum(data["time"] for data in node_times.values())
         print("\n" + "=" * 50)
-        print(f"任务执行摘要 (总耗时: {total_time:.2f}秒)")
+        print(f"任务执行摘要 (Prompt ID: {prompt_id}, 节点总耗时: {total_time:.2f}秒)")
         print("-" * 50)
         
-        # 按执行顺序排序节点
-        sorted_nodes = sorted(
-            [(k, v) for k, v in self.node_execution_times.items() if "time" in v],
-            key=lambda x: x[1]["start"]
-        )
-        
-        for node_id, data in sorted_nodes:
-            node_title = f"节点 {node_id}"
-            if "title" in data:
-                node_title = data["title"]
-            print(f"{node_title}: {data['time']:.2f}秒 ({data['status']})")
+        # 按执行顺序输出节点
+        for node_id, data in node_times.items():
+            node_title = meta.get(node_id, {}).get("title") or f"节点 {node_id}"
+            print(f"{node_title}: {data['time']:.2f}秒 ({'已缓存' if data['cached'] else '已完成'})")
             
         print("=" * 50)
-        
-        # 重置跟踪数据
-        self.node_execution_times = {}
-        self.task_start_time = None
 
 if __name__ == "__main__":
     # 简单的测试
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ComfyUI执行事件监听
+
+通过ComfyUI的WebSocket接口接收 executing / executed / execution_cached 等事件，
+按prompt记录每个节点的开始和结束时间。需要安装 websocket-client，未安装时不采集节点耗时
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+# prompt结束时的事件类型
+FINISH_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+class NodeProfiler:
+    """
+    根据执行事件计算每个prompt的节点耗时
+    """
+    def __init__(self, max_prompts: int = 1000):
+        """
+        Args:
+            max_prompts: 保留的prompt记录数，超过后丢弃最早的记录
+        """
+        self.max_prompts = max_prompts
+        self._profiles = OrderedDict()  # prompt_id -> 执行记录
+        self._cond = threading.Condition()
+
+    def _profile(self, prompt_id: str) -> Dict[str, Any]:
+        profile = self._profiles.get(prompt_id)
+        if profile is None:
+            profile = self._profiles[prompt_id] = {"nodes": {}, "current": None, "finished": False}
+            while len(self._profiles) > self.max_prompts:
+                self._profiles.popitem(last=False)
+        return profile
+
+    @staticmethod
+    def _finish_node(profile: Dict[str, Any], node_id: str, now: float):
+        node = profile["nodes"].get(node_id)
+        if node is None or node.get("running_since") is None:
+            return
+        node["time"] += now - node.pop("running_since")
+        if profile["current"] == node_id:
+            profile["current"] = None
+
+    def handle(self, message: Dict[str, Any], now: Optional[float] = None):
+        """
+        处理一条执行事件
+
+        Args:
+            message: WebSocket收到的JSON消息，包含 type 和 data
+            now: 事件接收时间，默认为当前时间
+        """
+        event = message.get("type")
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id or event not in ("execution_start", "execution_cached", "executing", "executed") + FINISH_EVENTS:
+            return
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            profile = self._profile(prompt_id)
+            if event == "execution_cached":
+                for node_id in data.get("nodes") or []:
+                    profile["nodes"].setdefault(str(node_id), {"time": 0.0, "cached": True})
+            elif event == "executing":
+                node_id = data.get("node")
+                node_id = None if node_id is None else str(node_id)
+                if profile["current"] is not None and profile["current"] != node_id:
+                    # 普通节点没有 executed 事件，下一个节点开始即表示上一个节点结束
+                    self._finish_node(profile, profile["current"], now)
+                if node_id is None:
+                    # node 为空表示整个prompt执行完毕
+                    profile["finished"] = True
+                else:
+                    node = profile["nodes"].setdefault(node_id, {"time": 0.0, "cached": False})
+                    node["running_since"] = now
+                    profile["current"] = node_id
+            elif event == "executed":
+                self._finish_node(profile, str(data.get("node")), now)
+            elif event in FINISH_EVENTS:
+                if profile["current"] is not None:
+                    self._finish_node(profile, profile["current"], now)
+                profile["finished"] = True
+            if profile["finished"]:
+                self._cond.notify_all()
+
+    def get(self, prompt_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        获取prompt的节点耗时
+
+        Returns:
+            dict: 节点ID -> {time, cached}，按开始执行的顺序排列
+        """
+        with self._cond:
+            profile = self._profiles.get(prompt_id)
+            if profile is None:
+                return {}
+            return {node_id: {"time": node["time"], "cached": node["cached"]} for node_id, node in profile["nodes"].items()}
+
+    def prompt_ids(self):
+        """
+        获取已记录的prompt ID，按时间从早到晚排列
+        """
+        with self._cond:
+            return list(self._profiles.keys())
+
+    def wait_finished(self, prompt_id: str, timeout: float) -> bool:
+        """
+        等待prompt的结束事件（历史记录可能先于最后的事件到达）
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: prompt_id in self._profiles and self._profiles[prompt_id]["finished"], timeout)
+
+class ComfyUIEventListener:
+    """
+    ComfyUI WebSocket事件监听线程，断线后自动重连
+    """
+    def __init__(self, server_address: str, client_id: str, profiler: NodeProfiler):
+        self.url = server_address.replace("https://", "wss://", 1).replace("http://", "ws://", 1) + f"/ws?clientId={client_id}"
+        self.profiler = profiler
+        self.connected = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def available() -> bool:
+        """
+        是否安装了 websocket-client
+        """
+        return websocket is not None
+
+    def start(self):
+        """
+        启动监听线程（重复调用无影响）
+        """
+        if websocket is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="comfyui-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止监听线程
+        """
+        self._stop.set()
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            ws = None
+            try:
+                ws = websocket.create_connection(self.url, timeout=5)
+                self.connected = True
+                backoff = 1.0
+                while not self._stop.is_set():
+                    try:
+                        message = ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    # 二进制消息为预览图，忽略
+                    if isinstance(message, str) and message:
+                        self.profiler.handle(json.loads(message))
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"ComfyUI事件连接断开: {e}，{backoff:.0f}秒后重连")
+            finally:
+                self.connected = False
+                if ws is not None:
+                    try:
+                        ws.close()
+                    except Exception:
+                        pass
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自适应并发控制
+
+控制同时提交到ComfyUI后端（在后端排队或执行中）的任务数。每个任务完成时根据后端队列长度调整上限（AIMD）：
+后端等待队列已空而本地还有任务在排队时加1，避免GPU在两个任务之间空闲；
+后端等待队列超过目标深度时减半，让任务留在本地队列，取消和优先级调整可以立即生效
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Dict, Any
+
+class AdaptiveLimiter:
+    """
+    AIMD并发上限
+    """
+    def __init__(self, initial: int = 3, minimum: int = 1, maximum: int = 8,
+                 target_depth: int = 1, decrease_factor: float = 0.5, rate_window: float = 300.0):
+        """
+        Args:
+            initial: 初始上限
+            minimum: 上限的最小值
+            maximum: 上限的最大值（工作线程数）
+            target_depth: 后端等待队列的目标深度，保持1个任务在等待即可让GPU连续工作
+            decrease_factor: 后端队列过深时上限的缩减比例
+            rate_window: 计算完成速率的时间窗口（秒）
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_depth = target_depth
+        self.decrease_factor = decrease_factor
+        self.rate_window = rate_window
+        self._limit = float(max(minimum, min(maximum, initial)))
+        self._reserved = 0  # 已被工作线程占用的名额（包括正在等待取任务的线程）
+        self._inflight = 0  # 已开始执行（提交到后端）尚未结束的任务数
+        self._cond = threading.Condition()
+        self._completions = deque()
+        self._adjustments = {"increase": 0, "decrease": 0}
+        self._last_backend = {"running": None, "pending": None}
+
+    @property
+    def limit(self) -> int:
+        """
+        当前并发上限
+        """
+        return int(self._limit)
+
+    def acquire(self, timeout: float) -> bool:
+        """
+        获取一个执行名额，达到上限时等待
+
+        Returns:
+            bool: 是否获取成功（超时返回False）
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._reserved < int(self._limit), timeout):
+                return False
+            self._reserved += 1
+            return True
+
+    def release(self):
+        """
+        归还执行名额
+        """
+        with self._cond:
+            self._reserved -= 1
+            self._cond.notify()
+
+    def task_started(self):
+        """
+        记录一个任务开始执行，只用于统计执行中的任务数
+        """
+        with self._cond:
+            self._inflight += 1
+
+    def task_finished(self):
+        """
+        记录一个任务执行结束
+        """
+        with self._cond:
+            self._inflight -= 1
+
+    def record_completion(self, now: float = None):
+        """
+        记录一个任务完成，用于计算完成速率
+        """
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            self._completions.append(now)
+            while self._completions and self._completions[0] < now - self.rate_window:
+                self._completions.popleft()
+
+    def update(self, backend_running: int, backend_pending: int, local_pending: int) -> int:
+        """
+        根据后端队列状态调整上限
+
+        Args:
+            backend_running: 后端执行中的任务数
+            backend_pending: 后端等待队列中的任务数
+            local_pending: 本地排队等待提交的任务数
+
+        Returns:
+            int: 调整后的上限
+        """
+        with self._cond:
+            self._last_backend = {"running": backend_running, "pending": backend_pending}
+            if backend_pending > self.target_depth:
+                self._limit = max(float(self.minimum), self._limit * self.decrease_factor)
+                self._adjustments["decrease"] += 1
+            elif backend_pending == 0 and local_pending > 0 and self._limit < self.maximum:
+                self._limit = min(float(self.maximum), float(int(self._limit) + 1))
+                self._adjustments["increase"] += 1
+            # 上限提高后唤醒等待名额的工作线程
+            self._cond.notify_all()
+            return int(self._limit)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        当前状态：上限、执行中的任务数、最近的后端队列、调整次数和完成速率（个/分钟）
+        """
+        now = time.monotonic()
+        with self._cond:
+            recent = [t for t in self._completions if t >= now - self.rate_window]
+            return {
+                "limit": int(self._limit),
+                "minimum": self.minimum,
+                "maximum": self.maximum,
+                "target_depth": self.target_depth,
+                "inflight": self._inflight,
+                "backend": dict(self._last_backend),
+                "adjustments": dict(self._adjustments),
+                "completions_per_minute": round(len(recent) * 60.0 / self.rate_window, 2),
+            }
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+延后通道
+
+低优先级的批量任务先写入SQLite（WAL模式），进程重启不会丢失；
+只在交互通道没有排队任务时，或在配置的时间窗口内，才按提交顺序放行到生成队列，
+白天的交互请求不会排在大批任务后面。多进程部署时各进程共用同一个数据库，放行时加写锁，任务只会被放行一次
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import datetime
+from typing import Optional, List, Dict, Any, Tuple
+
+from utils.paths import DATA_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deferred (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL UNIQUE,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_time REAL NOT NULL,
+    released_time REAL,
+    finished_time REAL
+);
+CREATE INDEX IF NOT EXISTS deferred_status ON deferred (status, seq);
+CREATE INDEX IF NOT EXISTS deferred_finished ON deferred (finished_time);
+"""
+
+# 任务在延后通道中的状态：waiting 等待放行，released 已放行到生成队列，之后为任务的结束状态
+STATUSES = ("waiting", "released", "completed", "failed", "cancelled")
+
+def parse_windows(spec: str) -> List[Tuple[int, int]]:
+    """
+    解析放行时间窗口
+
+    Args:
+        spec: 逗号分隔的本地时间段，如 "22:00-07:00,12:00-13:30"，结束时间早于开始时间表示跨午夜
+
+    Returns:
+        list: (开始分钟, 结束分钟) 列表
+
+    Raises:
+        ValueError: 格式错误
+    """
+    windows = []
+    for part in filter(None, (item.strip() for item in spec.split(","))):
+        try:
+            start, end = (datetime.datetime.strptime(value.strip(), "%H:%M") for value in part.split("-"))
+        except ValueError:
+            raise ValueError(f"放行时间窗口格式错误: {part}，应为 HH:MM-HH:MM")
+        windows.append((start.hour * 60 + start.minute, end.hour * 60 + end.minute))
+    return windows
+
+def in_windows(windows: List[Tuple[int, int]], now: Optional[datetime.datetime] = None) -> bool:
+    """
+    判断当前本地时间是否在任一放行时间窗口内
+    """
+    now = now or datetime.datetime.now()
+    minute = now.hour * 60 + now.minute
+    for start, end in windows:
+        if start <= end:
+            if start <= minute < end:
+                return True
+        elif minute >= start or minute < end:
+            return True
+    return False
+
+class DeferredQueue:
+    """
+    基于SQLite的延后任务队列
+    """
+    def __init__(self, db_path: str, retention: float = 7 * 86400, rate_window: float = 3600.0):
+        """
+        Args:
+            db_path: 数据库路径，多进程部署时所有进程必须使用同一个文件
+            retention: 已结束任务的保留时间（秒），过期后由 purge 删除，进度统计只包含保留期内的任务
+            rate_window: 计算完成速率（用于估算剩余时间）的时间窗口（秒）
+        """
+        self.db_path = db_path
+        self.retention = retention
+        self.rate_window = rate_window
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, task_id: str, params: Dict[str, Any], created_time: float):
+        """
+        写入延后任务，等待放行
+        """
+        self._conn().execute(
+            "INSERT INTO deferred (task_id, params, status, created_time) VALUES (?, ?, 'waiting', ?)",
+            (task_id, json.dumps(params, ensure_ascii=False), created_time),
+        )
+
+    def release(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        按提交顺序放行最多 limit 个等待中的任务
+
+        Returns:
+            list: 放行的任务记录 {task_id, params, created_time}
+        """
+        if limit <= 0:
+            return []
+        conn = self._conn()
+        # 先用只读查询判断，没有等待中的任务时不获取写锁
+        if conn.execute("SELECT 1 FROM deferred WHERE status = 'waiting' LIMIT 1").fetchone() is None:
+            return []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT task_id, params, created_time FROM deferred WHERE status = 'waiting' ORDER BY seq LIMIT ?",
+                (limit,),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE deferred SET status = 'released', released_time = ? WHERE task_id = ?",
+                [(time.time(), row[0]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [{"task_id": row[0], "params": json.loads(row[1]), "created_time": row[2]} for row in rows]
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        取消尚未放行的任务
+
+        Returns:
+            bool: 是否取消成功（任务不存在或已放行时返回False）
+        """
+        cursor = self._conn().execute(
+            "UPDATE deferred SET status = 'cancelled', finished_time = ? WHERE task_id = ? AND status = 'waiting'",
+            (time.time(), task_id),
+        )
+        return cursor.rowcount > 0
+
+    def finish(self, task_id: str, status: str):
+        """
+        记录已放行任务的结束状态
+        """
+        self._conn().execute(
+            "UPDATE deferred SET status = ?, finished_time = ? WHERE task_id = ? AND status = 'released'",
+            (status, time.time(), task_id),
+        )
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询单个任务记录
+        """
+        row = self._conn().execute(
+            "SELECT task_id, params, status, created_time, finished_time FROM deferred WHERE task_id = ?",
+            (task_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"task_id": row[0], "params": json.loads(row[1]), "status": row[2],
+                "created_time": row[3], "finished_time": row[4]}
+
+    def waiting_count(self) -> int:
+        """
+        等待放行的任务数
+        """
+        return self._conn().execute("SELECT COUNT(*) FROM deferred WHERE status = 'waiting'").fetchone()[0]
+
+    def progress(self) -> Dict[str, Any]:
+        """
+        延后任务的进度：各状态的任务数、最早的等待任务的提交时间、最近的完成速率和预计剩余时间
+
+        剩余时间按最近 rate_window 秒内的完成速率估算，期间没有任务完成时为None
+        """
+        conn = self._conn()
+        now = time.time()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(conn.execute("SELECT status, COUNT(*) FROM deferred GROUP BY status").fetchall())
+        oldest = conn.execute("SELECT MIN(created_time) FROM deferred WHERE status = 'waiting'").fetchone()[0]
+        recent = conn.execute(
+            "SELECT COUNT(*) FROM deferred WHERE finished_time > ? AND status IN ('completed', 'failed')",
+            (now - self.rate_window,),
+        ).fetchone()[0]
+        rate = recent / self.rate_window
+        remaining = counts["waiting"] + counts["released"]
+        total = sum(counts.values())
+        if not remaining:
+            eta = 0
+        elif rate:
+            eta = round(remaining / rate)
+        else:
+            eta = None
+        return {
+            "counts": counts,
+            "total": total,
+            "done": total - remaining,
+            "percent": round((total - remaining) * 100.0 / total, 2) if total else 100.0,
+            "oldest_waiting_time": oldest,
+            "completions_per_hour": round(rate * 3600, 2),
+            "eta_seconds": eta,
+        }
+
+    def purge(self) -> int:
+        """
+        删除超过保留时间的已结束任务
+
+        Returns:
+            int: 删除的任务数
+        """
+        cursor = self._conn().execute(
+            "DELETE FROM deferred WHERE status IN ('completed', 'failed', 'cancelled') AND finished_time < ?",
+            (time.time() - self.retention,),
+        )
+        return cursor.rowcount
+
+_deferred_queue = None
+_deferred_queue_lock = threading.Lock()
+
+def get_deferred_queue() -> DeferredQueue:
+    """
+    获取延后任务队列，懒加载模式
+
+    数据库路径由 DEFERRED_DB 控制（默认为数据目录下的 deferred.db），
+    已结束任务的保留时间由 DEFERRED_RETENTION 控制（秒，默认7天）
+    """
+    global _deferred_queue
+    if _deferred_queue is None:
+        with _deferred_queue_lock:
+            if _deferred_queue is None:
+                _deferred_queue = DeferredQueue(
+                    os.getenv("DEFERRED_DB", os.path.join(DATA_DIR, "deferred.db")),
+                    retention=float(os.getenv("DEFERRED_RETENTION", str(7 * 86400))),
+                )
+    return _deferred_queue
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+服务健康检查
+
+后台线程定期检查模板加载、工作线程和ComfyUI后端（可达性、队列长度），
+/readyz 只读取缓存的检查结果，探测请求不随负载均衡的检查频率增加后端压力
+"""
+
+import os
+import time
+import threading
+from typing import Dict, Any
+
+from core.workflow_catalog import get_workflow_catalog
+
+class HealthMonitor:
+    """
+    定期执行就绪检查并缓存结果
+    """
+    def __init__(self, generator, interval: float = 5.0, max_backend_queue: int = 10, probe_timeout: float = 3.0):
+        """
+        Args:
+            generator: 图像生成器实例
+            interval: 检查间隔（秒），结果超过3个间隔未更新视为不就绪
+            max_backend_queue: 后端队列（运行中+等待中）达到该数量时视为饱和，不就绪
+            probe_timeout: 查询后端队列的超时秒数
+        """
+        self.generator = generator
+        self.interval = interval
+        self.max_backend_queue = max_backend_queue
+        self.probe_timeout = probe_timeout
+        self._result = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _check_templates(self) -> Dict[str, Any]:
+        catalog = get_workflow_catalog()
+        count = len(catalog.list_workflows())
+        errors = dict(catalog.errors)
+        return {"ok": count > 0 and not errors, "count": count, "errors": errors}
+
+    def _check_workers(self) -> Dict[str, Any]:
+        generator = self.generator
+        alive = sum(1 for worker in list(generator.workers) if worker.is_alive())
+        return {
+            "ok": generator.running and generator.accepting and alive > 0,
+            "running": generator.running,
+            "accepting": generator.accepting,
+            "alive": alive,
+            "total": generator.max_workers,
+        }
+
+    def _check_backend(self) -> Dict[str, Any]:
+        result = {"ok": False, "reachable": False, "queue_running": None, "queue_pending": None,
+                  "latency": None, "error": None}
+        start = time.perf_counter()
+        try:
+            # 快照不超过一个检查间隔时直接使用，否则查询后端
+            queue_status = self.generator.client.get_queue_status_cached(self.interval, timeout=self.probe_timeout)
+        except Exception as e:
+            result["error"] = str(e)
+            return result
+        result["latency"] = round(time.perf_counter() - start, 4)
+        if queue_status is None:
+            result["error"] = "查询后端队列失败"
+            return result
+        result["reachable"] = True
+        result["queue_running"] = len(queue_status.get("queue_running", []))
+        result["queue_pending"] = len(queue_status.get("queue_pending", []))
+        depth = result["queue_running"] + result["queue_pending"]
+        if depth >= self.max_backend_queue:
+            result["error"] = f"后端队列已饱和: {depth} >= {self.max_backend_queue}"
+        else:
+            result["ok"] = True
+        return result
+
+    def probe(self) -> Dict[str, Any]:
+        """
+        立即执行一次检查并更新缓存结果
+        """
+        checks = {
+            "templates": self._check_templates(),
+            "workers": self._check_workers(),
+            "backend": self._check_backend(),
+        }
+        self._result = {
+            "ready": all(check["ok"] for check in checks.values()),
+            "checked_at": time.time(),
+            "checks": checks,
+        }
+        return self._result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取最近一次的检查结果，不访问后端
+
+        Returns:
+            dict: {ready, checked_at, age, checks}，尚未检查或结果过期时 ready 为False
+        """
+        result = self._result
+        if result is None:
+            return {"ready": False, "checked_at": None, "age": None, "checks": {}, "error": "尚未完成检查"}
+        age = round(time.time() - result["checked_at"], 3)
+        snapshot = dict(result, age=age)
+        if not self.generator.accepting:
+            # 排空状态不等下一次检查，立即生效
+            snapshot["ready"] = False
+            snapshot["error"] = "服务正在停止"
+        elif age > self.interval * 3:
+            snapshot["ready"] = False
+            snapshot["error"] = "检查结果已过期"
+        return snapshot
+
+    def start(self):
+        """
+        启动后台检查线程（重复调用无影响）
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止后台检查线程
+        """
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.probe()
+            except Exception as e:
+                print(f"健康检查失败: {e}")
+
+_health_monitor = None
+_health_lock = threading.Lock()
+
+def get_health_monitor() -> HealthMonitor:
+    """
+    获取全局健康检查器，懒加载模式
+
+    检查间隔、后端队列饱和阈值和探测超时由环境变量 HEALTH_CHECK_INTERVAL（秒，默认5）、
+    READY_MAX_BACKEND_QUEUE（默认10）和 HEALTH_PROBE_TIMEOUT（秒，默认3）控制
+    """
+    global _health_monitor
+    if _health_monitor is None:
+        with _health_lock:
+            if _health_monitor is None:
+                from core.image_generator import get_image_generator
+                _health_monitor = HealthMonitor(
+                    get_image_generator(),
+                    interval=float(os.getenv("HEALTH_CHECK_INTERVAL", "5")),
+                    max_backend_queue=int(os.getenv("READY_MAX_BACKEND_QUEUE", "10")),
+                    probe_timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT", "3")),
+                )
+    return _health_monitor
@@ -3,15 +3,64 @@
 
 import threading
 import queue
+import socket
+import json
 import time
 import uuid
-from typing import Dict, Any, Optional, Callable
+import asyncio
+import contextlib
+from typing import Dict, Any, Optional, List
 import os
 import sys
 
+try:
+    import fcntl
+except ImportError:
+    # Windows 没有 fcntl，恢复文件的读写不加锁（单进程部署不受影响）
+    fcntl = None
+
 # 添加项目根目录到系统路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from client.comfyui_client import ComfyUIClient
+from client.comfyui_client import ComfyUIClient, TaskCancelledError
+from core.workflow_catalog import get_workflow_catalog, TEMPLATES_DIR
+from utils.metrics import TASK_STAGE_SECONDS, TASKS_FINISHED, WORKERS_BUSY
+from utils.timing_stats import get_stage_stats, get_node_stats
+from utils.history_index import get_history_index
+from utils.output_index import get_output_index
+from core.task_store import get_task_store
+from core.concurrency import AdaptiveLimiter
+from core.deferred_queue import get_deferred_queue, parse_windows, in_windows
+from utils.executor import run_blocking
+from utils.paths import DATA_DIR
+
+# 终止状态，进入后不会再变化
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+# 全局变更序号，每次任务创建或状态变化时递增，用作批量查询的游标
+_change_seq = 0
+_change_seq_lock = threading.Lock()
+
+def _next_change_seq() -> int:
+    global _change_seq
+    with _change_seq_lock:
+        _change_seq += 1
+        return _change_seq
+
+def current_change_seq() -> int:
+    """
+    获取当前最新的变更序号
+    """
+    return _change_seq
+
+def _resolve_future(future):
+    if not future.done():
+        future.set_result(None)
+
+class GeneratorDrainingError(Exception):
+    """
+    服务正在停止，不再接受新任务
+    """
+    pass
 
 class ImageGenerationTask:
     """
@@ -20,118 +69,695 @@ class ImageGenerationTask:
     def __init__(self, task_id: str, params: Dict[str, Any]):
         self.task_id = task_id
         self.params = params
-        self.status = "pending"  # pending, running, completed, failed
+        self.status = "pending"  # pending, running, completed, failed, cancelled
+        self.created_time = time.time()
+        self.prompt_id = None
         self.result = None
         self.error = None
         self.start_time = None
         self.end_time = None
         self.progress = 0
+        self.spans = {}  # 各阶段耗时（秒），按发生顺序写入
+        self.node_timings = {}  # 各节点执行耗时，来自ComfyUI执行事件
+        self.seed = None  # 提交到ComfyUI的工作流中实际使用的随机种子
+        self.version = 0  # 每次状态变化递增，用于长轮询判断
+        self.updated_seq = _next_change_seq()  # 最近一次变化的全局序号
+        self._cond = threading.Condition()
+        self._async_waiters = []  # 异步等待者列表: (loop, future)
+        self.cancel_event = threading.Event()  # 取消信号
+        self.on_change = None  # 状态变化回调，启用共享任务表时用于写回任务状态
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "ImageGenerationTask":
+        """
+        根据共享任务表中的记录构建任务对象
+        """
+        task = cls(record["task_id"], record["params"])
+        for name in ("status", "prompt_id", "result", "error", "start_time", "end_time", "progress", "version"):
+            setattr(task, name, record[name])
+        task.created_time = record["created_time"]
+        task.spans = record["spans"] or {}
+        task.node_timings = record["node_timings"] or {}
+        task.updated_seq = record["updated_seq"]
+        return task
+
+    def is_finished(self) -> bool:
+        """
+        任务是否已处于终止状态
+        """
+        return self.status in TERMINAL_STATUSES
+
+    def set_status(self, status: str, expected: Optional[tuple] = None) -> bool:
+        """
+        更新任务状态并唤醒所有等待该任务状态变化的线程和协程
+
+        Args:
+            status: 新状态
+            expected: 允许的当前状态，当前状态不在其中时不更新
+
+        Returns:
+            bool: 是否更新成功
+        """
+        with self._cond:
+            if expected is not None and self.status not in expected:
+                return False
+            self.status = status
+            self.version += 1
+            self.updated_seq = _next_change_seq()
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        if self.on_change is not None:
+            self.on_change(self)
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve_future, future)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+        return True
+
+    def wait(self, timeout: float, version: Optional[int] = None) -> bool:
+        """
+        阻塞等待任务状态变化（同步版本）
+
+        Args:
+            timeout: 最长等待秒数
+            version: 基准版本号，默认使用当前版本
+
+        Returns:
+            bool: 等待期间状态是否发生变化
+        """
+        with self._cond:
+            if version is None:
+                version = self.version
+            return self._cond.wait_for(lambda: self.version != version, timeout)
+
+    async def wait_async(self, timeout: float, version: Optional[int] = None) -> bool:
+        """
+        等待任务状态变化（异步版本），不占用事件循环和线程池
+
+        Args:
+            timeout: 最长等待秒数
+            version: 基准版本号，默认使用当前版本
+
+        Returns:
+            bool: 等待期间状态是否发生变化
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if version is None:
+                version = self.version
+            if self.version != version:
+                return True
+            waiter = (loop, future)
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._cond:
+                if waiter in self._async_waiters:
+                    self._async_waiters.remove(waiter)
 
 class ImageGenerator:
     """
     图像生成器类，使用线程池处理图像生成请求
     """
     def __init__(self, server_address="http://10.10.10.59:6700", max_workers=3):
+        """
+        Args:
+            server_address: ComfyUI服务器地址
+            max_workers: 工作线程数，即同时提交到后端的任务数的最大值；实际上限在
+                [CONCURRENCY_MIN, max_workers] 之间根据后端队列自动调整，初始值为 CONCURRENCY_INITIAL
+        """
         self.client = ComfyUIClient(server_address)
         self.task_queue = queue.Queue()
         self.tasks = {}  # 存储所有任务
         self.max_workers = max_workers
-        self.workers = []
+        self.limiter = AdaptiveLimiter(
+            initial=int(os.getenv("CONCURRENCY_INITIAL", "3")),
+            minimum=min(max_workers, int(os.getenv("CONCURRENCY_MIN", "1"))),
+            maximum=max_workers,
+            target_depth=int(os.getenv("BACKEND_TARGET_DEPTH", "1")),
+        )
+        self.workers = []  # 生成任务工作线程，用于指标和健康检查
+        self.background_threads = []  # 领取共享任务、放行延后任务等后台线程
         self.running = True
+        self.accepting = True  # 停止前排空时置为False，不再执行新任务
+        self._dequeuing = 0  # 已从本地队列取出、尚未标记为运行中的工作线程数
+        self._dequeue_cond = threading.Condition()
+        # 共享任务表（多进程部署时启用），未启用时任务只保存在本进程
+        self.store = get_task_store()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # 停止前未完成任务的恢复文件（未启用共享任务表时使用）
+        self.resume_path = os.getenv("RESUME_FILE", os.path.join(DATA_DIR, "resume.json"))
+        self._feed_event = threading.Event()
+        # 延后通道：交互通道空闲时放行，配置了时间窗口时窗口内也放行
+        self.deferred_windows = parse_windows(os.getenv("DEFERRED_WINDOWS", ""))
+        self.deferred_idle_release = os.getenv("DEFERRED_IDLE_RELEASE", "1") != "0"
+        self.deferred_interval = float(os.getenv("DEFERRED_POLL_INTERVAL", "2"))
+        self._deferred_backlog = 0  # 当前允许放行的延后任务数，计入调整并发上限时的本地需求
         
         # 启动工作线程
         for _ in range(max_workers):
             worker = threading.Thread(target=self._worker_thread, daemon=True)
             worker.start()
             self.workers.append(worker)
+        if self.store is not None:
+            feeder = threading.Thread(target=self._feeder_thread, name="task-feeder", daemon=True)
+            feeder.start()
+            self.background_threads.append(feeder)
+        releaser = threading.Thread(target=self._deferred_thread, name="deferred-releaser", daemon=True)
+        releaser.start()
+        self.background_threads.append(releaser)
+    
+    def _feeder_thread(self):
+        """
+        共享任务表模式下，在本进程有空闲工作线程时从任务表领取任务放入本地队列，
+        同时为已领取的任务续租，并处理其他进程发来的取消请求
+        """
+        last_purge = 0.0
+        last_renew = 0.0
+        while self.running:
+            self._feed_event.wait(0.5)
+            self._feed_event.clear()
+            try:
+                # 每个租约周期续租三次，偶尔一次写入失败不会导致租约到期
+                if time.time() - last_renew > self.store.lease / 3:
+                    last_renew = time.time()
+                    self.store.renew(self.owner)
+                for task_id in self.store.cancel_requests(self.owner):
+                    self.cancel_task(task_id)
+                # 只领取当前并发上限内能立即执行的任务，其余留给其他进程
+                while self.accepting and self.task_queue.unfinished_tasks < self.limiter.limit:
+                    record = self.store.claim(self.owner)
+                    if record is None:
+                        break
+                    task = ImageGenerationTask.from_record(record)
+                    task.on_change = self._on_task_change
+                    self.tasks[task.task_id] = task
+                    self.task_queue.put(task.task_id)
+                if time.time() - last_purge > 3600:
+                    last_purge = time.time()
+                    self.store.purge()
+            except Exception as e:
+                print(f"领取共享任务失败: {e}")
+    
+    def _deferred_release_open(self) -> bool:
+        """
+        当前是否允许放行延后任务：在放行时间窗口内，或交互通道没有排队任务
+        """
+        if in_windows(self.deferred_windows):
+            return True
+        if not self.deferred_idle_release:
+            return False
+        pending = self.store.pending_count() if self.store is not None else self.task_queue.qsize()
+        return pending == 0
+    
+    def _deferred_thread(self):
+        """
+        定期检查延后通道，允许放行时按提交顺序把延后任务放入生成队列，
+        每次只放行当前并发上限内能立即执行的数量，之后提交的交互任务最多等待这些任务
+        """
+        last_purge = 0.0
+        while self.running:
+            time.sleep(self.deferred_interval)
+            if not self.accepting:
+                continue
+            try:
+                deferred = get_deferred_queue()
+                if not self._deferred_release_open():
+                    self._deferred_backlog = 0
+                    continue
+                self._deferred_backlog = deferred.waiting_count()
+                free = self.limiter.limit - self.task_queue.unfinished_tasks
+                for record in deferred.release(free):
+                    task = ImageGenerationTask(record["task_id"], record["params"])
+                    task.created_time = record["created_time"]
+                    self._enqueue(task)
+                if time.time() - last_purge > 3600:
+                    last_purge = time.time()
+                    deferred.purge()
+            except Exception as e:
+                print(f"放行延后任务失败: {e}")
+    
+    @staticmethod
+    def _finish_deferred(task: ImageGenerationTask):
+        """
+        记录延后通道任务的结束状态，用于统计进度
+        """
+        if task.params.get("lane") != "deferred":
+            return
+        try:
+            get_deferred_queue().finish(task.task_id, task.status)
+        except Exception as e:
+            print(f"记录延后任务状态失败: {e}")
+    
+    def _on_task_change(self, task: ImageGenerationTask):
+        """
+        任务状态变化时写回共享任务表，任务结束时唤醒领取线程
+        """
+        try:
+            self.store.save(task)
+        except Exception as e:
+            print(f"写回任务状态失败: {e}")
+        if task.is_finished():
+            self._feed_event.set()
+    
+    def _find_task(self, task_id: str) -> Optional[ImageGenerationTask]:
+        """
+        查找任务：优先使用本进程的任务对象，启用共享任务表时再查询任务表（返回只读快照）
+        """
+        task = self.tasks.get(task_id)
+        if task is None and self.store is not None:
+            record = self.store.get(task_id)
+            if record is not None:
+                task = ImageGenerationTask.from_record(record)
+        if task is None:
+            task = self._find_deferred_task(task_id)
+        return task
+    
+    @staticmethod
+    def _find_deferred_task(task_id: str) -> Optional[ImageGenerationTask]:
+        """
+        查找延后通道中尚未放行（或放行前已取消）的任务，返回只读快照
+        """
+        record = get_deferred_queue().get(task_id)
+        if record is None or record["status"] not in ("waiting", "cancelled"):
+            return None
+        task = ImageGenerationTask(task_id, record["params"])
+        task.created_time = record["created_time"]
+        task.updated_seq = 0
+        if record["status"] == "cancelled":
+            task.status = "cancelled"
+            task.end_time = record["finished_time"]
+            task.error = "任务已取消"
+        return task
     
     def _worker_thread(self):
         """
         工作线程，从队列中获取任务并执行
         """
         while self.running:
+            # 执行中的任务数达到并发上限时等待，任务留在本地队列中，取消可以立即生效
+            if not self.limiter.acquire(timeout=0.5):
+                continue
             try:
-                # 减少超时时间，使线程能更快响应退出信号
-                task_id = self.task_queue.get(timeout=0.5)
-                if task_id is None:
-                    # 收到退出信号
-                    self.task_queue.task_done()  # 确保标记任务完成
-                    break
-                
-                task = self.tasks.get(task_id)
-                if task is None:
-                    self.task_queue.task_done()  # 确保标记任务完成
-                    continue
-                
-                # 更新任务状态
-                task.status = "running"
-                task.start_time = time.time()
-                
+                # 排空期间不再取任务；从取出任务到标记为运行中的线程计入 _dequeuing，
+                # drain 等这些线程离开后再清点队列和执行中的任务，任务不会在两者之间漏掉
+                with self._dequeue_cond:
+                    if not self.accepting:
+                        self._dequeue_cond.wait(0.5)
+                        continue
+                    self._dequeuing += 1
                 try:
-                    # 调用ComfyUI客户端生成图像
-                    kwargs = {}
-                    if task.params.get("extra_params"):
-                        kwargs.update(task.params["extra_params"])
-                    self.client.set_workflow(task.params.get("workflow", "1.yml"))
-                    id = self.client.generate_image(
-                        prompt=task.params.get("prompt", ""),
-                        negative_prompt=task.params.get("negative_prompt", ""),
-                        template_name=task.params.get("template_name", ""),
-                        width=task.params.get("width", 512),
-                        height=task.params.get("height", 512),
-                        batch_size=task.params.get("batch_size", 2),
-                        # steps=task.params.get("steps", 4),
-                        # cfg=task.params.get("cfg", 7.0),
-                        # seed=task.params.get("seed", -1),
-                        # model=task.params.get("model", "qwen-image-Q4_K_M.gguf"),
-                        # output_file=task.params.get("output_file"),
-                        **kwargs
-                    )
-                    task.prompt_id=id
-                    output_file=self.client.status(id,task_id)
-                    # 更新任务结果
-                    task.result = output_file
+                    try:
+                        # 减少超时时间，使线程能更快响应退出信号
+                        task_id = self.task_queue.get(timeout=0.5)
+                        if task_id is None:
+                            # 收到退出信号
+                            self.task_queue.task_done()  # 确保标记任务完成
+                            break
                     
-                    task.status = "completed"
+                        task = self.tasks.get(task_id)
+                        if task is None:
+                            self.task_queue.task_done()  # 确保标记任务完成
+                            continue
+                    
+                        if not self.accepting:
+                            # 取出后才开始排空，放回队列由 drain 交接
+                            self.task_queue.put(task_id)
+                            self.task_queue.task_done()
+                            continue
+                    
+                        # 更新任务状态，任务已被取消时跳过
+                        task.start_time = time.time()
+                        if not task.set_status("running", expected=("pending",)):
+                            self.task_queue.task_done()
+                            continue
+                    finally:
+                        with self._dequeue_cond:
+                            self._dequeuing -= 1
+                            self._dequeue_cond.notify_all()
+                
+                    workflow = self._workflow_label(task)
+                    deferred = task.params.get("lane") == "deferred"
+                    if not deferred:
+                        # 延后任务的等待时间主要在放行前，不计入排队和总耗时统计
+                        self._record_spans(task, workflow, {"queue": task.start_time - task.created_time})
+                    WORKERS_BUSY.inc()
+                    self.limiter.task_started()
+                    try:
+                        # 调用ComfyUI客户端生成图像
+                        kwargs = {}
+                        if task.params.get("extra_params"):
+                            kwargs.update(task.params["extra_params"])
+                        self.client.set_workflow(task.params.get("workflow", "1.yaml"))
+                        timings = {}
+                        submitted = {}
+                        if task.prompt_id:
+                            # 停止前的进程已提交到ComfyUI，重新关联等待结果，不重复提交
+                            id = task.prompt_id
+                        else:
+                            id = self.client.generate_image(
+                                prompt=task.params.get("prompt", ""),
+                                negative_prompt=task.params.get("negative_prompt", ""),
+                                template_name=task.params.get("template_name", ""),
+                                width=task.params.get("width", 512),
+                                height=task.params.get("height", 512),
+                                batch_size=task.params.get("batch_size", 2),
+                                # steps=task.params.get("steps", 4),
+                                # cfg=task.params.get("cfg", 7.0),
+                                seed=task.params.get("seed"),
+                                # model=task.params.get("model", "qwen-image-Q4_K_M.gguf"),
+                                # output_file=task.params.get("output_file"),
+                                timings=timings,
+                                submitted=submitted,
+                                **kwargs
+                            )
+                            task.prompt_id=id
+                            task.seed = submitted.get("seed")
+                            if task.on_change is not None:
+                                task.on_change(task)
+                        self._record_spans(task, workflow, timings)
+                        if task.cancel_event.is_set():
+                            # 提交期间收到取消请求
+                            self.client.cancel_prompt(id)
+                            raise TaskCancelledError(f"任务已取消 (Prompt ID: {id})")
+                        timings = {}
+                        output_file=self.client.status(id,task_id,cancel_event=task.cancel_event,timings=timings)
+                        self._record_spans(task, workflow, timings)
+                        task.node_timings = self.client.get_node_times(id)
+                        self._record_node_timings(workflow, task.node_timings)
+                        # 更新任务结果
+                        task.result = output_file
+                        task.end_time = time.time()
+                        if not deferred:
+                            self._record_spans(task, workflow, {"total": task.end_time - task.created_time})
+                        task.set_status("completed")
+                    except TaskCancelledError as e:
+                        task.error = str(e)
+                        task.end_time = time.time()
+                        task.set_status("cancelled")
+                    except Exception as e:
+                        # 更新任务错误信息
+                        task.error = str(e)
+                        task.end_time = time.time()
+                        task.set_status("failed")
+                    finally:
+                        WORKERS_BUSY.dec()
+                        self.limiter.task_finished()
+                        TASKS_FINISHED.inc(labels=(workflow, task.status))
+                        self._record_history(task, workflow)
+                        self._finish_deferred(task)
+                        self.task_queue.task_done()
+                        self.limiter.record_completion()
+                        self._adjust_concurrency()
+                except queue.Empty:
+                    # 队列为空，继续检查running状态
+                    continue
                 except Exception as e:
-                    # 更新任务错误信息
-                    task.error = str(e)
-                    task.status = "failed"
-                finally:
-                    task.end_time = time.time()
-                    self.task_queue.task_done()
-            except queue.Empty:
-                # 队列为空，继续检查running状态
-                continue
-            except Exception as e:
-                print(f"工作线程发生错误: {e}")
-                # 确保即使发生错误也标记任务完成
-                try:
-                    self.task_queue.task_done()
-                except:
-                    pass
+                    print(f"工作线程发生错误: {e}")
+                    # 确保即使发生错误也标记任务完成
+                    try:
+                        self.task_queue.task_done()
+                    except:
+                        pass
+            finally:
+                self.limiter.release()
+    
+    def _adjust_concurrency(self):
+        """
+        任务完成时根据后端队列长度调整并发上限
+        """
+        try:
+            queue_status = self.client.get_queue_status_cached(self.client.snapshots.intervals["queue"] * 2, timeout=3)
+        except Exception:
+            return
+        if queue_status is None:
+            return
+        local_pending = self.store.pending_count() if self.store is not None else self.task_queue.qsize()
+        local_pending += self._deferred_backlog
+        self.limiter.update(len(queue_status.get("queue_running", [])),
+                            len(queue_status.get("queue_pending", [])), local_pending)
+    
+    def get_concurrency(self) -> Dict[str, Any]:
+        """
+        获取并发控制状态：当前上限、执行中的任务数、最近观察到的后端队列、调整次数和完成速率
+        """
+        return self.limiter.snapshot()
+    
+    @staticmethod
+    def _record_spans(task: ImageGenerationTask, workflow: str, timings: Dict[str, float]):
+        """
+        记录任务的阶段耗时，同时写入运行指标和按工作流汇总的统计
+        """
+        stats = get_stage_stats()
+        for stage, seconds in timings.items():
+            task.spans[stage] = seconds
+            TASK_STAGE_SECONDS.observe(seconds, (workflow, stage))
+            stats.record(workflow, stage, seconds)
+    
+    @staticmethod
+    def _record_history(task: ImageGenerationTask, workflow: str):
+        """
+        把结束的任务写入生成历史索引，写入失败不影响任务结果
+        """
+        params = task.params
+        extra = params.get("extra_params") or {}
+        record = get_output_index().get(task.task_id)
+        try:
+            get_history_index().record({
+                "task_id": task.task_id,
+                "prompt_id": task.prompt_id,
+                "status": task.status,
+                "workflow": workflow,
+                "prompt": params.get("prompt", ""),
+                "negative_prompt": params.get("negative_prompt", ""),
+                "width": params.get("width"),
+                "height": params.get("height"),
+                "batch_size": params.get("batch_size"),
+                "seed": task.seed if task.seed is not None else params.get("seed", extra.get("seed")),
+                "params": params,
+                "files": record["files"] if record else None,
+                "timings": {stage: round(seconds, 4) for stage, seconds in task.spans.items()},
+                "error": task.error,
+                "created_at": task.created_time,
+                "finished_at": task.end_time,
+            })
+        except Exception as e:
+            print(f"写入生成历史失败: {e}")
+    
+    @staticmethod
+    def _record_node_timings(workflow: str, node_timings: Dict[str, Dict[str, Any]]):
+        """
+        记录节点执行耗时，命中缓存的节点不计入统计
+        """
+        stats = get_node_stats()
+        for node_id, data in node_timings.items():
+            if not data["cached"]:
+                stats.record(workflow, node_id, data["time"])
+    
+    @staticmethod
+    def _workflow_label(task: ImageGenerationTask) -> str:
+        """
+        任务的工作流指标标签，不存在的模板统一记为unknown，避免标签数量无限增长
+        """
+        workflow = task.params.get("workflow", "1.yml")
+        return workflow if get_workflow_catalog().get_template(workflow) is not None else "unknown"
+    
+    def get_stage_stats(self, workflow: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取按工作流汇总的任务阶段耗时统计
+        
+        Args:
+            workflow: 工作流模板名，为None时返回全部
+            
+        Returns:
+            dict: 工作流 -> 阶段 -> {count, mean, p50, p95, p99, max}
+        """
+        return get_stage_stats().summary(workflow)
+    
+    def get_node_stats(self, workflow: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取按工作流汇总的节点执行耗时统计，节点按平均耗时从高到低排列
+        
+        Args:
+            workflow: 工作流模板名，为None时返回全部
+            
+        Returns:
+            dict: 工作流 -> 节点ID -> {class_type, title, count, mean, p50, p95, p99, max}
+        """
+        result = {}
+        for name, nodes in get_node_stats().summary(workflow).items():
+            meta = self.client.get_node_meta(name)
+            ordered = sorted(nodes.items(), key=lambda item: item[1]["mean"], reverse=True)
+            result[name] = {
+                node_id: {**meta.get(node_id, {"class_type": None, "title": None}), **stats}
+                for node_id, stats in ordered
+            }
+        return result
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        获取队列和工作线程的状态指标
+
+        Returns:
+            dict: 各通道排队任务数、各状态任务数、工作线程数和并发控制状态
+        """
+        states = {}
+        for task in list(self.tasks.values()):
+            states[task.status] = states.get(task.status, 0) + 1
+        return {
+            "queue_depth": {"interactive": states.get("pending", 0), "deferred": get_deferred_queue().waiting_count()},
+            "tasks": states,
+            "workers": len(self.workers),
+            "concurrency": self.limiter.snapshot(),
+        }
     
     def generate_image(self,  **params) -> str:
         """
         提交图像生成任务
         
         Args:
-            **params: 图像生成参数
+            **params: 图像生成参数；lane 为 deferred 时写入延后通道，空闲时或在放行时间窗口内才执行
             
         Returns:
             str: 任务ID
+
+        Raises:
+            ParamValidationError: 参数不符合模板声明的规则，任务不会入队
         """
+        get_workflow_catalog().validate(params.get("workflow", "1.yaml"), params)
+        
         # 生成任务ID
         task_id = str(uuid.uuid4())
         
+        if params.get("lane") == "deferred":
+            # 延后任务持久化保存，停止期间提交的也会在之后放行
+            get_deferred_queue().add(task_id, params, time.time())
+            return task_id
+        if not self.accepting and self.store is None:
+            raise GeneratorDrainingError("服务正在停止，不再接受新任务")
+        
         # 创建任务
-        task = ImageGenerationTask(task_id, params)
-        self.tasks[task_id] = task
+        self._enqueue(ImageGenerationTask(task_id, params))
+        return task_id
+    
+    def _enqueue(self, task: ImageGenerationTask):
+        """
+        把任务放入生成队列：启用共享任务表时写入任务表，否则放入本地队列
+        """
+        if self.store is not None:
+            # 写入共享任务表，由有空闲工作线程的进程领取
+            self.store.add(task)
+            self._feed_event.set()
+            return
+        self.tasks[task.task_id] = task
         
         # 将任务添加到队列
-        self.task_queue.put(task_id)
+        self.task_queue.put(task.task_id)
+    
+    def get_backend_status(self) -> Dict[str, Any]:
+        """
+        获取后端状态快照：队列、系统状态和各数据源的快照年龄，不请求后端
+
+        Returns:
+            dict: {queue: {running, pending}, system_stats, snapshots}，快照刷新线程未启动时数据为None
+        """
+        queue = self.client.snapshots.get("queue")
+        stats = self.client.snapshots.get("system_stats")
+        queue_data = queue.data if queue is not None else None
+        return {
+            "queue": {
+                "running": len(queue_data.get("queue_running", [])),
+                "pending": len(queue_data.get("queue_pending", [])),
+            } if queue_data is not None else None,
+            "system_stats": stats.data if stats is not None else None,
+            "snapshots": self.client.snapshots.summary(),
+        }
+    
+    def get_deferred_status(self) -> Dict[str, Any]:
+        """
+        获取延后通道的进度和放行条件
+
+        Returns:
+            dict: 各状态的任务数、完成比例、完成速率、预计剩余时间（秒，无法估算时为None）、
+                放行时间窗口和当前是否允许放行
+        """
+        status = get_deferred_queue().progress()
+        status["windows"] = [f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+                             for start, end in self.deferred_windows]
+        status["idle_release"] = self.deferred_idle_release
+        status["release_open"] = self.accepting and self._deferred_release_open()
+        return status
+    
+    def get_task(self, task_id: str) -> Optional[ImageGenerationTask]:
+        """
+        获取任务对象
         
-        return task_id
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            ImageGenerationTask: 任务对象，不存在时返回None；任务在其他进程执行时返回任务表中的快照
+        """
+        return self._find_task(task_id)
+    
+    def cancel_task(self, task_id: str) -> bool:
+        """
+        取消任务：等待中的任务直接标记为已取消，执行中的任务同时取消ComfyUI中的prompt
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            bool: 是否发出了取消请求
+        """
+        task = self.tasks.get(task_id)
+        if task is None and get_deferred_queue().cancel(task_id):
+            # 延后通道中尚未放行的任务
+            return True
+        if task is None and self.store is not None:
+            # 任务未被领取或在其他进程执行
+            if not self.store.request_cancel(task_id):
+                return False
+            record = self.store.get(task_id)
+            if record is not None and record["status"] == "cancelled":
+                self._finish_deferred(ImageGenerationTask.from_record(record))
+            return True
+        if task is None or task.is_finished():
+            return False
+        task.cancel_event.set()
+        if task.set_status("cancelled", expected=("pending",)):
+            task.end_time = time.time()
+            if task.on_change is not None:
+                task.on_change(task)
+            self._finish_deferred(task)
+            return True
+        if task.prompt_id:
+            try:
+                self.client.cancel_prompt(task.prompt_id)
+            except Exception as e:
+                print(f"取消prompt失败: {e}")
+        return True
+    
+    def get_task_files(self, task_id: str) -> List[str]:
+        """
+        获取已完成任务的输出文件路径
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            list: 文件绝对路径列表
+        """
+        task = self._find_task(task_id)
+        if task is None or task.status != "completed":
+            return []
+        return [self.client.url_to_path(image["url"]) for image in task.result or [] if image.get("url")]
     
     def get_task_status(self, task_id: str) -> Dict[str, Any]:
         """
@@ -143,27 +769,173 @@ class ImageGenerator:
         Returns:
             dict: 任务状态信息
         """
-        task = self.tasks.get(task_id)
+        task = self._find_task(task_id)
         if task is None:
             return {"status": "not_found", "message": f"任务不存在: {task_id}"}
         
+        progress = self.client.get_progress() if task.status == "running" else None
+        return self._build_status(task, progress)
+    
+    def get_tasks_status(self, task_ids: Optional[List[str]] = None, fields: Optional[List[str]] = None, since: int = 0) -> Dict[str, Any]:
+        """
+        批量获取任务状态
+        
+        Args:
+            task_ids: 任务ID列表，为None时查询所有任务
+            fields: 返回字段列表，为None时返回全部字段（task_id始终返回）
+            since: 游标，只返回变更序号大于该值的任务
+            
+        Returns:
+            dict: 包含任务状态列表、不存在的任务ID和新游标
+        """
+        # 先记录游标再扫描，扫描期间发生的变化会在下一次查询中返回
+        missing = []
+        changed_since = since
+        if self.store is not None:
+            # 共享任务表模式下游标使用任务表的全局变更序号
+            cursor = self.store.current_seq()
+            tasks = [ImageGenerationTask.from_record(record) for record in self.store.get_many(task_ids, since)]
+            if task_ids is not None:
+                # 按请求的顺序返回
+                order = {task_id: i for i, task_id in enumerate(task_ids)}
+                tasks.sort(key=lambda task: order[task.task_id])
+                found = {task.task_id for task in tasks}
+                # 未返回的任务可能只是没有变化，需要确认是否存在
+                missing = [task_id for task_id in task_ids
+                           if task_id not in found and (not since or self.store.get(task_id) is None)]
+            since = 0
+        elif task_ids is None:
+            cursor = current_change_seq()
+            tasks = list(self.tasks.values())
+        else:
+            cursor = current_change_seq()
+            tasks = []
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if task is None:
+                    missing.append(task_id)
+                else:
+                    tasks.append(task)
+        if missing:
+            # 延后通道中尚未放行的任务，没有变化序号，只在不带游标查询时返回
+            deferred = [self._find_deferred_task(task_id) for task_id in missing]
+            missing = [task_id for task_id, task in zip(missing, deferred) if task is None]
+            if not changed_since and len(missing) < len(deferred):
+                tasks.extend(task for task in deferred if task is not None)
+                order = {task_id: i for i, task_id in enumerate(task_ids)}
+                tasks.sort(key=lambda task: order[task.task_id])
+        if since:
+            tasks = [task for task in tasks if task.updated_seq > since]
+        
+        # 进度信息来自后端，整批只查询一次
+        progress = None
+        if any(task.status == "running" for task in tasks) and (fields is None or "progress" in fields):
+            progress = self.client.get_progress()
+        
+        results = []
+        for task in tasks:
+            status = self._build_status(task, progress)
+            if fields is not None:
+                status = {key: value for key, value in status.items() if key == "task_id" or key in fields}
+            results.append(status)
+        return {"tasks": results, "missing": missing, "cursor": cursor}
+    
+    def _build_status(self, task: ImageGenerationTask, progress: Optional[int] = None) -> Dict[str, Any]:
+        """
+        构建单个任务的状态信息
+        """
         result = {
             "status": task.status,
             "task_id": task.task_id
         }
         
+        if task.spans:
+            result["timings"] = {stage: round(seconds, 4) for stage, seconds in list(task.spans.items())}
+        if task.node_timings:
+            result["node_timings"] = {
+                node_id: {"time": round(data["time"], 4), "cached": data["cached"]}
+                for node_id, data in task.node_timings.items()
+            }
+        
         if task.status == "completed":
             result["result"] = task.result
             result["execution_time"] = task.end_time - task.start_time
-        elif task.status == "failed":
+        elif task.status in ("failed", "cancelled"):
             result["error"] = task.error
         elif task.status == "running":
-            task.progress = self.client.get_progress()
+            if progress is not None:
+                task.progress = progress
             result["progress"] = task.progress
             result["running_time"] = time.time() - task.start_time
         
         return result
     
+    async def wait_task_async(self, task_id: str, timeout: float, version: Optional[int] = None) -> bool:
+        """
+        长轮询：等待任务状态变化或超时
+
+        Args:
+            task_id: 任务ID
+            timeout: 最长等待秒数
+            version: 基准版本号，默认使用当前版本
+
+        Returns:
+            bool: 等待期间状态是否发生变化
+        """
+        task = self.tasks.get(task_id)
+        if task is None and self.store is not None:
+            return await self._wait_stored_task(task_id, timeout, version)
+        if task is None:
+            return await self._wait_deferred_task(task_id, timeout)
+        if task.is_finished():
+            return False
+        return await task.wait_async(timeout, version)
+
+    async def _wait_stored_task(self, task_id: str, timeout: float, version: Optional[int] = None) -> bool:
+        """
+        等待其他进程执行的任务状态变化，定期查询共享任务表
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            record = await run_blocking(self.store.get, task_id)
+            if record is None:
+                # 可能是延后通道中尚未放行的任务
+                return await self._wait_deferred_task(task_id, max(0.0, deadline - loop.time()))
+            if version is None:
+                version = record["version"]
+            elif record["version"] != version:
+                return True
+            if record["status"] in TERMINAL_STATUSES:
+                return False
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(remaining, 0.5))
+
+    async def _wait_deferred_task(self, task_id: str, timeout: float) -> bool:
+        """
+        等待延后通道中的任务被放行或取消，定期查询延后任务队列
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        deferred = get_deferred_queue()
+        status = None
+        while True:
+            record = await run_blocking(deferred.get, task_id)
+            if record is None:
+                return False
+            if status is None:
+                if record["status"] != "waiting":
+                    return False
+                status = record["status"]
+            elif record["status"] != status:
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(remaining, 0.5))
+
     def get_files(self, prompt_id: str) -> list:
         """
         获取生成的图像文件路径
@@ -176,6 +948,43 @@ class ImageGenerator:
         """
         return self.client.get_files(prompt_id)
     
+    def get_output_record(self, prompt_id: str) -> Dict[str, Any]:
+        """
+        获取输出文件索引记录
+        
+        Args:
+            prompt_id: 任务ID或提示ID
+            
+        Returns:
+            dict: 包含文件列表（URL、大小、宽高、哈希）和ETag的记录
+        """
+        return self.client.get_output_record(prompt_id)
+    
+    def get_archive_entries(self, task_ids: List[str], prefix_task_id: bool = False) -> tuple:
+        """
+        获取打包下载的文件列表
+        
+        Args:
+            task_ids: 任务ID或提示ID列表
+            prefix_task_id: 压缩包内是否按任务ID分目录
+            
+        Returns:
+            tuple: ([(压缩包内文件名, 文件路径), ...], 不存在或文件已被清理的ID列表)
+        """
+        entries = []
+        missing = []
+        for task_id in dict.fromkeys(task_ids):
+            try:
+                record = self.client.get_output_record(task_id)
+            except Exception:
+                missing.append(task_id)
+                continue
+            for image in record["files"]:
+                path = self.client.url_to_path(image["url"])
+                name = os.path.basename(path)
+                entries.append((f"{task_id}/{name}" if prefix_task_id else name, path))
+        return entries, missing
+    
     def get_workflows(self) -> list:
         """
         获取流程
@@ -184,6 +993,167 @@ class ImageGenerator:
         """
         return self.client.get_workflows()
     
+    def warmup(self) -> Dict[str, Any]:
+        """
+        预热：加载全部模板和工作流文件，建立到ComfyUI的连接并启动事件监听，
+        避免第一个请求承担这些开销。后端不可用时只记录错误，不影响服务启动
+
+        Returns:
+            dict: {templates, workflows, template_errors, backend, backend_error}
+        """
+        catalog = get_workflow_catalog()
+        catalog.refresh(force=True)
+        workflows = 0
+        template_errors = dict(catalog.errors)
+        for item in catalog.list_workflows():
+            template = catalog.get_template(item["path"]) or {}
+            path = os.path.join(TEMPLATES_DIR, template.get("file", ""))
+            try:
+                catalog.load_workflow(path)
+                workflows += 1
+            except Exception as e:
+                template_errors[item["path"]] = str(e)
+        result = {
+            "templates": len(catalog.list_workflows()),
+            "workflows": workflows,
+            "template_errors": template_errors,
+            "backend": False,
+            "backend_error": None,
+        }
+        try:
+            # 查询队列即可在连接池中建立一个可复用的连接
+            result["backend"] = self.client.get_queue_status() is not None
+        except Exception as e:
+            result["backend_error"] = str(e)
+        self.client.start_event_listener()
+        self.client.start_snapshot_refresher()
+        return result
+
+    def drain(self, timeout: float = 30.0) -> Dict[str, int]:
+        """
+        停止前排空：不再执行新任务，等待执行中的任务完成，
+        未开始的任务和超时仍未完成的任务交给下一个进程继续执行（已提交到ComfyUI的任务只重新关联，不重复提交）
+
+        启用共享任务表时把这些任务放回任务表，否则写入恢复文件，由下一个进程启动时通过 resume 加载
+
+        Args:
+            timeout: 等待执行中任务完成的最长秒数
+
+        Returns:
+            dict: {finished: 等待期间完成的任务数, handed_off: 交接的任务数}
+        """
+        with self._dequeue_cond:
+            self.accepting = False
+            # 等待已取出任务的工作线程把任务标记为运行中或放回队列
+            while self._dequeuing:
+                self._dequeue_cond.wait()
+        # 取出还在本地队列中、尚未开始的任务
+        queued = []
+        while True:
+            try:
+                task_id = self.task_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.task_queue.task_done()
+            task = self.tasks.get(task_id) if task_id is not None else None
+            if task is not None and task.status == "pending":
+                queued.append(task)
+        
+        running = [task for task in list(self.tasks.values()) if task.status == "running"]
+        deadline = time.monotonic() + timeout
+        for task in running:
+            while not task.is_finished():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                task.wait(remaining)
+        unfinished = [task for task in running if not task.is_finished()]
+        
+        # 已在ComfyUI中执行的任务排在前面，恢复后优先重新关联
+        handoff = unfinished + queued
+        for task in handoff:
+            # 交接后本进程不再写回该任务的状态
+            task.on_change = None
+        if self.store is not None:
+            for task in handoff:
+                self.store.release(task.task_id, task.prompt_id)
+        elif handoff:
+            self._save_resume(handoff)
+        return {"finished": len(running) - len(unfinished), "handed_off": len(handoff)}
+    
+    def _save_resume(self, tasks: List[ImageGenerationTask]):
+        """
+        把待交接的任务写入恢复文件（与已有的记录合并）
+        """
+        # 多个进程（uvicorn --workers N）同时停止时，合并和写入在文件锁内进行，临时文件按进程区分
+        with self._resume_lock():
+            entries = self._load_resume(self.resume_path)
+            known = {entry["task_id"] for entry in entries}
+            entries.extend(
+                {"task_id": task.task_id, "params": task.params, "created_time": task.created_time, "prompt_id": task.prompt_id}
+                for task in tasks if task.task_id not in known
+            )
+            tmp_path = f"{self.resume_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.resume_path)
+    
+    @contextlib.contextmanager
+    def _resume_lock(self):
+        """
+        恢复文件的跨进程排他锁
+        """
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.resume_path) or ".", exist_ok=True)
+        with open(f"{self.resume_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    @staticmethod
+    def _load_resume(path: str) -> List[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+    
+    def resume(self) -> int:
+        """
+        加载上一个进程停止前交接的任务并重新入队，任务ID保持不变
+
+        多个进程同时启动时，先把恢复文件重命名为按进程区分的文件再读取，只有一个进程能领取到，
+        任务不会被重复执行
+
+        Returns:
+            int: 恢复的任务数
+        """
+        claimed_path = f"{self.resume_path}.{os.getpid()}"
+        with self._resume_lock():
+            try:
+                os.rename(self.resume_path, claimed_path)
+            except FileNotFoundError:
+                # 没有恢复文件，或已被其他进程领取
+                return 0
+        entries = self._load_resume(claimed_path)
+        for entry in entries:
+            task = ImageGenerationTask(entry["task_id"], entry["params"])
+            task.created_time = entry["created_time"]
+            task.prompt_id = entry.get("prompt_id")
+            if self.store is not None:
+                self.store.add(task)
+                self._feed_event.set()
+            else:
+                self.tasks[task.task_id] = task
+                self.task_queue.put(task.task_id)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(claimed_path)
+        return len(entries)
+    
     def shutdown(self):
         """
         关闭图像生成器
@@ -192,6 +1162,7 @@ class ImageGenerator:
             return  # 避免重复关闭
             
         self.running = False
+        self.client.snapshots.stop()
         
         # 向队列中添加None，通知工作线程退出
         for _ in self.workers:
@@ -200,13 +1171,14 @@ class ImageGenerator:
             except queue.Full:
                 pass  # 队列已满，忽略
         
-        # 等待所有工作线程退出，设置超时避免阻塞
-        for worker in self.workers:
+        # 等待所有工作线程和后台线程退出，设置超时避免阻塞
+        for worker in self.workers + self.background_threads:
             if worker.is_alive():
                 worker.join(timeout=2.0)
                 
         # 清空工作线程列表
         self.workers.clear()
+        self.background_threads.clear()
         
     def __del__(self):
         """
@@ -220,14 +1192,20 @@ class ImageGenerator:
 
 # 创建全局图像生成器实例
 image_generator = None
+_image_generator_lock = threading.Lock()
 
 def get_image_generator():
     """
     获取全局图像生成器实例，懒加载模式
+
+    首次调用时创建工作线程，服务启动时在 lifespan 中调用，导入模块本身没有副作用
     """
     global image_generator
     if image_generator is None:
-        image_generator = ImageGenerator(server_address=os.getenv("COMFYUI_SERVER", "http://127.0.0.1:6700"))
+        with _image_generator_lock:
+            if image_generator is None:
+                image_generator = ImageGenerator(server_address=os.getenv("COMFYUI_SERVER", "http://127.0.0.1:6700"),
+                                                 max_workers=int(os.getenv("MAX_WORKERS", "8")))
     return image_generator
 
 # 注册退出处理函数，确保程序退出时正确清理资源
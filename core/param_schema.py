@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板参数校验
+
+模板YAML的 schema 段声明各参数的类型、取值范围和可选值，例如：
+
+    schema:
+      width: {type: integer, min: 64, max: 2048, multiple_of: 16}
+      batch_size: {type: integer, min: 1, max: 4}
+      sampler: {type: string, enum: [euler, dpmpp_2m]}
+
+模板加载时编译为校验函数，提交任务时直接调用，不再逐次解析规则
+"""
+
+from typing import Dict, Any, List, Callable
+
+class ParamValidationError(Exception):
+    """
+    请求参数不符合模板声明的规则
+    """
+    def __init__(self, errors: List[str]):
+        super().__init__("；".join(errors))
+        self.errors = errors
+
+class SchemaError(Exception):
+    """
+    模板的 schema 段本身有误
+    """
+    pass
+
+# 类型名 -> 允许的Python类型（bool是int的子类，需单独排除）
+TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+}
+
+RULE_KEYS = ("type", "required", "min", "max", "multiple_of", "enum", "min_length", "max_length")
+
+def _compile_field(name: str, rule: Dict[str, Any]) -> Callable[[Dict[str, Any], List[str]], None]:
+    if not isinstance(rule, dict):
+        raise SchemaError(f"参数 {name} 的规则必须是字典")
+    unknown = set(rule) - set(RULE_KEYS)
+    if unknown:
+        raise SchemaError(f"参数 {name} 包含未知规则: {', '.join(sorted(unknown))}")
+    type_name = rule.get("type")
+    if type_name is not None and type_name not in TYPES:
+        raise SchemaError(f"参数 {name} 的类型无效: {type_name}")
+    types = TYPES.get(type_name)
+    required = bool(rule.get("required", False))
+    minimum, maximum = rule.get("min"), rule.get("max")
+    multiple_of = rule.get("multiple_of")
+    enum = rule.get("enum")
+    allowed = frozenset(enum) if enum is not None else None
+    min_length, max_length = rule.get("min_length"), rule.get("max_length")
+
+    def check(params: Dict[str, Any], errors: List[str]):
+        value = params.get(name)
+        if value is None:
+            if required:
+                errors.append(f"缺少参数 {name}")
+            return
+        if types is not None:
+            if not isinstance(value, types) or (type_name != "boolean" and isinstance(value, bool)):
+                errors.append(f"参数 {name} 必须是 {type_name} 类型")
+                return
+        if minimum is not None and value < minimum:
+            errors.append(f"参数 {name} 不能小于 {minimum}")
+        if maximum is not None and value > maximum:
+            errors.append(f"参数 {name} 不能大于 {maximum}")
+        if multiple_of is not None and value % multiple_of:
+            errors.append(f"参数 {name} 必须是 {multiple_of} 的倍数")
+        if allowed is not None and value not in allowed:
+            errors.append(f"参数 {name} 只能是 {', '.join(map(str, enum))} 之一")
+        if min_length is not None and len(value) < min_length:
+            errors.append(f"参数 {name} 长度不能小于 {min_length}")
+        if max_length is not None and len(value) > max_length:
+            errors.append(f"参数 {name} 长度不能大于 {max_length}")
+
+    return check
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Dict[str, Any]], None]:
+    """
+    把模板的 schema 段编译为校验函数
+
+    Args:
+        schema: 参数名 -> 规则（type、required、min、max、multiple_of、enum、min_length、max_length）
+
+    Returns:
+        校验函数，参数不合法时抛出 ParamValidationError（包含全部错误）
+
+    Raises:
+        SchemaError: schema 本身有误
+    """
+    if not isinstance(schema, dict):
+        raise SchemaError("schema 必须是字典")
+    checks = [_compile_field(name, rule) for name, rule in schema.items()]
+
+    def validate(params: Dict[str, Any]):
+        errors = []
+        for check in checks:
+            check(params, errors)
+        if errors:
+            raise ParamValidationError(errors)
+
+    return validate
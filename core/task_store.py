@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+共享任务表
+
+多进程部署（uvicorn --workers N）时，各进程通过同一个SQLite数据库（WAL模式）共享任务状态和待执行队列：
+提交的任务写入任务表，空闲的进程按提交顺序领取执行，状态变化写回任务表，
+任一进程都能查询和取消任意任务。不依赖外部服务。
+领取带有租约，领取者定期续租；进程意外退出（未排空）后租约到期，任务由其他进程重新领取
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Optional, List, Dict, Any
+
+from utils.paths import DATA_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL UNIQUE,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    lease_until REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    prompt_id TEXT,
+    result TEXT,
+    error TEXT,
+    created_time REAL,
+    start_time REAL,
+    end_time REAL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    spans TEXT,
+    node_timings TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_pending ON tasks (status, owner, seq);
+CREATE INDEX IF NOT EXISTS tasks_updated ON tasks (updated_seq);
+CREATE INDEX IF NOT EXISTS tasks_cancel ON tasks (owner, cancel_requested);
+"""
+
+COLUMNS = ("task_id", "params", "status", "owner", "prompt_id", "result", "error", "created_time",
+           "start_time", "end_time", "progress", "spans", "node_timings", "version", "updated_seq")
+
+# 下一个全局变更序号，在写事务中计算，所有进程共用一个递增序列
+NEXT_SEQ = "(SELECT COALESCE(MAX(updated_seq), 0) + 1 FROM tasks)"
+
+# 可领取的任务：未被领取的任务，或领取者租约已到期的未结束任务（没有租约的旧记录视为已到期），参数为当前时间
+CLAIMABLE = ("((status = 'pending' AND owner IS NULL) OR "
+             "(status IN ('pending', 'running') AND owner IS NOT NULL AND COALESCE(lease_until, 0) < ?))")
+
+class SQLiteTaskStore:
+    """
+    基于SQLite的共享任务表和待执行队列
+    """
+    def __init__(self, db_path: str, retention: float = 7 * 86400, lease: float = 60.0):
+        """
+        Args:
+            db_path: 数据库路径，所有进程必须使用同一个文件
+            retention: 已结束任务的保留时间（秒），过期后由 purge 删除
+            lease: 领取租约的时长（秒），领取者需在到期前调用 renew 续租
+        """
+        self.db_path = db_path
+        self.retention = retention
+        self.lease = lease
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+        if "lease_until" not in columns:
+            # 旧版本创建的任务表，补充租约列（多个进程同时启动时可能已被其他进程添加）
+            try:
+                conn.execute("ALTER TABLE tasks ADD COLUMN lease_until REAL")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):
+                    raise
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, task):
+        """
+        写入新提交的任务（等待领取），任务已存在时忽略
+        """
+        self._conn().execute(
+            f"INSERT OR IGNORE INTO tasks (task_id, params, status, prompt_id, created_time, updated_seq) "
+            f"VALUES (?, ?, ?, ?, ?, {NEXT_SEQ})",
+            (task.task_id, json.dumps(task.params, ensure_ascii=False), task.status, task.prompt_id, task.created_time),
+        )
+
+    def save(self, task):
+        """
+        写回任务的当前状态
+        """
+        self._conn().execute(
+            f"UPDATE tasks SET status = ?, prompt_id = ?, result = ?, error = ?, start_time = ?, end_time = ?, "
+            f"progress = ?, spans = ?, node_timings = ?, version = ?, updated_seq = {NEXT_SEQ} WHERE task_id = ?",
+            (task.status, task.prompt_id, json.dumps(task.result, ensure_ascii=False), task.error,
+             task.start_time, task.end_time, task.progress, json.dumps(task.spans),
+             json.dumps(task.node_timings), task.version, task.task_id),
+        )
+
+    def claim(self, owner: str) -> Optional[Dict[str, Any]]:
+        """
+        领取最早提交的一个未被领取的任务，领取者租约已到期的任务同样可以领取
+
+        重新领取的任务状态恢复为等待中并保留 prompt_id，与 release 放回的任务相同，
+        已提交到ComfyUI的任务只重新关联等待结果
+
+        Args:
+            owner: 领取者标识（进程）
+
+        Returns:
+            dict: 任务记录，没有可领取的任务时返回None
+        """
+        conn = self._conn()
+        now = time.time()
+        # 先用只读查询判断，队列为空时不获取写锁
+        if conn.execute(f"SELECT 1 FROM tasks WHERE {CLAIMABLE} LIMIT 1", (now,)).fetchone() is None:
+            return None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT task_id, owner FROM tasks WHERE {CLAIMABLE} ORDER BY seq LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                if row[1] is None:
+                    conn.execute("UPDATE tasks SET owner = ?, lease_until = ? WHERE task_id = ?",
+                                 (owner, now + self.lease, row[0]))
+                else:
+                    conn.execute(
+                        f"UPDATE tasks SET owner = ?, lease_until = ?, status = 'pending', version = version + 1, "
+                        f"updated_seq = {NEXT_SEQ} WHERE task_id = ?",
+                        (owner, now + self.lease, row[0]))
+                row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM tasks WHERE task_id = ?", (row[0],)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self._row(row) if row else None
+
+    def renew(self, owner: str) -> int:
+        """
+        为领取者持有的所有未结束任务续租
+
+        Returns:
+            int: 续租的任务数
+        """
+        cursor = self._conn().execute(
+            "UPDATE tasks SET lease_until = ? WHERE owner = ? AND status IN ('pending', 'running')",
+            (time.time() + self.lease, owner),
+        )
+        return cursor.rowcount
+
+    def release(self, task_id: str, prompt_id: Optional[str] = None):
+        """
+        放回已领取但未完成的任务（进程停止前调用），由其他进程重新领取；
+        已提交到ComfyUI的任务保留 prompt_id，领取者只重新关联等待结果
+        """
+        self._conn().execute(
+            f"UPDATE tasks SET owner = NULL, lease_until = NULL, status = 'pending', prompt_id = ?, version = version + 1, "
+            f"updated_seq = {NEXT_SEQ} WHERE task_id = ? AND status IN ('pending', 'running')",
+            (prompt_id, task_id),
+        )
+
+    def request_cancel(self, task_id: str) -> bool:
+        """
+        取消任务：未被领取的任务直接标记为已取消，已被领取的任务由领取者执行取消
+
+        Returns:
+            bool: 是否发出了取消请求（任务不存在或已结束时返回False）
+        """
+        conn = self._conn()
+        cursor = conn.execute(
+            f"UPDATE tasks SET status = 'cancelled', end_time = ?, version = version + 1, updated_seq = {NEXT_SEQ} "
+            f"WHERE task_id = ? AND status = 'pending' AND owner IS NULL",
+            (time.time(), task_id),
+        )
+        if cursor.rowcount:
+            return True
+        cursor = conn.execute(
+            "UPDATE tasks SET cancel_requested = 1 WHERE task_id = ? AND status IN ('pending', 'running')",
+            (task_id,),
+        )
+        return cursor.rowcount > 0
+
+    def cancel_requests(self, owner: str) -> List[str]:
+        """
+        获取其他进程发给该领取者的取消请求，并清除请求标记
+        """
+        conn = self._conn()
+        task_ids = [row[0] for row in conn.execute(
+            "SELECT task_id FROM tasks WHERE owner = ? AND cancel_requested = 1", (owner,))]
+        if task_ids:
+            conn.executemany("UPDATE tasks SET cancel_requested = 0 WHERE task_id = ?", [(task_id,) for task_id in task_ids])
+        return task_ids
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        record = dict(zip(COLUMNS, row))
+        record["params"] = json.loads(record["params"])
+        for column in ("result", "spans", "node_timings"):
+            record[column] = json.loads(record[column]) if record[column] else None
+        return record
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询单个任务记录
+        """
+        row = self._conn().execute(f"SELECT {', '.join(COLUMNS)} FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def get_many(self, task_ids: Optional[List[str]] = None, since: int = 0) -> List[Dict[str, Any]]:
+        """
+        批量查询任务记录
+
+        Args:
+            task_ids: 任务ID列表，为None时查询所有任务
+            since: 只返回变更序号大于该值的任务
+        """
+        conn = self._conn()
+        if task_ids is None:
+            rows = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM tasks WHERE updated_seq > ? ORDER BY seq", (since,)).fetchall()
+        else:
+            rows = []
+            # 分批查询，避免超过SQLite的参数数量上限
+            for i in range(0, len(task_ids), 500):
+                chunk = task_ids[i:i + 500]
+                rows.extend(conn.execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM tasks WHERE updated_seq > ? "
+                    f"AND task_id IN ({', '.join('?' * len(chunk))})", [since] + chunk).fetchall())
+        return [self._row(row) for row in rows]
+
+    def pending_count(self) -> int:
+        """
+        可领取的任务数（包括领取者租约已到期的任务）
+        """
+        return self._conn().execute(f"SELECT COUNT(*) FROM tasks WHERE {CLAIMABLE}", (time.time(),)).fetchone()[0]
+
+    def current_seq(self) -> int:
+        """
+        获取当前最新的全局变更序号
+        """
+        return self._conn().execute("SELECT COALESCE(MAX(updated_seq), 0) FROM tasks").fetchone()[0]
+
+    def purge(self) -> int:
+        """
+        删除超过保留时间的已结束任务
+
+        Returns:
+            int: 删除的任务数
+        """
+        cursor = self._conn().execute(
+            "DELETE FROM tasks WHERE status IN ('completed', 'failed', 'cancelled') AND end_time < ?",
+            (time.time() - self.retention,),
+        )
+        return cursor.rowcount
+
+_task_store = None
+_task_store_lock = threading.Lock()
+
+def get_task_store() -> Optional[SQLiteTaskStore]:
+    """
+    获取共享任务表，懒加载模式
+
+    环境变量 TASK_STORE=sqlite 时启用，数据库路径由 TASK_STORE_DB 控制（默认为数据目录下的 tasks.db），
+    已结束任务的保留时间由 TASK_STORE_RETENTION 控制（秒，默认7天），领取租约时长由 TASK_STORE_LEASE 控制（秒，默认60）。
+    未启用时返回None，任务只保存在进程内
+    """
+    global _task_store
+    if _task_store is None and os.getenv("TASK_STORE", "").lower() == "sqlite":
+        with _task_store_lock:
+            if _task_store is None:
+                _task_store = SQLiteTaskStore(
+                    os.getenv("TASK_STORE_DB", os.path.join(DATA_DIR, "tasks.db")),
+                    retention=float(os.getenv("TASK_STORE_RETENTION", str(7 * 86400))),
+                    lease=float(os.getenv("TASK_STORE_LEASE", "60")),
+                )
+    return _task_store
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+工作流模板目录
+
+模板YAML只解析一次并缓存，按修改时间检查模板目录变化后自动刷新。
+同时预先生成 /api/workflows 的JSON响应体和ETag
+"""
+
+import os
+import copy
+import json
+import hashlib
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.paths import RESOURCES_DIR
+from core.param_schema import compile_schema, ParamValidationError
+
+# 模板目录
+TEMPLATES_DIR = os.path.join(RESOURCES_DIR, "templates")
+
+class WorkflowCatalog:
+    """
+    工作流模板目录，缓存模板配置和工作流JSON
+    """
+    def __init__(self, templates_dir: str = TEMPLATES_DIR, check_interval: float = 2.0):
+        """
+        初始化模板目录
+
+        Args:
+            templates_dir: 模板目录
+            check_interval: 检查模板文件变化的最小间隔（秒）
+        """
+        self.templates_dir = templates_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._last_check = 0.0
+        self._templates = {}    # 文件名 -> 模板配置
+        self._items = []        # /api/workflows 返回的列表
+        self._body = b"[]"
+        self._etag = '""'
+        self._errors = {}       # 文件名 -> 加载错误
+        self._validators = {}   # 文件名 -> 编译后的参数校验函数
+        self._workflow_files = {}  # 工作流JSON路径 -> (签名, 内容)
+
+    def _scan(self) -> Tuple:
+        """
+        获取模板目录的签名：目录和每个模板文件的修改时间与大小
+        """
+        entries = []
+        try:
+            with os.scandir(self.templates_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith((".yml", ".yaml")):
+                        stat = entry.stat()
+                        entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            pass
+        return tuple(sorted(entries))
+
+    def _build(self, signature: Tuple):
+        import yaml
+        templates = {}
+        items = []
+        errors = {}
+        validators = {}
+        for name, _, _ in signature:
+            path = os.path.join(self.templates_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = yaml.load(f, Loader=yaml.FullLoader) or {}
+                # 参数校验规则随模板一起编译，模板变化时重新编译
+                validators[name] = compile_schema(data.get("schema") or {})
+            except Exception as e:
+                errors[name] = str(e)
+                continue
+            templates[name] = data
+            items.append({
+                "name": data.get("name") or name,
+                "path": name,
+                "schema": data.get("schema") or {},
+            })
+        body = json.dumps(items, ensure_ascii=False).encode("utf-8")
+        self._templates = templates
+        self._validators = validators
+        self._items = items
+        self._errors = errors
+        self._body = body
+        self._etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self._signature = signature
+
+    def refresh(self, force: bool = False):
+        """
+        检查模板目录是否变化，变化时重新加载
+
+        Args:
+            force: 忽略检查间隔立即检查
+        """
+        now = time.monotonic()
+        if not force and self._signature is not None and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            signature = self._scan()
+            if signature != self._signature:
+                self._build(signature)
+
+    def list_workflows(self) -> List[Dict[str, str]]:
+        """
+        获取工作流列表
+        """
+        self.refresh()
+        return self._items
+
+    def snapshot(self) -> Tuple[bytes, str]:
+        """
+        获取预先生成的工作流列表JSON和ETag
+        """
+        self.refresh()
+        return self._body, self._etag
+
+    def get_template(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取模板配置（只读，调用方不要修改返回值）
+
+        Args:
+            name: 模板文件名
+
+        Returns:
+            dict: 模板配置，不存在时返回None
+        """
+        self.refresh()
+        return self._templates.get(name)
+
+    def validate(self, name: str, params: Dict[str, Any]):
+        """
+        按模板声明的 schema 校验请求参数
+
+        Args:
+            name: 模板文件名
+            params: 请求参数
+
+        Raises:
+            ParamValidationError: 模板不存在或参数不合法
+        """
+        self.refresh()
+        validator = self._validators.get(name)
+        if validator is None:
+            raise ParamValidationError([f"工作流模板不存在: {name}"])
+        validator(params)
+
+    def load_workflow(self, path: str) -> Dict[str, Any]:
+        """
+        读取工作流JSON，按修改时间缓存解析结果，返回可修改的副本
+
+        Args:
+            path: 工作流JSON文件路径
+        """
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._workflow_files.get(path)
+        if cached is None or cached[0] != signature:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = (signature, json.load(f))
+            self._workflow_files[path] = cached
+        return copy.deepcopy(cached[1])
+
+    @property
+    def errors(self) -> Dict[str, str]:
+        """
+        加载失败的模板及错误信息
+        """
+        return self._errors
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_workflow_catalog() -> WorkflowCatalog:
+    """
+    获取全局工作流模板目录，懒加载模式
+
+    检查间隔由环境变量 TEMPLATE_CHECK_INTERVAL 控制（秒），默认2秒
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = WorkflowCatalog(check_interval=float(os.getenv("TEMPLATE_CHECK_INTERVAL", "2")))
+    return _catalog
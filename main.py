@@ -17,6 +17,7 @@ def main():
     parser.add_argument("action", choices=["api", "generate", "test"], help="要执行的操作")
     parser.add_argument("--server", type=str, default="http://10.10.10.59:6700", help="ComfyUI服务器地址")
     parser.add_argument("--port", type=int, default=8000, help="API服务端口")
+    parser.add_argument("--reload", action="store_true", help="开发模式，代码变化时自动重启API服务")
     
     # 解析命令行参数
     args, unknown_args = parser.parse_known_args()
@@ -26,7 +27,8 @@ def main():
         # 启动API服务
         import uvicorn
         print("启动 ComfyUI API 服务...")
-        uvicorn.run("api.fastapi_app:app", host="0.0.0.0", port=args.port, reload=True)
+        os.environ["COMFYUI_SERVER"] = args.server
+        uvicorn.run("app:app", host="0.0.0.0", port=args.port, reload=args.reload)
     
     elif args.action == "generate":
         # 生成图像
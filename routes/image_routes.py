@@ -1,15 +1,30 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
-from core.image_generator import  get_image_generator
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, Request, Header
+from pydantic import BaseModel, Field
+from typing import List, Optional, Literal
+from core.image_generator import  get_image_generator, GeneratorDrainingError
+from core.workflow_catalog import get_workflow_catalog
+from core.param_schema import ParamValidationError
+from utils.executor import run_blocking, run_backend
+from utils.http_client import get_async_client
+from utils.proxy_cache import get_proxy_cache, ProxyFetchError
+from utils.image_variants import build_spec, get_variant, FIT_MODES
+from utils.fast_json import FastJSONRoute, FastJSONResponse
+from utils.zip_stream import iter_zip
+from utils.idempotency import get_idempotency_store, IdempotencyConflictError
+from utils.history_index import get_history_index
+from starlette.background import BackgroundTask
+from fastapi.responses import FileResponse, StreamingResponse, Response
 from fastapi import HTTPException, Query
-import httpx
 import io
-from PIL import Image
+import os
+import hashlib
+import json
+import time
+import uuid
+import mimetypes
 import logging
 
-router = APIRouter(prefix="/api", tags=["Image Generation"])
-image_generator = get_image_generator()
+router = APIRouter(prefix="/api", tags=["Image Generation"], route_class=FastJSONRoute)
 class ImageGenerationRequest(BaseModel):
     prompt: str = ""
     negative_prompt: str = ""
@@ -17,130 +32,480 @@ class ImageGenerationRequest(BaseModel):
     width: int = 512
     height: int = 512
     batch_size: int = 4
+    seed: Optional[int] = Field(None, description="随机种子，为空时使用工作流模板中的种子")
+    lane: Literal["interactive", "deferred"] = Field("interactive", description="通道：deferred 为延后通道，空闲时或在放行时间窗口内才执行")
+
+class TaskArchiveRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=1000, description="任务ID列表")
+
+class TaskStatusBatchRequest(BaseModel):
+    ids: Optional[List[str]] = Field(None, max_length=1000, description="任务ID列表，为空时查询所有任务")
+    fields: Optional[List[str]] = Field(None, description="返回字段列表，为空时返回全部字段")
+    since: int = Field(0, ge=0, description="游标，只返回该游标之后发生变化的任务")
 
 @router.post("/generate_image")
-async def generate_image(request: ImageGenerationRequest):
+async def generate_image(
+    request: ImageGenerationRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255, description="幂等键，重试时使用相同的键不会重复提交任务"),
+):
     """
     生成图像API
     
-    接收图像生成参数，提交图像生成任务，并返回任务ID
+    接收图像生成参数，提交图像生成任务，并返回任务ID。
+    带 Idempotency-Key 请求头时，相同的键在有效期内只提交一次，重复请求返回原任务ID和当前状态
     """
+    params = request.dict()
+    if idempotency_key is None:
+        try:
+            # 启用共享任务表或延后通道时会写入SQLite，不在事件循环中执行
+            task_id = await run_blocking(get_image_generator().generate_image, **params)
+        except ParamValidationError as e:
+            raise HTTPException(status_code=422, detail=f"参数校验失败: {str(e)}")
+        except GeneratorDrainingError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"提交图像生成任务失败: {str(e)}")
+        return {"status": "success", "task_id": task_id, "message": "任务已提交，请使用任务ID查询状态"}
+    
+    fingerprint = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
     try:
-        params = request.dict()
-        task_id = image_generator.generate_image(**params)
+        task_id, created = await run_blocking(
+            get_idempotency_store().get_or_create,
+            idempotency_key, fingerprint, lambda: get_image_generator().generate_image(**params))
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ParamValidationError as e:
+        raise HTTPException(status_code=422, detail=f"参数校验失败: {str(e)}")
+    except GeneratorDrainingError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"提交图像生成任务失败: {str(e)}")
+    if created:
         return {"status": "success", "task_id": task_id, "message": "任务已提交，请使用任务ID查询状态"}
+    task = await run_blocking(get_image_generator().get_task, task_id)
+    return FastJSONResponse(
+        {
+            "status": "success",
+            "task_id": task_id,
+            "task_status": task.status if task is not None else "not_found",
+            "message": "相同幂等键的任务已提交，返回原任务",
+        },
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+@router.post("/generate_image/sync")
+async def generate_image_sync(
+    request: ImageGenerationRequest,
+    http_request: Request,
+    timeout: float = Query(300, gt=0, le=1800, description="服务端等待超时秒数，超时后取消任务"),
+):
+    """
+    同步生成图像API
+    
+    提交任务后等待生成完成，直接在响应中流式返回图像数据；
+    生成多张图像时返回 multipart/mixed 流。客户端断开连接或等待超时时取消任务
+    """
+    if request.lane == "deferred":
+        raise HTTPException(status_code=422, detail="同步生成接口不支持延后通道")
+    try:
+        task_id = await run_blocking(get_image_generator().generate_image, **request.dict())
+    except ParamValidationError as e:
+        raise HTTPException(status_code=422, detail=f"参数校验失败: {str(e)}")
+    except GeneratorDrainingError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"提交图像生成任务失败: {str(e)}")
+    
+    deadline = time.monotonic() + timeout
+    while True:
+        # 多进程部署时任务可能在其他进程执行，每次重新获取任务状态
+        task = await run_blocking(get_image_generator().get_task, task_id)
+        if task is None or task.is_finished():
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            await run_backend(get_image_generator().cancel_task, task_id)
+            raise HTTPException(status_code=504, detail=f"等待图像生成超时，任务已取消: {task_id}")
+        # 每秒检查一次客户端连接状态，状态变化时立即唤醒
+        changed = await get_image_generator().wait_task_async(task_id, min(remaining, 1.0), task.version)
+        if not changed and await http_request.is_disconnected():
+            await run_backend(get_image_generator().cancel_task, task_id)
+            logging.info(f"客户端已断开连接，取消任务: {task_id}")
+            return Response(status_code=499)
+    
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {task_id}")
+    if task.status != "completed":
+        raise HTTPException(status_code=500, detail=f"图像生成失败: {task.error}")
+    files = await run_blocking(get_image_generator().get_task_files, task_id)
+    if not files:
+        raise HTTPException(status_code=500, detail="图像生成失败，未找到输出图像")
+    
+    headers = {"X-Task-Id": task_id}
+    if len(files) == 1:
+        return FileResponse(files[0], media_type=_guess_type(files[0]), headers=headers)
+    boundary = uuid.uuid4().hex
+    return StreamingResponse(
+        _iter_multipart(files, boundary),
+        media_type=f"multipart/mixed; boundary={boundary}",
+        headers=headers,
+    )
 
 @router.get("/task_status/{task_id}")
-async def get_task_status(task_id: str):
+async def get_task_status(task_id: str, wait: float = Query(0, ge=0, le=60, description="长轮询等待秒数，任务状态变化或超时后返回")):
     """
     获取任务状态API
     
-    根据任务ID获取图像生成任务的状态
+    根据任务ID获取图像生成任务的状态。指定wait参数时挂起请求，
+    直到任务状态发生变化或等待超时再返回，避免客户端频繁轮询
     """
     try:
-        status = image_generator.get_task_status(task_id)
+        if wait > 0:
+            await get_image_generator().wait_task_async(task_id, wait)
+        status = await run_backend(get_image_generator().get_task_status, task_id)
         if status["status"] == "not_found":
             raise HTTPException(status_code=404, detail=f"任务不存在: {task_id}")
-        return status
+        # 直接返回响应对象，跳过 jsonable_encoder 逐字段转换
+        return FastJSONResponse(status)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取任务状态失败: {str(e)}")
 
+@router.post("/task_status")
+async def get_tasks_status(request: TaskStatusBatchRequest):
+    """
+    批量获取任务状态API
+    
+    一次请求返回多个任务的状态，支持字段裁剪和按游标过滤，
+    响应中的cursor可作为下一次请求的since参数，只获取之后有变化的任务
+    """
+    try:
+        data = await run_backend(get_image_generator().get_tasks_status, request.ids, request.fields, request.since)
+        return FastJSONResponse({"status": "success", **data})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量获取任务状态失败: {str(e)}")
+
+@router.get("/task_status")
+async def get_tasks_status_query(
+    ids: str = Query(..., description="逗号分隔的任务ID列表"),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段列表"),
+    since: int = Query(0, ge=0, description="游标，只返回该游标之后发生变化的任务"),
+):
+    """
+    批量获取任务状态API（GET形式）
+    """
+    task_ids = [task_id for task_id in ids.split(",") if task_id]
+    if len(task_ids) > 1000:
+        raise HTTPException(status_code=400, detail="单次最多查询1000个任务")
+    field_list = [field for field in fields.split(",") if field] if fields else None
+    return await get_tasks_status(TaskStatusBatchRequest(ids=task_ids, fields=field_list, since=since))
+
+@router.get("/tasks/{task_id}/archive")
+async def get_task_archive(task_id: str):
+    """
+    打包下载任务输出API
+    
+    将任务的所有输出图像边读边打包为ZIP（不压缩）流式返回，
+    不在内存或临时文件中构建压缩包，下载立即开始
+    """
+    return await _archive_response([task_id], f"{task_id}.zip", prefix_task_id=False)
+
+@router.post("/tasks/archive")
+async def get_tasks_archive(request: TaskArchiveRequest):
+    """
+    批量打包下载任务输出API
+    
+    将多个任务的输出图像打包为一个ZIP流式返回，压缩包内按任务ID分目录
+    """
+    return await _archive_response(request.ids, "outputs.zip", prefix_task_id=True)
+
+@router.get("/tasks/archive")
+async def get_tasks_archive_query(ids: str = Query(..., description="逗号分隔的任务ID列表")):
+    """
+    批量打包下载任务输出API（GET形式）
+    """
+    task_ids = [task_id for task_id in ids.split(",") if task_id]
+    if not task_ids:
+        raise HTTPException(status_code=400, detail="请提供任务ID")
+    if len(task_ids) > 1000:
+        raise HTTPException(status_code=400, detail="单次最多打包1000个任务")
+    return await get_tasks_archive(TaskArchiveRequest(ids=task_ids))
+
+async def _archive_response(task_ids: List[str], filename: str, prefix_task_id: bool) -> StreamingResponse:
+    try:
+        entries, missing = await run_blocking(get_image_generator().get_archive_entries, task_ids, prefix_task_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取输出文件失败: {str(e)}")
+    if missing:
+        raise HTTPException(status_code=404, detail=f"任务不存在或输出文件已被清理: {', '.join(missing[:20])}")
+    return StreamingResponse(
+        iter_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/stats/stages")
+async def get_stage_stats(workflow: Optional[str] = Query(None, description="工作流模板名，为空时返回全部")):
+    """
+    任务阶段耗时统计API
+    
+    按工作流汇总最近任务各阶段的耗时（次数、平均值、p50/p95/p99、最大值），
+    用于判断时间花在后端执行还是本服务的排队、提交、下载和保存上
+    """
+    return FastJSONResponse({"status": "success", "workflows": get_image_generator().get_stage_stats(workflow)})
+
+@router.get("/deferred")
+async def get_deferred_status():
+    """
+    延后通道进度API
+
+    返回延后任务的各状态数量、完成比例、最近的完成速率、预计剩余时间和当前的放行条件
+    """
+    try:
+        status = await run_blocking(get_image_generator().get_deferred_status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取延后通道进度失败: {str(e)}")
+    return FastJSONResponse({"status": "success", "deferred": status})
+
+@router.get("/backend")
+async def get_backend_status():
+    """
+    后端状态API
+
+    返回后台刷新的ComfyUI队列和系统状态快照，以及各数据源的刷新间隔和快照年龄，不请求后端
+    """
+    return FastJSONResponse({"status": "success", "backend": get_image_generator().get_backend_status()})
+
+@router.get("/stats/concurrency")
+async def get_concurrency_stats():
+    """
+    并发控制状态API
+
+    返回当前同时提交到ComfyUI的任务数上限及其调整依据：执行中的任务数、
+    最近一次观察到的后端队列、累计调整次数和最近的完成速率
+    """
+    return FastJSONResponse({"status": "success", "concurrency": get_image_generator().get_concurrency()})
+
+@router.get("/stats/nodes")
+async def get_node_stats(workflow: Optional[str] = Query(None, description="工作流模板名，为空时返回全部")):
+    """
+    节点执行耗时统计API
+    
+    按工作流汇总最近任务中每个节点的执行耗时，节点按平均耗时从高到低排列，
+    用于找出VAE解码、放大等耗时节点。需要安装 websocket-client 接收ComfyUI执行事件
+    """
+    try:
+        workflows = await run_blocking(get_image_generator().get_node_stats, workflow)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取节点耗时统计失败: {str(e)}")
+    return FastJSONResponse({"status": "success", "workflows": workflows})
+
+@router.get("/history")
+async def get_history(
+    q: Optional[str] = Query(None, min_length=1, max_length=200, description="在正向和反向提示词中搜索"),
+    workflow: Optional[str] = Query(None, description="工作流模板名"),
+    status: Optional[str] = Query(None, description="任务状态：completed、failed、cancelled"),
+    width: Optional[int] = Query(None, ge=1, description="图像宽度"),
+    height: Optional[int] = Query(None, ge=1, description="图像高度"),
+    since: Optional[float] = Query(None, description="结束时间下限（时间戳，含）"),
+    until: Optional[float] = Query(None, description="结束时间上限（时间戳，不含）"),
+    cursor: Optional[int] = Query(None, ge=1, description="上一页返回的 next_cursor"),
+    limit: int = Query(50, ge=1, le=500, description="每页条数"),
+):
+    """
+    生成历史查询API
+    
+    查询已结束任务的提示词、参数、输出文件和阶段耗时，从新到旧排列，
+    使用 next_cursor 翻页，每页耗时与翻到第几页无关
+    """
+    try:
+        page = await run_blocking(get_history_index().query, q=q, workflow=workflow, status=status,
+                                  width=width, height=height, since=since, until=until,
+                                  cursor=cursor, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"查询生成历史失败: {str(e)}")
+    return FastJSONResponse({"status": "success", **page})
+
 @router.get("/get_file/{prompt_id}")
-async def get_file(prompt_id: str):
+async def get_file(prompt_id: str, request: Request):
     """
     获取图像文件API
     
-    根据prompt_id获取生成的图像文件路径
+    根据任务ID或prompt_id从输出索引中获取生成的图像文件路径，
+    响应带ETag，文件未变化时返回304
     """
     try:
-        file_path = image_generator.get_files(prompt_id)
-        return {"status": "success", "file_path": file_path}
+        record = await run_blocking(get_image_generator().get_output_record, prompt_id)
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"获取文件失败: {str(e)}")
+    headers = {"ETag": record["etag"]}
+    if request.headers.get("if-none-match") == record["etag"]:
+        return Response(status_code=304, headers=headers)
+    files = record["files"]
+    return FastJSONResponse(
+        {"status": "success", "file_path": [f["url"] for f in files], "files": files},
+        headers=headers,
+    )
+
 @router.get("/workflows")
-async def get_workflows():
+async def get_workflows(request: Request):
     """
     获取工作流程
+    
+    返回预先生成的模板列表JSON，模板目录变化时自动刷新；支持ETag条件请求
     """
     try:
-        data = image_generator.get_workflows()
-        return data
+        body, etag = await run_blocking(get_workflow_catalog().snapshot)
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"获取文件失败: {str(e)}")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+# 代理远程图片时使用的请求头，模拟浏览器访问
+PROXY_REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Accept-Encoding": "gzip, deflate",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+# 代理图片响应头
+PROXY_RESPONSE_HEADERS = {
+    "Cache-Control": "public, max-age=3600",  # 缓存1小时
+    "Access-Control-Allow-Origin": "*",  # 允许跨域
+    "Access-Control-Allow-Methods": "GET",
+    "Access-Control-Allow-Headers": "*",
+}
 
 @router.get("/proxy_image")
-async def proxy_image(url: str = Query(..., description="要代理的远程图片URL")):
+async def proxy_image(
+    request: Request,
+    url: str = Query(..., description="要代理的远程图片URL"),
+    reencode: bool = Query(False, description="是否使用PIL重新编码图片，默认直接返回原始数据"),
+    w: int = Query(None, description="目标宽度"),
+    h: int = Query(None, description="目标高度"),
+    fit: str = Query("contain", description=f"缩放方式: {', '.join(FIT_MODES)}"),
+):
     """
     代理远程图片资源
     
-    通过代理访问远程图片，解决跨域问题
+    通过代理访问远程图片，解决跨域问题。图片经内存和磁盘两级缓存，过期后向源站条件验证；
+    超过缓存上限的大图使用共享连接池流式透传。指定reencode时才解码并重新编码（在线程池中执行）。
+    指定w/h时返回缩放后的图片，输出格式根据Accept请求头选择，缩放结果缓存在磁盘上
     """
     try:
-        # 设置请求头，模拟浏览器访问
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Accept": "image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Connection": "keep-alive",
-            "Upgrade-Insecure-Requests": "1",
-        }
-        
-        # 使用httpx客户端获取远程图片
-        with httpx.Client(timeout=30.0, follow_redirects=True) as client:
-            response = client.get(url, headers=headers)
-            response.raise_for_status()
-            
-            # 检查响应内容类型
-            content_type = response.headers.get("content-type", "")
-            if not content_type.startswith("image/"):
-                raise HTTPException(status_code=400, detail="URL不是有效的图片资源")
-            
-            # 获取图片数据
-            image_data = response.content
-            
-            # 尝试使用PIL验证图片格式
-            try:
-                image = Image.open(io.BytesIO(image_data))
-                # 重新保存为JPEG格式（可根据需要调整）
-                img_buffer = io.BytesIO()
-                
-                # 根据原始格式选择保存格式
-                if image.format == "PNG":
-                    image.save(img_buffer, format="PNG", quality=95)
-                    content_type = "image/png"
-                elif image.format == "GIF":
-                    image.save(img_buffer, format="GIF")
-                    content_type = "image/gif"
-                else:
-                    image.save(img_buffer, format="JPEG", quality=95, optimize=True)
-                    content_type = "image/jpeg"
-                
-                img_buffer.seek(0)
-                image_data = img_buffer.getvalue()
-                
-            except Exception as img_error:
-                logging.warning(f"图片处理失败，直接返回原始数据: {img_error}")
-            
-            # 返回图片流响应
-            return StreamingResponse(
-                io.BytesIO(image_data),
-                media_type=content_type,
-                headers={
-                    "Cache-Control": "public, max-age=3600",  # 缓存1小时
-                    "Access-Control-Allow-Origin": "*",  # 允许跨域
-                    "Access-Control-Allow-Methods": "GET",
-                    "Access-Control-Allow-Headers": "*",
-                }
-            )
-            
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail=f"获取远程图片失败: {e.response.status_code}")
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=500, detail=f"请求远程图片失败: {str(e)}")
+        spec = build_spec(w, h, fit, request.headers.get("accept", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        result = await get_proxy_cache().fetch(url, get_async_client(), PROXY_REQUEST_HEADERS)
+    except ProxyFetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"代理图片失败: {str(e)}")
+    
+    if spec is not None:
+        # 缩放变体：源图片数据在进程池中解码和编码
+        if result.stream is not None:
+            try:
+                body = b"".join([chunk async for chunk in result.iter_stream()])
+            finally:
+                await result.stream.aclose()
+            source_id = f"{url}:{hashlib.sha256(body).hexdigest()}"
+        else:
+            body = result.image.body
+            source_id = f"{url}:{result.image.response_etag}"
+        try:
+            variant_path = await get_variant(body, source_id, spec)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"图片处理失败: {str(e)}")
+        headers = dict(PROXY_RESPONSE_HEADERS)
+        headers["Vary"] = "Accept"
+        return FileResponse(variant_path, media_type=spec.content_type, headers=headers)
+    
+    if result.stream is not None:
+        # 透传模式：边接收边发送，响应结束后释放连接回连接池
+        response = result.stream
+        headers = dict(PROXY_RESPONSE_HEADERS)
+        if "content-length" in response.headers and "content-encoding" not in response.headers:
+            headers["Content-Length"] = response.headers["content-length"]
+        return StreamingResponse(
+            result.iter_stream(),
+            media_type=response.headers.get("content-type"),
+            headers=headers,
+            background=BackgroundTask(response.aclose),
+        )
+    
+    image = result.image
+    headers = dict(PROXY_RESPONSE_HEADERS)
+    headers["X-Cache"] = result.source
+    if not reencode:
+        headers["ETag"] = image.response_etag
+        if request.headers.get("if-none-match") == image.response_etag:
+            return Response(status_code=304, headers=headers)
+    if image.last_modified:
+        headers["Last-Modified"] = image.last_modified
+    
+    image_data, content_type = image.body, image.content_type
+    if reencode:
+        # 图片解码和重新编码是CPU密集操作，放到线程池中执行
+        image_data, content_type = await run_blocking(_reencode_image, image_data, content_type)
+    return Response(image_data, media_type=content_type, headers=headers)
+
+def _reencode_image(image_data: bytes, content_type: str):
+    """
+    使用PIL验证并重新编码图片，失败时返回原始数据
+
+    Returns:
+        tuple: (图片数据, 内容类型)
+    """
+    from PIL import Image
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        # 重新保存为JPEG格式（可根据需要调整）
+        img_buffer = io.BytesIO()
+        
+        # 根据原始格式选择保存格式
+        if image.format == "PNG":
+            image.save(img_buffer, format="PNG", quality=95)
+            content_type = "image/png"
+        elif image.format == "GIF":
+            image.save(img_buffer, format="GIF")
+            content_type = "image/gif"
+        else:
+            image.save(img_buffer, format="JPEG", quality=95, optimize=True)
+            content_type = "image/jpeg"
+        
+        return img_buffer.getvalue(), content_type
+    except Exception as img_error:
+        logging.warning(f"图片处理失败，直接返回原始数据: {img_error}")
+        return image_data, content_type
+
+def _guess_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+def _iter_multipart(files: List[str], boundary: str, chunk_size: int = 64 * 1024):
+    """
+    逐块读取文件生成 multipart/mixed 响应体，不把整批图像读入内存
+    """
+    for path in files:
+        name = os.path.basename(path)
+        yield (
+            f"--{boundary}\r\n"
+            f"Content-Type: {_guess_type(path)}\r\n"
+            f"Content-Length: {os.path.getsize(path)}\r\n"
+            f"Content-Disposition: attachment; filename=\"{name}\"\r\n\r\n"
+        ).encode()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
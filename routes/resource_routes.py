@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+import os
+
+from utils.paths import RESOURCES_DIR
+from utils.image_variants import build_spec, get_variant, file_source_id, FIT_MODES
+from utils.static_files import conditional_file_response
+
+router = APIRouter(tags=["Resources"])
+
+# 生成图像的输出目录
+OUTPUT_DIR = os.path.join(RESOURCES_DIR, "img")
+
+@router.get("/resources/img/{path:path}")
+async def get_output_image(
+    path: str,
+    request: Request,
+    w: int = Query(None, description="目标宽度"),
+    h: int = Query(None, description="目标高度"),
+    fit: str = Query("contain", description=f"缩放方式: {', '.join(FIT_MODES)}"),
+):
+    """
+    获取生成的图像
+
+    未指定宽高时返回原图；指定w/h时返回缩放后的图像，
+    输出格式根据Accept请求头在AVIF/WebP/JPEG中选择，生成的变体缓存在磁盘上。
+    输出文件路径包含任务ID，内容不会变化，响应使用 immutable 长缓存，支持条件请求和Range
+    """
+    file_path = os.path.normpath(os.path.join(OUTPUT_DIR, path))
+    if not file_path.startswith(OUTPUT_DIR + os.sep) or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    try:
+        spec = build_spec(w, h, fit, request.headers.get("accept", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if spec is None:
+        return conditional_file_response(file_path, request.headers)
+
+    try:
+        variant_path = await get_variant(file_path, file_source_id(file_path), spec)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"图像处理失败: {str(e)}")
+    return conditional_file_response(variant_path, request.headers, media_type=spec.content_type, headers={"Vary": "Accept"})
@@ -0,0 +1,122 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+import core.image_generator
+from core.health import get_health_monitor
+from utils.fast_json import FastJSONResponse
+from utils import image_variants
+from utils.executor import executor_sizes, run_blocking
+from utils.metrics import REGISTRY, CONTENT_TYPE, EXECUTOR_INFLIGHT, WORKERS_BUSY
+from utils.proxy_cache import get_proxy_cache
+
+router = APIRouter(tags=["System"])
+
+# 各缓存中算作命中的结果
+CACHE_HIT_RESULTS = {
+    "proxy": ("memory", "disk", "revalidated"),
+    "variant": ("hit",),
+}
+
+def _collect_tasks():
+    """
+    采集生成队列、任务状态和工作线程利用率
+    """
+    generator = core.image_generator.image_generator
+    if generator is None:
+        return []
+    data = generator.get_metrics()
+    busy = sum(value for _, value in WORKERS_BUSY.collect()[3])
+    return [
+        ("comfyapi_queue_depth", "gauge", "各通道排队中的任务数",
+         [({"lane": lane}, depth) for lane, depth in data["queue_depth"].items()]),
+        ("comfyapi_tasks", "gauge", "各状态的任务数",
+         [({"state": state}, count) for state, count in sorted(data["tasks"].items())]),
+        ("comfyapi_workers", "gauge", "生成任务工作线程数", [({}, data["workers"])]),
+        ("comfyapi_worker_utilisation", "gauge", "生成任务工作线程利用率",
+         [({}, busy / data["workers"] if data["workers"] else 0.0)]),
+        ("comfyapi_concurrency_limit", "gauge", "同时提交到ComfyUI的任务数上限（自适应调整）",
+         [({}, data["concurrency"]["limit"])]),
+        ("comfyapi_inflight", "gauge", "已提交到ComfyUI尚未结束的任务数", [({}, data["concurrency"]["inflight"])]),
+        ("comfyapi_completions_per_minute", "gauge", "最近的任务完成速率（个/分钟）",
+         [({}, data["concurrency"]["completions_per_minute"])]),
+    ]
+
+def _collect_executors():
+    """
+    采集线程池利用率
+    """
+    sizes = executor_sizes()
+    inflight = {labels["pool"]: value for labels, value in EXECUTOR_INFLIGHT.collect()[3]}
+    return [
+        ("comfyapi_executor_workers", "gauge", "线程池最大线程数",
+         [({"pool": pool}, size) for pool, size in sorted(sizes.items())]),
+        ("comfyapi_executor_utilisation", "gauge", "线程池利用率（执行和排队中的调用数/最大线程数）",
+         [({"pool": pool}, inflight.get(pool, 0) / size) for pool, size in sorted(sizes.items()) if size]),
+    ]
+
+def _collect_caches():
+    """
+    采集代理图片缓存和图片变体缓存的命中情况
+    """
+    all_stats = {"proxy": get_proxy_cache().stats, "variant": image_variants.stats}
+    requests, ratios = [], []
+    for cache, stats in all_stats.items():
+        stats = dict(stats)
+        total = sum(stats.values())
+        hits = sum(stats.get(result, 0) for result in CACHE_HIT_RESULTS[cache])
+        requests.extend(({"cache": cache, "result": result}, count) for result, count in sorted(stats.items()))
+        ratios.append(({"cache": cache}, hits / total if total else 0.0))
+    return [
+        ("comfyapi_cache_requests_total", "counter", "缓存查询次数", requests),
+        ("comfyapi_cache_hit_ratio", "gauge", "缓存命中率", ratios),
+    ]
+
+def _collect_health():
+    """
+    采集缓存的就绪检查结果
+    """
+    if core.image_generator.image_generator is None:
+        return []
+    snapshot = get_health_monitor().snapshot()
+    backend = snapshot["checks"].get("backend") or {}
+    depth = (backend.get("queue_running") or 0) + (backend.get("queue_pending") or 0)
+    return [
+        ("comfyapi_ready", "gauge", "服务是否就绪", [({}, 1 if snapshot["ready"] else 0)]),
+        ("comfyapi_backend_up", "gauge", "ComfyUI后端是否可达", [({}, 1 if backend.get("reachable") else 0)]),
+        ("comfyapi_backend_queue_depth", "gauge", "ComfyUI后端队列中的任务数（运行中+等待中）", [({}, depth)]),
+    ]
+
+REGISTRY.register_collector(_collect_tasks)
+REGISTRY.register_collector(_collect_executors)
+REGISTRY.register_collector(_collect_caches)
+REGISTRY.register_collector(_collect_health)
+
+@router.get("/healthz")
+async def healthz():
+    """
+    存活检查，进程能处理请求即返回200
+    """
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    """
+    就绪检查
+
+    返回后台线程缓存的检查结果（模板加载、工作线程、后端可达性和队列长度），不访问后端。
+    未就绪（后端不可达、队列饱和、模板加载失败、工作线程退出或检查结果过期）时返回503
+    """
+    snapshot = get_health_monitor().snapshot()
+    return FastJSONResponse(dict(snapshot, status="ready" if snapshot["ready"] else "not_ready"),
+                            status_code=200 if snapshot["ready"] else 503)
+
+@router.get("/metrics")
+async def metrics():
+    """
+    运行指标
+
+    返回 Prometheus 文本格式的指标：各通道队列长度、各状态任务数、各工作流各阶段耗时、
+    后端请求耗时和错误数、缓存命中率、工作线程和线程池利用率
+    """
+    # 采集时会查询延后通道等SQLite数据，不在事件循环中执行
+    return Response(await run_blocking(REGISTRY.render), media_type=CONTENT_TYPE)
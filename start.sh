@@ -1,4 +1,4 @@
 #!/bin/bash
+# 依赖在构建镜像时安装，启动时不再重复安装
 cd /app/
-pip3 install -r requirements.txt
-python3 app.py
+exec python3 app.py
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+生成历史查询基准测试
+
+向临时数据库写入大量历史记录，测量首页和翻页查询在无条件、全文搜索、
+工作流过滤和时间范围过滤下的耗时
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.history_index import HistoryIndex
+
+WORDS = ["山水风景", "城市夜景", "猫", "狗", "watercolor", "landscape", "portrait", "cyberpunk",
+         "sunset", "mountain", "river", "forest", "美丽的", "油画"]
+
+def populate(index: HistoryIndex, records: int):
+    conn = index._conn()
+    conn.execute("BEGIN")
+    for i in range(records):
+        conn.execute(
+            "INSERT INTO history (task_id, status, workflow, prompt, negative_prompt, width, height, batch_size, "
+            "created_at, finished_at, files) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (f"task-{i}", random.choice(["completed"] * 9 + ["failed"]), random.choice(["1.yaml", "2.yaml", "3.yaml"]),
+             " ".join(random.sample(WORDS, 5)), "模糊，低质量", 512, 512, 4, i, i + 30, '[{"url": "/resources/img/x.png"}]'),
+        )
+    conn.execute("COMMIT")
+
+def main():
+    parser = argparse.ArgumentParser(description="生成历史查询基准测试")
+    parser.add_argument("--records", type=int, default=1000000, help="写入的记录数")
+    parser.add_argument("--pages", type=int, default=5, help="每个查询连续翻页的页数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = HistoryIndex(os.path.join(tmp, "history.db"))
+        start = time.perf_counter()
+        populate(index, args.records)
+        print(f"写入 {args.records} 条记录: {time.perf_counter() - start:.1f} 秒")
+
+        cases = [
+            ("无条件", {}),
+            ("全文搜索 cyberpunk", {"q": "cyberpunk"}),
+            ("全文搜索 山水风景", {"q": "山水风景"}),
+            ("短词搜索 猫", {"q": "猫"}),
+            ("工作流过滤", {"workflow": "2.yaml"}),
+            ("状态+全文搜索", {"status": "failed", "q": "watercolor"}),
+            ("时间范围", {"since": args.records // 2, "until": args.records // 2 + 10000}),
+        ]
+        for name, filters in cases:
+            cursor, times = None, []
+            for _ in range(args.pages):
+                start = time.perf_counter()
+                page = index.query(cursor=cursor, limit=50, **filters)
+                times.append(time.perf_counter() - start)
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            print(f"{name:<16} 首页 {times[0] * 1000:7.2f} ms  翻页平均 {sum(times[1:]) / max(1, len(times) - 1) * 1000:7.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+JSON响应基准测试
+
+对比标准JSON编码（无压缩）与快速JSON编码+响应压缩在大响应体上的吞吐量和传输字节数，
+模拟批量任务状态查询这类返回大量任务和图像列表的接口
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def build_payload(tasks: int):
+    return {
+        "tasks": {
+            f"task-{i:06d}": {
+                "task_id": f"task-{i:06d}",
+                "status": "completed",
+                "progress": 100,
+                "params": {"prompt": "a watercolor landscape, mountains, river, morning light", "width": 512, "height": 512},
+                "result": [f"http://127.0.0.1:8081/resources/img/2026-10/task-{i:06d}-{n}.png" for n in range(4)],
+                "start_time": 1760000000.0 + i,
+                "end_time": 1760000030.5 + i,
+            }
+            for i in range(tasks)
+        },
+        "missing": [],
+        "cursor": tasks,
+    }
+
+def build_app(optimized: bool, payload):
+    from fastapi import FastAPI, APIRouter, Request
+    from fastapi.responses import JSONResponse
+    from utils.fast_json import FastJSONResponse, FastJSONRoute
+
+    if optimized:
+        from utils.compression import CompressionMiddleware
+
+        app = FastAPI(default_response_class=FastJSONResponse)
+        app.add_middleware(CompressionMiddleware, minimum_size=1024)
+        router = APIRouter(route_class=FastJSONRoute)
+    else:
+        app = FastAPI(default_response_class=JSONResponse)
+        router = APIRouter()
+
+    @router.get("/status")
+    async def status():
+        # 优化后的大响应接口直接返回响应对象，跳过 jsonable_encoder
+        return FastJSONResponse(payload) if optimized else payload
+
+    @router.post("/echo")
+    async def echo(request: Request):
+        data = await request.json()
+        return {"count": len(data["tasks"])}
+
+    app.include_router(router)
+    return app
+
+async def run_bench(optimized: bool, payload, requests_count: int, concurrency: int, accept_encoding: str):
+    import httpx
+    from utils.fast_json import dumps
+
+    app = build_app(optimized, payload)
+    body = dumps(payload)
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Accept-Encoding": accept_encoding}
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+        sizes = []
+
+        async def worker(count):
+            for _ in range(count):
+                response = await client.get("/status")
+                sizes.append(response.num_bytes_downloaded)
+                await client.post("/echo", content=body, headers={"Content-Type": "application/json"})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(requests_count // concurrency) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    total = (requests_count // concurrency) * concurrency
+    name = "优化后" if optimized else "标准"
+    print(f"{name}: {total / elapsed:.1f} 次/秒（GET+POST）, 响应体 {sum(sizes) / len(sizes) / 1024:.1f}KB")
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON响应基准测试")
+    parser.add_argument("--tasks", type=int, default=1000, help="响应中的任务数")
+    parser.add_argument("--requests", type=int, default=200, help="请求次数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发数")
+    parser.add_argument("--accept-encoding", default="br, gzip", help="请求头 Accept-Encoding")
+    args = parser.parse_args()
+
+    payload = build_payload(args.tasks)
+    asyncio.run(run_bench(False, payload, args.requests, args.concurrency, args.accept_encoding))
+    asyncio.run(run_bench(True, payload, args.requests, args.concurrency, args.accept_encoding))
+
+if __name__ == "__main__":
+    main()
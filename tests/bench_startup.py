@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+服务启动耗时基准测试
+
+在新的子进程中分别测量：导入 app 模块的耗时、导入后是否已经启动工作线程，
+以及执行 lifespan 启动（创建图像生成器、预热）到第一个请求成功返回的耗时
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中运行，保证每次测量都是冷启动
+PROBE = r"""
+import json, sys, time, threading
+start = time.perf_counter()
+import app
+import_seconds = time.perf_counter() - start
+threads_after_import = threading.active_count()
+from fastapi.testclient import TestClient
+start = time.perf_counter()
+with TestClient(app.app) as client:
+    response = client.get("/api/workflows")
+    first_request_seconds = time.perf_counter() - start
+print(json.dumps({
+    "import": import_seconds,
+    "threads_after_import": threads_after_import,
+    "first_request": first_request_seconds,
+    "status": response.status_code,
+}))
+"""
+
+def run_once(warmup: bool) -> dict:
+    env = dict(os.environ)
+    env["STARTUP_WARMUP"] = "1" if warmup else "0"
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    # 只取最后一行，忽略服务启动时打印的日志
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="服务启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每种配置的运行次数")
+    args = parser.parse_args()
+
+    for warmup in (False, True):
+        results = [run_once(warmup) for _ in range(args.runs)]
+        import_times = sorted(r["import"] for r in results)
+        first_times = sorted(r["first_request"] for r in results)
+        print(f"预热={'开' if warmup else '关'}（{args.runs}次，取中位数）")
+        print(f"  导入app耗时:       {import_times[len(import_times) // 2] * 1000:.1f} ms")
+        print(f"  导入后线程数:       {results[0]['threads_after_import']}")
+        print(f"  启动到首个请求成功: {first_times[len(first_times) // 2] * 1000:.1f} ms（状态码 {results[0]['status']}）")
+
+if __name__ == "__main__":
+    main()
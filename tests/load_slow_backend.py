@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+慢后端负载测试
+
+模拟ComfyUI后端响应缓慢（get_progress阻塞），同时并发请求任务状态接口和
+无关接口，统计无关接口的延迟分布，用于验证阻塞操作不会拖慢事件循环
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(len(values) * p / 100))
+    return values[index]
+
+async def run_load(backend_delay: float, requests_count: int):
+    import httpx
+    from client.comfyui_client import ComfyUIClient
+
+    # 模拟慢后端：生成任务一直处于运行状态，每次查询进度都阻塞 backend_delay 秒
+    ComfyUIClient.generate_image = lambda self, **kwargs: "slow-prompt"
+    ComfyUIClient.status = lambda self, prompt_id=None, task_id="", **kwargs: time.sleep(3600)
+    ComfyUIClient.get_progress = lambda self: time.sleep(backend_delay) or 0
+
+    from app import app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/generate_image", json={"prompt": "load test"})
+        task_id = response.json()["task_id"]
+        await asyncio.sleep(1)
+
+        async def timed(url):
+            start = time.perf_counter()
+            await client.get(url)
+            return time.perf_counter() - start
+
+        slow = [asyncio.create_task(timed(f"/api/task_status/{task_id}")) for _ in range(requests_count)]
+        fast = []
+        for _ in range(requests_count):
+            fast.append(await timed("/api/workflows"))
+        await asyncio.gather(*slow)
+
+    print(f"后端延迟: {backend_delay:.2f}秒, 并发状态查询: {requests_count}")
+    print(f"/api/workflows p50: {percentile(fast, 50) * 1000:.1f}ms, p99: {percentile(fast, 99) * 1000:.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="慢后端负载测试")
+    parser.add_argument("--delay", type=float, default=1.0, help="模拟后端响应延迟（秒）")
+    parser.add_argument("--requests", type=int, default=50, help="并发请求数")
+    args = parser.parse_args()
+    asyncio.run(run_load(args.delay, args.requests))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+响应压缩中间件测试
+"""
+
+import os
+import sys
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.testclient import TestClient
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.compression import CompressionMiddleware
+
+BOUNDARY = "batch-boundary"
+TEXT = "美丽的山水风景 " * 500
+
+def _multipart():
+    for index in range(2):
+        yield f"--{BOUNDARY}\r\nContent-Type: image/png\r\n\r\n".encode()
+        yield b"\x89PNG" + bytes([index]) * 4096 + b"\r\n"
+    yield f"--{BOUNDARY}--\r\n".encode()
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/multipart")
+    async def multipart():
+        return StreamingResponse(_multipart(), media_type=f"multipart/mixed; boundary={BOUNDARY}")
+
+    @app.get("/text")
+    async def text():
+        return PlainTextResponse(TEXT)
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([TEXT.encode()] * 3), media_type="text/plain")
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("ok")
+
+    return TestClient(app)
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "br, gzip", "identity"])
+def test_multipart_stream_not_compressed(client, accept_encoding):
+    response = client.get("/multipart", headers={"Accept-Encoding": accept_encoding})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.content == b"".join(_multipart())
+
+def test_text_gzip(client):
+    response = client.get("/text", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.text == TEXT
+
+def test_streaming_gzip(client):
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == TEXT * 3
+
+def test_small_response_not_compressed(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "ok"
+
+def test_content_length_matches_compressed_body(client):
+    with client.stream("GET", "/text", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert int(response.headers["content-length"]) == len(raw)
+    assert gzip.decompress(raw).decode() == TEXT
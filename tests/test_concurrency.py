@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自适应并发控制测试
+"""
+
+import os
+import sys
+import threading
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.concurrency import AdaptiveLimiter
+
+def test_increase_when_backend_idle_and_local_pending():
+    limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=4)
+    assert limiter.update(backend_running=1, backend_pending=0, local_pending=3) == 3
+    assert limiter.update(backend_running=1, backend_pending=0, local_pending=3) == 4
+    # 达到最大值后不再增加
+    assert limiter.update(backend_running=1, backend_pending=0, local_pending=3) == 4
+    assert limiter.snapshot()["adjustments"] == {"increase": 2, "decrease": 0}
+
+def test_no_increase_without_local_pending():
+    limiter = AdaptiveLimiter(initial=2, maximum=4)
+    assert limiter.update(backend_running=1, backend_pending=0, local_pending=0) == 2
+    # 后端等待队列在目标深度内时保持不变
+    assert limiter.update(backend_running=1, backend_pending=1, local_pending=5) == 2
+
+def test_decrease_when_backend_queue_too_deep():
+    limiter = AdaptiveLimiter(initial=8, minimum=1, maximum=8, target_depth=1)
+    assert limiter.update(backend_running=1, backend_pending=3, local_pending=0) == 4
+    assert limiter.update(backend_running=1, backend_pending=3, local_pending=0) == 2
+    assert limiter.update(backend_running=1, backend_pending=3, local_pending=0) == 1
+    # 不低于最小值
+    assert limiter.update(backend_running=1, backend_pending=3, local_pending=0) == 1
+    snapshot = limiter.snapshot()
+    assert snapshot["adjustments"]["decrease"] == 4
+    assert snapshot["backend"] == {"running": 1, "pending": 3}
+
+def test_acquire_waits_at_limit():
+    limiter = AdaptiveLimiter(initial=1, maximum=2)
+    assert limiter.acquire(timeout=0.1)
+    assert not limiter.acquire(timeout=0.1)
+    limiter.release()
+    assert limiter.acquire(timeout=0.1)
+
+def test_increase_wakes_waiting_acquire():
+    limiter = AdaptiveLimiter(initial=1, maximum=2)
+    assert limiter.acquire(timeout=0.1)
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(limiter.acquire(timeout=5)))
+    waiter.start()
+    limiter.update(backend_running=1, backend_pending=0, local_pending=1)
+    waiter.join(5)
+    assert acquired == [True]
+
+def test_inflight_counts_started_tasks_only():
+    limiter = AdaptiveLimiter(initial=3)
+    # 等待取任务的工作线程占用名额，但不计入执行中的任务数
+    assert limiter.acquire(timeout=0.1)
+    assert limiter.acquire(timeout=0.1)
+    assert limiter.snapshot()["inflight"] == 0
+    limiter.task_started()
+    assert limiter.snapshot()["inflight"] == 1
+    limiter.task_finished()
+    limiter.release()
+    limiter.release()
+    assert limiter.snapshot()["inflight"] == 0
+
+def test_completion_rate():
+    limiter = AdaptiveLimiter(rate_window=60)
+    limiter.record_completion(now=0)
+    for _ in range(3):
+        limiter.record_completion()
+    # 窗口外的完成记录被丢弃
+    assert limiter.snapshot()["completions_per_minute"] == 3
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图片变体尺寸档位和磁盘预算测试
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.image_variants import VariantDiskBudget, build_spec, snap_size
+
+def test_snap_size_rounds_up_to_allowed_size():
+    assert snap_size(None) is None
+    assert snap_size(1) == 64
+    assert snap_size(256) == 256
+    assert snap_size(257) == 384
+    assert snap_size(4096) == 4096
+
+def test_nearby_sizes_share_cache_key():
+    keys = {build_spec(width, None, "contain", "image/jpeg").cache_key("src") for width in range(257, 385)}
+    assert len(keys) == 1
+    assert build_spec(300, 200, "cover", "").width == 384
+    assert build_spec(300, 200, "cover", "").height == 256
+
+def test_build_spec_rejects_out_of_range():
+    with pytest.raises(ValueError):
+        build_spec(0, None, "contain", "")
+    with pytest.raises(ValueError):
+        build_spec(None, 4097, "contain", "")
+
+def _write(directory, name, size, mtime):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+def test_disk_budget_prunes_oldest(tmp_path):
+    budget = VariantDiskBudget(str(tmp_path), max_bytes=1000)
+    now = time.time()
+    paths = [_write(str(tmp_path), f"{index}.webp", 300, now - 100 + index) for index in range(3)]
+    budget.add(paths[-1])
+    assert all(os.path.exists(path) for path in paths)
+    newest = _write(str(tmp_path), "3.webp", 300, now)
+    budget.add(newest)
+    # 超出预算后删除最旧的变体，直到降到预算的90%
+    assert [os.path.exists(path) for path in paths + [newest]] == [False, True, True, True]
+    assert budget._approx_bytes == 900
+
+def test_disk_budget_keeps_new_variant(tmp_path):
+    budget = VariantDiskBudget(str(tmp_path), max_bytes=100)
+    old = _write(str(tmp_path), "old.webp", 50, time.time() - 10)
+    new = _write(str(tmp_path), "new.webp", 300, time.time() - 20)
+    budget.add(new)
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
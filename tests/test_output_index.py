@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+生成结果索引测试（多个进程共用同一个索引文件）
+"""
+
+import os
+import sys
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.output_index import OutputIndex
+
+FILES = [{"url": "/resources/img/10/t/0.png", "size": 3, "width": 1, "height": 1, "sha256": "abc"}]
+
+def test_reads_records_appended_by_other_process(tmp_path):
+    path = str(tmp_path / "outputs.jsonl")
+    writer = OutputIndex(path)
+    reader = OutputIndex(path)
+    writer.record("task-1", "prompt-1", FILES)
+    assert reader.get("prompt-1")["task_id"] == "task-1"
+    assert reader.get("task-1")["files"] == FILES
+    assert reader.get("missing") is None
+
+def test_ignores_partial_line(tmp_path):
+    path = str(tmp_path / "outputs.jsonl")
+    reader = OutputIndex(path)
+    OutputIndex(path).record("task-1", "prompt-1", FILES)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"task_id": "task-2", "prompt_id": "pro')
+    assert reader.get("task-2") is None
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('mpt-2", "files": []}\n')
+    assert reader.get("prompt-2")["task_id"] == "task-2"
+
+def test_reloads_after_compaction(tmp_path):
+    path = str(tmp_path / "outputs.jsonl")
+    reader = OutputIndex(path)
+    writer = OutputIndex(path)
+    for index in range(200):
+        writer.record(f"task-{index}", f"prompt-{index}", FILES)
+        writer.remove(f"task-{index}")
+    writer.record("task-kept", "prompt-kept", FILES)
+    assert reader.get("prompt-kept") is not None
+    # 失效记录过多，新进程启动时压缩（替换）索引文件
+    OutputIndex(path)
+    writer.record("task-new", "prompt-new", FILES)
+    assert reader.get("prompt-new")["task_id"] == "task-new"
+    assert reader.get("prompt-kept") is not None
+    assert reader.get("task-0") is None
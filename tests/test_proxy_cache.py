@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+代理图片缓存测试
+"""
+
+import os
+import sys
+import asyncio
+
+import httpx
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.proxy_cache import ProxyImageCache
+
+CHUNK = b"\x89PNG" + b"\x00" * 1020
+
+class ChunkedBody(httpx.AsyncByteStream):
+    """
+    没有Content-Length的分块响应体，记录已发送的块数
+    """
+    def __init__(self, count):
+        self.count = count
+        self.sent = 0
+
+    async def __aiter__(self):
+        for _ in range(self.count):
+            self.sent += 1
+            yield CHUNK
+
+def _fetch(tmp_path, body):
+    async def run():
+        transport = httpx.MockTransport(lambda request: httpx.Response(
+            200, headers={"Content-Type": "image/png"}, stream=body))
+        cache = ProxyImageCache(memory_bytes=1 << 20, disk_dir=str(tmp_path), disk_bytes=1 << 20,
+                                max_entry_bytes=4096, default_ttl=60)
+        async with httpx.AsyncClient(transport=transport) as client:
+            result = await cache.fetch("http://example.com/a.png", client, {})
+            if result.stream is None:
+                return result, result.image.body
+            sent = body.sent
+            data = b"".join([chunk async for chunk in result.iter_stream()])
+            await result.stream.aclose()
+            return result, (sent, data)
+    return asyncio.run(run())
+
+def test_small_chunked_response_cached(tmp_path):
+    result, data = _fetch(tmp_path, ChunkedBody(3))
+    assert result.source == "miss"
+    assert data == CHUNK * 3
+
+def test_large_chunked_response_streamed(tmp_path):
+    result, (sent, data) = _fetch(tmp_path, ChunkedBody(100))
+    assert result.source == "bypass"
+    # 超过上限后立即停止读取，不把整个响应体读入内存
+    assert sent == 5
+    assert data == CHUNK * 100
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+共享任务表测试
+"""
+
+import os
+import sys
+import time
+import signal
+import sqlite3
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+# 添加项目根目录到系统路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from core.task_store import SQLiteTaskStore
+
+# 领取任务、标记为执行中并持续续租，直到被杀死
+OWNER_SCRIPT = """
+import sys, time
+from types import SimpleNamespace
+from core.task_store import SQLiteTaskStore
+store = SQLiteTaskStore(sys.argv[1], lease=0.5)
+task = SimpleNamespace(**store.claim("dead-owner"))
+task.status, task.prompt_id = "running", "prompt-1"
+store.save(task)
+print("claimed", flush=True)
+while True:
+    store.renew("dead-owner")
+    time.sleep(0.1)
+"""
+
+def _task(task_id, **params):
+    return SimpleNamespace(task_id=task_id, params=params, status="pending", prompt_id=None,
+                           created_time=time.time())
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteTaskStore(str(tmp_path / "tasks.db"))
+
+def test_claim_in_submit_order(store):
+    for task_id in ("a", "b", "c"):
+        store.add(_task(task_id, prompt=task_id))
+    assert store.pending_count() == 3
+    assert store.claim("p1")["task_id"] == "a"
+    record = store.claim("p2")
+    assert record["task_id"] == "b"
+    assert record["params"] == {"prompt": "b"}
+    assert store.get("a")["owner"] == "p1"
+    assert store.pending_count() == 1
+
+def test_claim_empty(store):
+    assert store.claim("p1") is None
+    store.add(_task("a"))
+    store.claim("p1")
+    assert store.claim("p1") is None
+
+def test_add_ignores_duplicate(store):
+    store.add(_task("a", prompt="first"))
+    store.add(_task("a", prompt="second"))
+    assert store.pending_count() == 1
+    assert store.get("a")["params"] == {"prompt": "first"}
+
+def test_cancel_unclaimed_task(store):
+    store.add(_task("a"))
+    assert store.request_cancel("a")
+    assert store.get("a")["status"] == "cancelled"
+    assert store.claim("p1") is None
+    # 已结束的任务不能再取消
+    assert not store.request_cancel("a")
+    assert not store.request_cancel("missing")
+
+def test_cancel_claimed_task(store):
+    store.add(_task("a"))
+    store.add(_task("b"))
+    store.claim("p1")
+    store.claim("p2")
+    assert store.request_cancel("a")
+    # 已领取的任务由领取者执行取消，状态不变
+    assert store.get("a")["status"] == "pending"
+    assert store.cancel_requests("p2") == []
+    assert store.cancel_requests("p1") == ["a"]
+    # 取消请求只返回一次
+    assert store.cancel_requests("p1") == []
+
+def test_release_keeps_prompt_id(store):
+    store.add(_task("a"))
+    task = store.claim("p1")
+    store.release("a", "prompt-1")
+    record = store.get("a")
+    assert record["owner"] is None
+    assert record["status"] == "pending"
+    assert record["prompt_id"] == "prompt-1"
+    assert record["version"] == task["version"] + 1
+    claimed = store.claim("p2")
+    assert claimed["task_id"] == "a"
+    assert claimed["prompt_id"] == "prompt-1"
+
+def test_release_ignores_finished_task(store):
+    task = _task("a")
+    store.add(task)
+    store.claim("p1")
+    task.status, task.end_time = "completed", time.time()
+    task.result, task.error, task.start_time, task.progress = ["x.png"], None, time.time(), 100
+    task.spans, task.node_timings, task.version = {}, {}, 3
+    store.save(task)
+    store.release("a")
+    assert store.get("a")["status"] == "completed"
+    assert store.get("a")["result"] == ["x.png"]
+
+def test_change_cursor(store):
+    store.add(_task("a"))
+    store.add(_task("b"))
+    cursor = store.current_seq()
+    assert store.get_many(since=cursor) == []
+    store.request_cancel("b")
+    changed = store.get_many(since=cursor)
+    assert [record["task_id"] for record in changed] == ["b"]
+    assert store.current_seq() > cursor
+    assert [record["task_id"] for record in store.get_many(["a", "b", "missing"])] == ["a", "b"]
+    assert store.get_many(["a"], since=cursor) == []
+
+def test_purge_finished_tasks(tmp_path):
+    store = SQLiteTaskStore(str(tmp_path / "tasks.db"), retention=0)
+    store.add(_task("a"))
+    store.add(_task("b"))
+    store.request_cancel("a")
+    time.sleep(0.01)
+    assert store.purge() == 1
+    assert store.get("a") is None
+    assert store.get("b") is not None
+
+def test_expired_lease_reclaimed(tmp_path):
+    store = SQLiteTaskStore(str(tmp_path / "tasks.db"), lease=0.2)
+    store.add(_task("a"))
+    store.claim("p1")
+    assert store.claim("p2") is None
+    assert store.pending_count() == 0
+    time.sleep(0.3)
+    assert store.pending_count() == 1
+    record = store.claim("p2")
+    assert record["task_id"] == "a"
+    assert store.get("a")["owner"] == "p2"
+
+def test_renew_keeps_lease(tmp_path):
+    store = SQLiteTaskStore(str(tmp_path / "tasks.db"), lease=0.3)
+    store.add(_task("a"))
+    store.claim("p1")
+    for _ in range(3):
+        time.sleep(0.15)
+        assert store.renew("p1") == 1
+        assert store.claim("p2") is None
+
+def test_killed_owner_tasks_reclaimed(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    store = SQLiteTaskStore(path, lease=0.5)
+    store.add(_task("a"))
+    owner = subprocess.Popen([sys.executable, "-c", OWNER_SCRIPT, path], cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        assert owner.stdout.readline().strip() == "claimed"
+        time.sleep(0.7)
+        # 领取者在续租，任务不能被其他进程领取
+        assert store.claim("p2") is None
+    finally:
+        owner.send_signal(signal.SIGKILL)
+        owner.wait()
+    time.sleep(0.7)
+    record = store.claim("p2")
+    assert record["task_id"] == "a"
+    # 重新领取的任务恢复为等待中，保留prompt_id只重新关联
+    assert record["status"] == "pending"
+    assert record["prompt_id"] == "prompt-1"
+    assert record["owner"] == "p2"
+
+def test_adds_lease_column_to_old_table(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE tasks (seq INTEGER PRIMARY KEY AUTOINCREMENT, task_id TEXT NOT NULL UNIQUE, "
+                 "params TEXT NOT NULL, status TEXT NOT NULL, owner TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, "
+                 "prompt_id TEXT, result TEXT, error TEXT, created_time REAL, start_time REAL, end_time REAL, "
+                 "progress INTEGER NOT NULL DEFAULT 0, spans TEXT, node_timings TEXT, "
+                 "version INTEGER NOT NULL DEFAULT 0, updated_seq INTEGER NOT NULL DEFAULT 0)")
+    conn.execute("INSERT INTO tasks (task_id, params, status, owner) VALUES ('a', '{}', 'running', 'old-process')")
+    conn.commit()
+    conn.close()
+    store = SQLiteTaskStore(path)
+    # 旧版本进程领取的任务没有租约，视为已到期
+    assert store.claim("p1")["task_id"] == "a"
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+响应压缩中间件
+
+根据 Accept-Encoding 协商使用 br（需安装 brotli）或 gzip 压缩响应，
+小于阈值的响应、已压缩的内容类型（图片、视频、压缩包等）和部分内容响应不压缩
+"""
+
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.static_files import negotiate_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 本身已压缩或不适合压缩的内容类型
+EXCLUDED_CONTENT_TYPES = (
+    "text/event-stream",
+    "image/",
+    "video/",
+    "audio/",
+    "multipart/",
+    "application/zip",
+    "application/octet-stream",
+)
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        # wbits=31 输出gzip格式
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        data = self._compressor.compress(body)
+        # 流式响应每个分块都需要flush，客户端才能及时解码
+        return data + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        data = self._compressor.process(body)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+class _CompressionResponder:
+    """
+    单个请求的压缩处理：收到响应头时先判断是否排除，排除的响应原样转发；
+    否则等到第一个响应体分块再决定是否压缩（小于阈值的完整响应不压缩），之后再发送响应头
+    """
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int, gzip_level: int, brotli_quality: int) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.send = None
+        self.initial_message = None  # 延迟发送的响应头
+        self.passthrough = False  # 不压缩，原样转发
+        self.compressor = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    def _excluded(self, headers: Headers) -> bool:
+        return ("content-encoding" in headers or "content-range" in headers
+                or headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES))
+
+    async def send_with_compression(self, message: Message) -> None:
+        message_type = message["type"]
+        if self.passthrough:
+            await self.send(message)
+            return
+        if message_type == "http.response.start":
+            if self._excluded(Headers(raw=message["headers"])):
+                self.passthrough = True
+                await self.send(message)
+            else:
+                self.initial_message = message
+            return
+        if self.compressor is not None and message_type == "http.response.body":
+            more_body = message.get("more_body", False)
+            await self.send({"type": message_type, "body": self.compressor.compress(message.get("body", b""), more_body),
+                             "more_body": more_body})
+            return
+        if self.initial_message is None or message_type != "http.response.body":
+            # 其他扩展消息（如 http.response.pathsend）原样转发，不再压缩
+            if self.initial_message is not None:
+                await self.send(self.initial_message)
+                self.initial_message = None
+                self.passthrough = True
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        initial_message, self.initial_message = self.initial_message, None
+        if len(body) < self.minimum_size and not more_body:
+            # 完整的小响应不压缩
+            self.passthrough = True
+            await self.send(initial_message)
+            await self.send(message)
+            return
+        if self.encoding == "br":
+            self.compressor = _BrotliCompressor(self.brotli_quality)
+        else:
+            self.compressor = _GzipCompressor(self.gzip_level)
+        body = self.compressor.compress(body, more_body)
+        headers = MutableHeaders(raw=initial_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if more_body:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(len(body))
+        await self.send(initial_message)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+class CompressionMiddleware:
+    """
+    gzip/brotli 响应压缩中间件
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4) -> None:
+        """
+        Args:
+            minimum_size: 压缩阈值（字节），小于该大小的响应不压缩
+            gzip_level: gzip压缩级别
+            brotli_quality: brotli压缩质量
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.available = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self.app, encoding, self.minimum_size, self.gzip_level, self.brotli_quality)
+        await responder(scope, receive, send)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+阻塞任务执行器
+
+将同步的网络请求、文件读写等阻塞操作移出事件循环，
+放到有界线程池中执行，避免单个慢请求拖住整个服务。
+访问ComfyUI后端的请求使用独立线程池，后端变慢时不影响本地文件类接口
+"""
+
+import os
+import asyncio
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from utils.metrics import EXECUTOR_INFLIGHT
+
+# 线程池名称 -> (线程数环境变量, 默认线程数)
+POOL_SIZES = {
+    "io": ("IO_WORKERS", 16),
+    "backend": ("BACKEND_WORKERS", 16),
+}
+
+_executors = {}
+_executor_sizes = {}
+_executor_lock = threading.Lock()
+_process_pool = None
+
+def get_executor(name: str = "io") -> ThreadPoolExecutor:
+    """
+    获取指定名称的线程池，懒加载模式
+
+    Args:
+        name: 线程池名称，io 用于本地文件读写，backend 用于访问ComfyUI后端
+    """
+    executor = _executors.get(name)
+    if executor is None:
+        with _executor_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                env_name, default_size = POOL_SIZES[name]
+                max_workers = int(os.getenv(env_name, str(default_size)))
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"comfyapi-{name}")
+                _executors[name] = executor
+                _executor_sizes[name] = max_workers
+    return executor
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    在本地I/O线程池中执行阻塞函数并等待结果
+
+    Args:
+        func: 阻塞函数
+        *args, **kwargs: 函数参数
+
+    Returns:
+        函数返回值
+    """
+    return await _run_in_pool("io", func, *args, **kwargs)
+
+async def run_backend(func, *args, **kwargs):
+    """
+    在后端请求线程池中执行阻塞函数并等待结果
+    """
+    return await _run_in_pool("backend", func, *args, **kwargs)
+
+async def _run_in_pool(name: str, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    labels = (name,)
+    EXECUTOR_INFLIGHT.inc(labels=labels)
+    try:
+        return await loop.run_in_executor(get_executor(name), functools.partial(func, *args, **kwargs))
+    finally:
+        EXECUTOR_INFLIGHT.dec(labels=labels)
+
+def executor_sizes() -> dict:
+    """
+    获取已创建线程池的最大线程数
+    """
+    return dict(_executor_sizes)
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    获取CPU密集任务（图片缩放、编码）使用的进程池，懒加载模式
+
+    进程数由环境变量 IMAGE_WORKERS 控制，默认为CPU核数（最多4个）。
+    服务进程中有事件循环、工作线程和连接池，fork 出的子进程可能继承其他线程持有的锁而卡死，
+    因此用 forkserver（不支持时用 spawn）启动子进程
+    """
+    global _process_pool
+    if _process_pool is None:
+        with _executor_lock:
+            if _process_pool is None:
+                max_workers = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                _process_pool = ProcessPoolExecutor(max_workers=max_workers,
+                                                    mp_context=multiprocessing.get_context(method))
+    return _process_pool
+
+async def run_in_process(func, *args):
+    """
+    在进程池中执行CPU密集函数并等待结果，函数和参数必须可序列化
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+def shutdown_executor(wait: bool = False):
+    """
+    关闭所有线程池和进程池
+    """
+    global _process_pool
+    with _executor_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=wait)
+        _executors.clear()
+        _executor_sizes.clear()
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=wait)
+            _process_pool = None
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+快速JSON编解码
+
+安装 orjson 时使用 orjson 序列化响应和解析请求体，未安装时回退到标准库json
+"""
+
+import json
+from typing import Any, Callable
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(content: Any) -> bytes:
+    """
+    序列化为JSON字节串
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data: bytes) -> Any:
+    """
+    解析JSON字节串
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class FastJSONResponse(JSONResponse):
+    """
+    使用快速序列化的JSON响应
+    """
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class FastJSONRequest(Request):
+    """
+    使用快速解析的请求对象
+    """
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = loads(await self.body())
+        return self._json
+
+class FastJSONRoute(APIRoute):
+    """
+    请求体使用快速JSON解析的路由
+    """
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await original_route_handler(FastJSONRequest(request.scope, request.receive))
+
+        return route_handler
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+生成历史索引
+
+任务结束时把提示词、参数、输出文件和阶段耗时写入内嵌的SQLite数据库（WAL模式），
+提示词建立FTS5全文索引。查询使用键集分页（按自增ID倒序），
+翻页耗时与页码和总记录数无关
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from typing import Optional, Dict, Any
+
+from utils.paths import DATA_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL UNIQUE,
+    prompt_id TEXT,
+    status TEXT NOT NULL,
+    workflow TEXT,
+    prompt TEXT NOT NULL DEFAULT '',
+    negative_prompt TEXT NOT NULL DEFAULT '',
+    width INTEGER,
+    height INTEGER,
+    batch_size INTEGER,
+    seed INTEGER,
+    params TEXT,
+    files TEXT,
+    timings TEXT,
+    error TEXT,
+    created_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS history_workflow ON history (workflow, id);
+CREATE INDEX IF NOT EXISTS history_status ON history (status, id);
+CREATE INDEX IF NOT EXISTS history_finished ON history (finished_at);
+CREATE INDEX IF NOT EXISTS history_prompt_id ON history (prompt_id);
+"""
+
+# 外部内容FTS表，由触发器与主表保持同步
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    prompt, negative_prompt, content='history', content_rowid='id'{tokenize}
+);
+CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts (rowid, prompt, negative_prompt) VALUES (new.id, new.prompt, new.negative_prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts (history_fts, rowid, prompt, negative_prompt) VALUES ('delete', old.id, old.prompt, old.negative_prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS history_au AFTER UPDATE ON history BEGIN
+    INSERT INTO history_fts (history_fts, rowid, prompt, negative_prompt) VALUES ('delete', old.id, old.prompt, old.negative_prompt);
+    INSERT INTO history_fts (rowid, prompt, negative_prompt) VALUES (new.id, new.prompt, new.negative_prompt);
+END;
+"""
+
+# 查询结果中的列，JSON列在返回前解析
+COLUMNS = ("id", "task_id", "prompt_id", "status", "workflow", "prompt", "negative_prompt",
+           "width", "height", "batch_size", "seed", "params", "files", "timings", "error",
+           "created_at", "finished_at")
+JSON_COLUMNS = ("params", "files", "timings")
+
+class HistoryIndex:
+    """
+    基于SQLite的生成历史索引
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()  # 每个线程一个连接，WAL模式下读写互不阻塞
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # trigram分词支持中文等不以空格分词的文本的子串搜索，旧版SQLite不支持时退回默认分词
+        self.trigram = True
+        try:
+            conn.executescript(FTS_SCHEMA.format(tokenize=", tokenize='trigram'"))
+        except sqlite3.OperationalError:
+            self.trigram = False
+            conn.executescript(FTS_SCHEMA.format(tokenize=""))
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, entry: Dict[str, Any]):
+        """
+        写入或更新一条任务记录（按 task_id 去重）
+
+        Args:
+            entry: 包含 COLUMNS 中除 id 外的字段，缺失的字段记为空
+        """
+        values = []
+        for column in COLUMNS[1:]:
+            value = entry.get(column)
+            if column in JSON_COLUMNS and value is not None:
+                value = json.dumps(value, ensure_ascii=False)
+            elif column in ("prompt", "negative_prompt"):
+                value = value or ""
+            values.append(value)
+        columns = ", ".join(COLUMNS[1:])
+        updates = ", ".join(f"{column}=excluded.{column}" for column in COLUMNS[2:])
+        with self._write_lock:
+            self._conn().execute(
+                f"INSERT INTO history ({columns}) VALUES ({', '.join('?' * len(values))}) "
+                f"ON CONFLICT(task_id) DO UPDATE SET {updates}",
+                values,
+            )
+
+    def remove(self, task_id: str):
+        """
+        删除任务记录
+        """
+        with self._write_lock:
+            self._conn().execute("DELETE FROM history WHERE task_id = ?", (task_id,))
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        item = dict(zip(COLUMNS, row))
+        for column in JSON_COLUMNS:
+            if item[column] is not None:
+                item[column] = json.loads(item[column])
+        return item
+
+    def get(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        按 task_id 或 prompt_id 查询记录
+        """
+        row = self._conn().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM history WHERE task_id = ? "
+            f"UNION ALL SELECT {', '.join(COLUMNS)} FROM history WHERE prompt_id = ? LIMIT 1",
+            (id, id),
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def query(self, q: Optional[str] = None, workflow: Optional[str] = None, status: Optional[str] = None,
+              width: Optional[int] = None, height: Optional[int] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              cursor: Optional[int] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        按条件查询历史记录，从新到旧排列
+
+        Args:
+            q: 全文搜索提示词（正向和反向）
+            workflow: 工作流模板
+            status: 任务状态
+            width: 图像宽度
+            height: 图像高度
+            since: 结束时间下限（时间戳，含）
+            until: 结束时间上限（时间戳，不含）
+            cursor: 上一页返回的 next_cursor，为空时从最新的记录开始
+            limit: 每页条数
+
+        Returns:
+            dict: {items, next_cursor}，没有更多记录时 next_cursor 为None
+        """
+        conditions, args = [], []
+        source, order = "history h", "h.id"
+        if q:
+            if self.trigram and len(q) < 3:
+                # trigram分词无法匹配少于3个字符的查询，退回子串匹配
+                pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                conditions.append("(h.prompt LIKE ? ESCAPE '\\' OR h.negative_prompt LIKE ? ESCAPE '\\')")
+                args.extend([pattern, pattern])
+            else:
+                # 整体作为短语匹配，避免用户输入被解析为FTS查询语法
+                # 从FTS表按rowid倒序扫描，匹配的记录很多时也只需读取一页
+                source, order = "history_fts JOIN history h ON h.id = history_fts.rowid", "history_fts.rowid"
+                conditions.append("history_fts MATCH ?")
+                args.append('"' + q.replace('"', '""') + '"')
+        for column, value in (("workflow", workflow), ("status", status), ("width", width), ("height", height)):
+            if value is not None:
+                conditions.append(f"h.{column} = ?")
+                args.append(value)
+        if since is not None:
+            conditions.append("h.finished_at >= ?")
+            args.append(since)
+        if until is not None:
+            conditions.append("h.finished_at < ?")
+            args.append(until)
+        if cursor is not None:
+            conditions.append(f"{order} < ?")
+            args.append(cursor)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        rows = self._conn().execute(
+            f"SELECT {', '.join('h.' + column for column in COLUMNS)} FROM {source} {where} "
+            f"ORDER BY {order} DESC LIMIT ?",
+            args + [limit + 1],
+        ).fetchall()
+        items = [self._row(row) for row in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def count(self) -> int:
+        """
+        记录总数
+        """
+        return self._conn().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+_history_index = None
+_history_index_lock = threading.Lock()
+
+def get_history_index() -> HistoryIndex:
+    """
+    获取全局生成历史索引，懒加载模式
+
+    数据库路径由环境变量 HISTORY_DB 控制，默认为数据目录下的 history.db
+    """
+    global _history_index
+    if _history_index is None:
+        with _history_index_lock:
+            if _history_index is None:
+                _history_index = HistoryIndex(os.getenv("HISTORY_DB", os.path.join(DATA_DIR, "history.db")))
+    return _history_index
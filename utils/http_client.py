@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+共享的异步HTTP客户端
+
+所有对外HTTP请求复用同一个连接池，避免每次请求都重新建立TCP/TLS连接
+"""
+
+import os
+import asyncio
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+
+_client = None
+_client_loop = None
+
+def get_async_client() -> "httpx.AsyncClient":
+    """
+    获取当前事件循环的共享异步HTTP客户端，懒加载模式
+
+    连接池大小由环境变量 HTTP_MAX_CONNECTIONS、HTTP_MAX_KEEPALIVE 控制
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    # 连接池绑定在事件循环上，事件循环变化时重新创建
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        # httpx只在首次使用时导入，缩短服务启动时间
+        import httpx
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+        )
+        _client = httpx.AsyncClient(timeout=30.0, follow_redirects=True, limits=limits)
+        _client_loop = loop
+    return _client
+
+async def close_async_client():
+    """
+    关闭共享的异步HTTP客户端
+    """
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _client_loop = None
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+幂等键存储
+
+客户端通过 Idempotency-Key 请求头标识一次提交，超时重试时带上相同的键，
+服务端返回第一次创建的任务而不是重复提交。键的数量有上限，过期后自动淘汰。
+启用共享任务表（多进程部署）时键保存在同一个SQLite数据库中，重试被路由到其他进程也不会重复提交
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+class IdempotencyConflictError(Exception):
+    """
+    相同的幂等键对应了不同的请求内容
+    """
+    pass
+
+class IdempotencyStore:
+    """
+    有容量上限和过期时间的幂等键存储
+    """
+    def __init__(self, max_keys: int = 10000, ttl: float = 86400):
+        """
+        Args:
+            max_keys: 最多保留的键数量，超过后淘汰最早的键
+            ttl: 键的有效期（秒）
+        """
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._entries = OrderedDict()  # 键 -> (过期时间, 请求指纹, 结果)
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        # 按插入顺序排列，过期时间相同，只需检查最早的键
+        while self._entries:
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_keys:
+                break
+            self._entries.popitem(last=False)
+
+    def get_or_create(self, key: str, fingerprint: str, create: Callable[[], str]) -> Tuple[str, bool]:
+        """
+        查询幂等键对应的结果，不存在时调用 create 创建并保存
+
+        Args:
+            key: 幂等键
+            fingerprint: 请求内容指纹，相同的键必须对应相同的请求
+            create: 创建结果的函数（如提交任务并返回任务ID），在锁内调用，应当快速返回
+
+        Returns:
+            tuple: (结果, 是否为新创建)
+
+        Raises:
+            IdempotencyConflictError: 键已被内容不同的请求使用
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] != fingerprint:
+                    raise IdempotencyConflictError(f"幂等键已被内容不同的请求使用: {key}")
+                return entry[2], False
+            result = create()
+            self._entries[key] = (now + self.ttl, fingerprint, result)
+            self._evict(now)
+            return result, True
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询幂等键对应的结果，不存在或已过期时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            return entry[2]
+
+class SQLiteIdempotencyStore:
+    """
+    基于SQLite的幂等键存储，多个进程共用
+
+    先用 INSERT ... ON CONFLICT 原子地占用键（结果为空），占用成功的请求创建结果后写回；
+    其他请求等待结果写回。创建失败时删除占用，后续重试重新创建。
+    键的数量超过上限时删除最早过期（即最早写入）的键
+    """
+    def __init__(self, db_path: str, max_keys: int = 10000, ttl: float = 86400, wait_timeout: float = 30.0):
+        """
+        Args:
+            db_path: 数据库路径，所有进程必须使用同一个文件（与共享任务表相同）
+            max_keys: 最多保留的键数量，超过后淘汰最早的键
+            ttl: 键的有效期（秒）
+            wait_timeout: 等待其他请求写回结果的最长秒数
+        """
+        self.db_path = db_path
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS idempotency (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                result TEXT,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idempotency_expires ON idempotency (expires_at);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _evict(self, conn: sqlite3.Connection, key: str):
+        # 有效期相同，过期时间最早的键就是最早写入的键；尚未写回结果的键（包括刚占用的）不淘汰，
+        # 否则等待中的请求会重新占用并重复提交
+        conn.execute(
+            "DELETE FROM idempotency WHERE key IN (SELECT key FROM idempotency WHERE key != ? AND result IS NOT NULL "
+            "ORDER BY expires_at LIMIT max(0, (SELECT COUNT(*) FROM idempotency) - ?))",
+            (key, self.max_keys),
+        )
+
+    def get_or_create(self, key: str, fingerprint: str, create: Callable[[], str]) -> Tuple[str, bool]:
+        """
+        查询幂等键对应的结果，不存在时调用 create 创建并保存，参数和返回值同 IdempotencyStore.get_or_create
+        """
+        conn = self._conn()
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            now = time.time()
+            conn.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,))
+            # 键不存在或已过期时占用，已被占用时不修改
+            cursor = conn.execute(
+                "INSERT INTO idempotency (key, fingerprint, result, expires_at) VALUES (?, ?, NULL, ?) "
+                "ON CONFLICT (key) DO UPDATE SET fingerprint = excluded.fingerprint, result = NULL, "
+                "expires_at = excluded.expires_at WHERE idempotency.expires_at <= ?",
+                (key, fingerprint, now + self.ttl, now),
+            )
+            if cursor.rowcount:
+                self._evict(conn, key)
+                try:
+                    result = create()
+                except BaseException:
+                    conn.execute("DELETE FROM idempotency WHERE key = ? AND result IS NULL", (key,))
+                    raise
+                conn.execute("UPDATE idempotency SET result = ? WHERE key = ?", (result, key))
+                return result, True
+            row = conn.execute("SELECT fingerprint, result FROM idempotency WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                # 占用者创建失败并删除了占用，重新尝试
+                continue
+            if row[0] != fingerprint:
+                raise IdempotencyConflictError(f"幂等键已被内容不同的请求使用: {key}")
+            if row[1] is not None:
+                return row[1], False
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"等待相同幂等键的请求完成超时: {key}")
+            time.sleep(0.05)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询幂等键对应的结果，不存在、已过期或尚未创建完成时返回None
+        """
+        row = self._conn().execute(
+            "SELECT result FROM idempotency WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+_idempotency_store = None
+_idempotency_lock = threading.Lock()
+
+def get_idempotency_store():
+    """
+    获取全局幂等键存储，懒加载模式
+
+    容量和有效期由环境变量 IDEMPOTENCY_MAX_KEYS（默认10000）和 IDEMPOTENCY_TTL（秒，默认86400）控制；
+    启用共享任务表（TASK_STORE=sqlite）时使用任务表所在的数据库
+    """
+    global _idempotency_store
+    if _idempotency_store is None:
+        with _idempotency_lock:
+            if _idempotency_store is None:
+                from core.task_store import get_task_store
+                store = get_task_store()
+                if store is not None:
+                    _idempotency_store = SQLiteIdempotencyStore(
+                        store.db_path,
+                        max_keys=int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000")),
+                        ttl=float(os.getenv("IDEMPOTENCY_TTL", "86400")),
+                    )
+                else:
+                    _idempotency_store = IdempotencyStore(
+                        max_keys=int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000")),
+                        ttl=float(os.getenv("IDEMPOTENCY_TTL", "86400")),
+                    )
+    return _idempotency_store
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图片尺寸变体生成与缓存
+
+按 w/h/fit 参数缩放图片，并根据 Accept 请求头选择 AVIF/WebP/JPEG 输出格式。
+编码在进程池中执行，生成的变体按确定性的键缓存在磁盘上，相同请求不会重复处理。
+请求的宽高向上取整到允许的尺寸档位，磁盘缓存有字节预算，超出时删除最旧的变体
+"""
+
+import os
+import io
+import asyncio
+import hashlib
+import threading
+from typing import Optional, Union
+
+from utils.paths import CACHE_DIR
+from utils.executor import run_in_process, run_blocking
+
+# 支持的缩放方式：contain 等比缩放到框内，cover 等比缩放后居中裁剪填满，fill 拉伸填满
+FIT_MODES = ("contain", "cover", "fill")
+
+# 输出格式 -> (内容类型, 文件扩展名)
+OUTPUT_FORMATS = {
+    "avif": ("image/avif", ".avif"),
+    "webp": ("image/webp", ".webp"),
+    "jpeg": ("image/jpeg", ".jpg"),
+}
+
+# 允许的最大输出尺寸
+MAX_DIMENSION = 4096
+
+# 默认的输出尺寸档位，请求的宽高向上取整到档位，任意宽高不会各自生成一份缓存
+DEFAULT_SIZES = (64, 128, 256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096)
+
+VARIANT_DIR = os.path.join(CACHE_DIR, "variants")
+
+_supported_formats = None
+_allowed_sizes = None
+_inflight = {}
+_disk_budget = None
+_disk_budget_lock = threading.Lock()
+
+# 变体缓存命中统计（只在事件循环中更新）
+stats = {"hit": 0, "miss": 0}
+
+class VariantSpec:
+    """
+    图片变体参数
+    """
+    def __init__(self, width: Optional[int], height: Optional[int], fit: str, fmt: str, quality: int):
+        self.width = width
+        self.height = height
+        self.fit = fit
+        self.fmt = fmt
+        self.quality = quality
+
+    @property
+    def content_type(self) -> str:
+        return OUTPUT_FORMATS[self.fmt][0]
+
+    def cache_key(self, source_id: str) -> str:
+        raw = f"{source_id}|{self.width}|{self.height}|{self.fit}|{self.fmt}|{self.quality}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def cache_path(self, source_id: str) -> str:
+        key = self.cache_key(source_id)
+        return os.path.join(VARIANT_DIR, key[:2], key + OUTPUT_FORMATS[self.fmt][1])
+
+class VariantDiskBudget:
+    """
+    变体缓存的磁盘预算，超出时按修改时间删除最旧的变体
+    """
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._approx_bytes = None  # 磁盘占用估算，首次写入时统计
+        self._lock = threading.Lock()
+
+    def add(self, path: str):
+        """
+        记录新生成的变体，超出预算时清理
+        """
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_size()
+            else:
+                try:
+                    self._approx_bytes += os.path.getsize(path)
+                except OSError:
+                    pass
+            if self._approx_bytes > self.max_bytes:
+                self._prune(keep=path)
+
+    def _list_files(self):
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._list_files())
+
+    def _prune(self, keep: str):
+        """
+        按修改时间删除最旧的变体，直到降到预算的90%；刚生成的变体即将返回给请求方，不删除
+        """
+        files = sorted(self._list_files())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self._approx_bytes = total
+
+def get_disk_budget() -> VariantDiskBudget:
+    """
+    获取变体缓存的磁盘预算，懒加载模式
+
+    预算由环境变量 IMAGE_VARIANT_CACHE_MB 控制，默认1024MB
+    """
+    global _disk_budget
+    if _disk_budget is None:
+        with _disk_budget_lock:
+            if _disk_budget is None:
+                _disk_budget = VariantDiskBudget(
+                    VARIANT_DIR, int(float(os.getenv("IMAGE_VARIANT_CACHE_MB", "1024")) * 1024 * 1024))
+    return _disk_budget
+
+def _get_allowed_sizes() -> tuple:
+    global _allowed_sizes
+    if _allowed_sizes is None:
+        sizes = os.getenv("IMAGE_SIZES")
+        values = [int(value) for value in sizes.split(",") if value.strip()] if sizes else DEFAULT_SIZES
+        _allowed_sizes = tuple(sorted(value for value in set(values) if 0 < value <= MAX_DIMENSION)) or DEFAULT_SIZES
+    return _allowed_sizes
+
+def snap_size(value: Optional[int]) -> Optional[int]:
+    """
+    把请求的宽高向上取整到最近的尺寸档位，超过最大档位时取最大档位
+    """
+    if value is None:
+        return None
+    sizes = _get_allowed_sizes()
+    for size in sizes:
+        if size >= value:
+            return size
+    return sizes[-1]
+
+def _get_supported_formats() -> tuple:
+    global _supported_formats
+    if _supported_formats is None:
+        from PIL import features
+        _supported_formats = tuple(fmt for fmt in ("avif", "webp") if features.check(fmt)) + ("jpeg",)
+    return _supported_formats
+
+def negotiate_format(accept: str) -> str:
+    """
+    根据 Accept 请求头选择输出格式，优先级 AVIF > WebP > JPEG
+    """
+    accept = (accept or "").lower()
+    for fmt in _get_supported_formats():
+        if fmt == "jpeg" or f"image/{fmt}" in accept:
+            return fmt
+    return "jpeg"
+
+def build_spec(width: Optional[int], height: Optional[int], fit: str, accept: str) -> Optional[VariantSpec]:
+    """
+    解析变体参数，未指定宽高时返回None表示使用原图
+
+    Raises:
+        ValueError: 参数不合法
+    """
+    if width is None and height is None:
+        return None
+    for value in (width, height):
+        if value is not None and not 0 < value <= MAX_DIMENSION:
+            raise ValueError(f"宽高必须在1到{MAX_DIMENSION}之间")
+    if fit not in FIT_MODES:
+        raise ValueError(f"fit 只支持: {', '.join(FIT_MODES)}")
+    quality = int(os.getenv("IMAGE_QUALITY", "82"))
+    return VariantSpec(snap_size(width), snap_size(height), fit, negotiate_format(accept), quality)
+
+def render_variant(source: Union[str, bytes], dest_path: str, width: Optional[int], height: Optional[int],
+                   fit: str, fmt: str, quality: int):
+    """
+    缩放并编码图片后写入目标路径（在子进程中执行）
+
+    Args:
+        source: 源图片路径或图片数据
+        dest_path: 输出路径
+        width, height: 目标宽高，其中一个为None时按原图比例计算
+        fit: 缩放方式
+        fmt: 输出格式
+        quality: 编码质量
+    """
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    image = ImageOps.exif_transpose(image)
+    if width is None:
+        width = max(1, round(image.width * height / image.height))
+    if height is None:
+        height = max(1, round(image.height * width / image.width))
+
+    if fit == "cover":
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    elif fit == "fill":
+        image = image.resize((width, height), Image.LANCZOS)
+    else:
+        # 只缩小不放大
+        image.thumbnail((width, height), Image.LANCZOS)
+
+    if fmt == "jpeg":
+        if image.mode in ("RGBA", "LA", "P"):
+            # JPEG不支持透明通道，合成到白色背景上
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        save_kwargs = {"quality": quality, "optimize": True, "progressive": True}
+    elif fmt == "webp":
+        save_kwargs = {"quality": quality, "method": 4}
+    else:
+        save_kwargs = {"quality": quality}
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+    image.save(tmp_path, format=fmt.upper(), **save_kwargs)
+    os.replace(tmp_path, dest_path)
+
+async def get_variant(source: Union[str, bytes], source_id: str, spec: VariantSpec) -> str:
+    """
+    获取图片变体文件路径，缓存不存在时在进程池中生成
+
+    Args:
+        source: 源图片路径或图片数据
+        source_id: 源图片标识（需包含版本信息，如修改时间或ETag）
+        spec: 变体参数
+
+    Returns:
+        str: 变体文件路径
+    """
+    dest_path = spec.cache_path(source_id)
+    if os.path.exists(dest_path):
+        stats["hit"] += 1
+        return dest_path
+
+    # 合并相同变体的并发生成请求
+    stats["miss"] += 1
+    task = _inflight.get(dest_path)
+    if task is None:
+        task = asyncio.ensure_future(run_in_process(
+            render_variant, source, dest_path, spec.width, spec.height, spec.fit, spec.fmt, spec.quality
+        ))
+        _inflight[dest_path] = task
+        task.add_done_callback(lambda done: _inflight.pop(dest_path, None))
+        await asyncio.shield(task)
+        # 只由生成变体的请求计入磁盘占用
+        await run_blocking(get_disk_budget().add, dest_path)
+        return dest_path
+    await asyncio.shield(task)
+    return dest_path
+
+def file_source_id(path: str) -> str:
+    """
+    本地文件的源标识，文件变化后变体自动失效
+    """
+    stat = os.stat(path)
+    return f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
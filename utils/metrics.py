@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+运行指标采集
+
+提供 Prometheus 文本格式的计数器、增减计数和直方图。
+热路径上的写入不加锁：每个线程写入自己的分片，采集时再汇总所有分片；
+直方图使用预先定义的桶，记录一次观测只需一次二分查找和两次加法。
+队列长度、任务数量等状态类指标在采集时通过回调函数读取
+"""
+
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# 耗时类直方图的默认桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Prometheus 文本格式的内容类型
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 采集回调返回的指标族: (名称, 类型, 说明, [(标签字典, 值), ...])
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    """
+    按线程分片存储的指标基类
+    """
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        """
+        获取当前线程的分片，线程首次写入时创建（只有这一步需要加锁）
+        """
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _label_dict(self, labels: tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, labels))
+
+    def _snapshots(self) -> List[dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict.copy 在GIL下一次完成，不会与写入线程冲突
+        return [shard.copy() for shard in shards]
+
+class Counter(_Metric):
+    """
+    只增不减的计数器
+    """
+    type = "counter"
+
+    def inc(self, amount: float = 1, labels: tuple = ()):
+        """
+        增加计数
+
+        Args:
+            amount: 增加量
+            labels: 标签值，顺序与 labelnames 一致
+        """
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self) -> MetricFamily:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        samples = [(self._label_dict(labels), value) for labels, value in sorted(totals.items())]
+        return self.name, self.type, self.help, samples
+
+class Gauge(Counter):
+    """
+    可增可减的计数（如进行中的请求数），各线程的增减量在采集时相加
+    """
+    type = "gauge"
+
+    def dec(self, amount: float = 1, labels: tuple = ()):
+        """
+        减少计数
+        """
+        self.inc(-amount, labels)
+
+class Histogram(_Metric):
+    """
+    预分桶直方图
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: tuple = ()):
+        """
+        记录一次观测值
+
+        Args:
+            value: 观测值
+            labels: 标签值，顺序与 labelnames 一致
+        """
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # 每个桶的计数（最后一个为 +Inf 桶）和观测值总和
+            state = shard[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def _snapshots(self) -> List[dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [{labels: (list(state[0]), state[1]) for labels, state in shard.copy().items()} for shard in shards]
+
+    def collect(self) -> MetricFamily:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, (counts, total) in shard.items():
+                merged = totals.get(labels)
+                if merged is None:
+                    totals[labels] = [counts, total]
+                else:
+                    merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                    merged[1] += total
+        samples = []
+        for labels, (counts, total) in sorted(totals.items()):
+            base = self._label_dict(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(({**base, "le": _format_value(bound)}, cumulative, "_bucket"))
+            samples.append((base, total, "_sum"))
+            samples.append((base, cumulative, "_count"))
+        return self.name, self.type, self.help, samples
+
+class MetricsRegistry:
+    """
+    指标注册表
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # 模块重复导入时复用已有指标
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        """
+        注册采集回调，每次采集时调用，返回状态类指标
+
+        Args:
+            collector: 返回 (名称, 类型, 说明, [(标签字典, 值), ...]) 列表的函数
+        """
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def collect(self) -> List[MetricFamily]:
+        """
+        汇总所有指标
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        families = [metric.collect() for metric in metrics]
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                print(f"采集指标失败: {e}")
+        return families
+
+    def render(self) -> str:
+        """
+        生成 Prometheus 文本格式的指标数据
+        """
+        lines = []
+        for name, metric_type, help, samples in self.collect():
+            lines.append(f"# HELP {name} {_escape(help)}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for sample in samples:
+                labels, value = sample[0], sample[1]
+                suffix = sample[2] if len(sample) > 2 else ""
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# 全局指标注册表
+REGISTRY = MetricsRegistry()
+
+# 生成任务各阶段耗时：queue 排队、render 生成工作流、submit 提交到后端、wait 等待执行完成
+# （可拆分为 backend_queue 后端排队和 execute 后端执行）、download 下载输出、save 保存到本地、total 总耗时
+TASK_STAGE_SECONDS = REGISTRY.histogram(
+    "comfyapi_task_stage_seconds", "生成任务各阶段耗时（秒）", ("workflow", "stage"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+
+# 结束的任务数
+TASKS_FINISHED = REGISTRY.counter("comfyapi_tasks_finished_total", "已结束的生成任务数", ("workflow", "status"))
+
+# 访问ComfyUI后端的请求
+BACKEND_REQUEST_SECONDS = REGISTRY.histogram("comfyapi_backend_request_seconds", "ComfyUI后端请求耗时（秒）", ("endpoint",))
+BACKEND_ERRORS = REGISTRY.counter("comfyapi_backend_errors_total", "ComfyUI后端请求错误数", ("endpoint", "reason"))
+
+# 正在执行生成任务的工作线程数
+WORKERS_BUSY = REGISTRY.gauge("comfyapi_workers_busy", "正在执行生成任务的工作线程数")
+
+# 线程池中正在执行或排队的阻塞调用数
+EXECUTOR_INFLIGHT = REGISTRY.gauge("comfyapi_executor_inflight", "线程池中正在执行或排队的调用数", ("pool",))
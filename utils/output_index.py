@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+生成结果索引
+
+记录 task_id / prompt_id 到输出文件列表（URL、大小、宽高、哈希）的映射，
+在保存输出文件时写入。索引常驻内存，同时以追加写的JSON Lines文件持久化，
+查询为O(1)，且不受月份目录和服务重启的影响。
+多进程部署时各进程追加写同一个文件，查询未命中时读取其他进程追加的记录
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Optional, List, Dict, Any
+
+from utils.paths import DATA_DIR
+
+def describe_image(url: str, data: bytes) -> Dict[str, Any]:
+    """
+    生成单个输出文件的索引信息
+
+    Args:
+        url: 本地访问URL
+        data: 文件内容
+
+    Returns:
+        dict: 包含url、大小、宽高和sha256的文件信息
+    """
+    width = height = None
+    try:
+        from PIL import Image
+        from io import BytesIO
+        # 只读取图片头信息，不解码像素
+        with Image.open(BytesIO(data)) as image:
+            width, height = image.size
+    except Exception:
+        pass
+    return {
+        "url": url,
+        "size": len(data),
+        "width": width,
+        "height": height,
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+class OutputIndex:
+    """
+    输出文件索引
+    """
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._records = {}    # task_id -> 记录
+        self._by_prompt = {}  # prompt_id -> task_id
+        self._position = 0    # 已读取到的文件位置（字节）
+        self._inode = None    # 已读取的文件，被压缩替换后重新加载
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """
+        从索引文件加载记录，后写入的记录覆盖先写入的；失效记录过多时压缩文件
+        """
+        lines = self._read_new()
+        if lines > 2 * len(self._records) + 100:
+            self._compact()
+
+    def _read_new(self) -> int:
+        """
+        从上次读取的位置读取新追加的记录（包括其他进程写入的），文件被替换时重新加载
+
+        Returns:
+            int: 读取的记录行数
+        """
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return 0
+        if stat.st_ino != self._inode or stat.st_size < self._position:
+            self._records.clear()
+            self._by_prompt.clear()
+            self._position = 0
+            self._inode = stat.st_ino
+        if stat.st_size == self._position:
+            return 0
+        with open(self.index_path, "rb") as f:
+            f.seek(self._position)
+            data = f.read()
+        # 最后一行可能正在被其他进程写入，只处理完整的行
+        end = data.rfind(b"\n") + 1
+        self._position += end
+        lines = 0
+        for line in data[:end].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            lines += 1
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except ValueError:
+                continue
+            if record.get("deleted"):
+                self._forget(record["task_id"])
+            else:
+                self._remember(record)
+        return lines
+
+    def _remember(self, record: Dict[str, Any]):
+        self._records[record["task_id"]] = record
+        if record.get("prompt_id"):
+            self._by_prompt[record["prompt_id"]] = record["task_id"]
+
+    def _forget(self, task_id: str):
+        record = self._records.pop(task_id, None)
+        if record and record.get("prompt_id"):
+            self._by_prompt.pop(record["prompt_id"], None)
+
+    def _append(self, record: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _compact(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self._records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.index_path)
+        stat = os.stat(self.index_path)
+        self._position, self._inode = stat.st_size, stat.st_ino
+
+    def record(self, task_id: str, prompt_id: Optional[str], files: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        写入任务的输出文件记录
+
+        Args:
+            task_id: 任务ID
+            prompt_id: ComfyUI的prompt ID
+            files: describe_image 生成的文件信息列表
+
+        Returns:
+            dict: 索引记录
+        """
+        etag = hashlib.sha256("".join(f["sha256"] for f in files).encode("utf-8")).hexdigest()[:32]
+        record = {
+            "task_id": task_id,
+            "prompt_id": prompt_id,
+            "files": files,
+            "etag": f'"{etag}"',
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._remember(record)
+            self._append(record)
+        return record
+
+    def remove(self, task_id: str):
+        """
+        删除任务的索引记录（输出文件已被清理时调用）
+        """
+        with self._lock:
+            if task_id in self._records:
+                self._forget(task_id)
+                self._append({"task_id": task_id, "deleted": True})
+
+    def get(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        按 task_id 或 prompt_id 查询记录，未命中时读取其他进程新追加的记录后再查一次
+        """
+        record = self._lookup(id)
+        if record is None:
+            with self._lock:
+                self._read_new()
+                record = self._lookup(id)
+        return record
+
+    def _lookup(self, id: str) -> Optional[Dict[str, Any]]:
+        record = self._records.get(id)
+        if record is None:
+            task_id = self._by_prompt.get(id)
+            if task_id is not None:
+                record = self._records.get(task_id)
+        return record
+
+_output_index = None
+_output_index_lock = threading.Lock()
+
+def get_output_index() -> OutputIndex:
+    """
+    获取全局输出文件索引，懒加载模式
+    """
+    global _output_index
+    if _output_index is None:
+        with _output_index_lock:
+            if _output_index is None:
+                _output_index = OutputIndex(os.path.join(DATA_DIR, "outputs.jsonl"))
+    return _output_index
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+项目目录配置
+"""
+
+import os
+
+# 项目根目录
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 资源目录（通过 /resources 静态路由对外提供）
+RESOURCES_DIR = os.path.join(PROJECT_ROOT, "resources")
+
+# 服务内部缓存目录，不对外暴露，可通过环境变量 CACHE_DIR 指定
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(PROJECT_ROOT, "cache"))
+
+# 服务持久化数据目录（索引、数据库等），可通过环境变量 DATA_DIR 指定
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(PROJECT_ROOT, "data"))
@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+代理图片两级缓存
+
+内存中按字节预算的LRU缓存在前，磁盘缓存在后，均以URL为键。
+缓存过期后使用 If-None-Match / If-Modified-Since 向源站条件验证，
+同一URL的并发未命中请求合并为一次回源
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional, AsyncIterator, TYPE_CHECKING
+
+from utils.paths import CACHE_DIR
+from utils.executor import run_blocking
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+class ProxyFetchError(Exception):
+    """
+    回源失败，携带返回给客户端的状态码
+    """
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class CachedImage:
+    """
+    缓存的图片及其验证信息
+    """
+    def __init__(self, key: str, url: str, body: bytes, content_type: str, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, fetched_at: float = 0.0, max_age: float = 0.0):
+        self.key = key
+        self.url = url
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.max_age = max_age
+        self._body_etag = None
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    @property
+    def response_etag(self) -> str:
+        """
+        返回给客户端的ETag：优先使用源站ETag，源站未提供时使用内容哈希
+        """
+        if self.etag:
+            return self.etag
+        if self._body_etag is None:
+            self._body_etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        return self._body_etag
+
+    def is_fresh(self) -> bool:
+        return time.time() - self.fetched_at < self.max_age
+
+    def meta(self) -> dict:
+        return {
+            "url": self.url,
+            "content_type": self.content_type,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "fetched_at": self.fetched_at,
+            "max_age": self.max_age,
+        }
+
+class FetchResult:
+    """
+    一次代理请求的结果：缓存命中的图片，或过大不缓存时的流式响应
+    """
+    def __init__(self, image: Optional[CachedImage] = None, stream: Optional["httpx.Response"] = None, source: str = "miss",
+                 prefix: bytes = b"", chunks: Optional[AsyncIterator[bytes]] = None):
+        self.image = image
+        self.stream = stream
+        self.source = source  # memory, disk, revalidated, miss, bypass
+        self._prefix = prefix  # 回源时已读取的响应体开头
+        self._chunks = chunks  # 读取剩余响应体的迭代器，为None时从头读取
+        self._stream_claimed = False
+
+    async def iter_stream(self) -> AsyncIterator[bytes]:
+        """
+        逐块读取透传的响应体，包括回源时已经读取的部分
+        """
+        if self._prefix:
+            yield self._prefix
+        async for chunk in (self._chunks if self._chunks is not None else self.stream.aiter_bytes()):
+            yield chunk
+
+    def claim_stream(self) -> bool:
+        """
+        流式响应只能被一个请求消费，返回当前请求是否获得了该流
+        """
+        if self._stream_claimed:
+            return False
+        self._stream_claimed = True
+        return True
+
+class MemoryLRU:
+    """
+    按字节预算淘汰的内存LRU缓存，只在事件循环线程中访问
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, entry: CachedImage):
+        if entry.size > self.max_bytes:
+            return
+        old = self._entries.pop(entry.key, None)
+        if old is not None:
+            self.current_bytes -= old.size
+        self._entries[entry.key] = entry
+        self.current_bytes += entry.size
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.size
+
+class DiskCache:
+    """
+    磁盘缓存，每个条目保存为 <key>.bin（图片数据）和 <key>.json（元数据）
+    """
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._approx_bytes = None  # 磁盘占用估算，首次写入时统计
+
+    def _paths(self, key: str):
+        directory = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(directory, f"{key}.bin"), os.path.join(directory, f"{key}.json")
+
+    def body_path(self, key: str) -> str:
+        return self._paths(key)[0]
+
+    def load(self, key: str) -> Optional[CachedImage]:
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return CachedImage(key=key, body=body, **meta)
+
+    def store(self, entry: CachedImage, write_body: bool = True):
+        body_path, meta_path = self._paths(entry.key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        if write_body:
+            self._atomic_write(body_path, entry.body)
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_size()
+            else:
+                self._approx_bytes += entry.size
+        self._atomic_write(meta_path, json.dumps(entry.meta(), ensure_ascii=False).encode("utf-8"))
+        if self._approx_bytes is not None and self._approx_bytes > self.max_bytes:
+            self._prune()
+
+    def _atomic_write(self, path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _list_bodies(self):
+        bodies = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".bin"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    bodies.append((stat.st_mtime, stat.st_size, path))
+        return bodies
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._list_bodies())
+
+    def _prune(self):
+        """
+        超出磁盘预算时按修改时间删除最旧的条目，直到降到预算的90%
+        """
+        bodies = sorted(self._list_bodies())
+        total = sum(size for _, size, _ in bodies)
+        target = self.max_bytes * 0.9
+        for _, size, path in bodies:
+            if total <= target:
+                break
+            for remove_path in (path, path[:-4] + ".json"):
+                try:
+                    os.remove(remove_path)
+                except OSError:
+                    pass
+            total -= size
+        self._approx_bytes = total
+
+class ProxyImageCache:
+    """
+    代理图片两级缓存
+    """
+    def __init__(self, memory_bytes: int, disk_dir: str, disk_bytes: int, max_entry_bytes: int, default_ttl: float):
+        self.memory = MemoryLRU(memory_bytes)
+        self.disk = DiskCache(disk_dir, disk_bytes)
+        self.max_entry_bytes = max_entry_bytes
+        self.default_ttl = default_ttl
+        self._inflight = {}
+        self.stats = {"memory": 0, "disk": 0, "revalidated": 0, "miss": 0, "bypass": 0}
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    async def fetch(self, url: str, client: "httpx.AsyncClient", headers: dict) -> FetchResult:
+        """
+        获取图片：依次查询内存缓存、磁盘缓存，未命中或过期时回源
+
+        Args:
+            url: 图片URL
+            client: 共享的异步HTTP客户端
+            headers: 回源请求头
+
+        Returns:
+            FetchResult: 获取结果
+        """
+        key = self.make_key(url)
+        entry = self.memory.get(key)
+        source = "memory"
+        if entry is None:
+            entry = await run_blocking(self.disk.load, key)
+            source = "disk"
+            if entry is not None:
+                self.memory.put(entry)
+        if entry is not None and entry.is_fresh():
+            self.stats[source] += 1
+            return FetchResult(image=entry, source=source)
+
+        # 合并同一URL的并发回源请求：回源在独立任务中执行，
+        # 发起请求的客户端断开连接不会影响其他等待者
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(key, url, entry, client, headers))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key, None) if self._inflight.get(key) is done else None)
+        result = await asyncio.shield(task)
+        if result.stream is not None and not result.claim_stream():
+            # 过大不缓存的图片无法共享流，单独回源
+            return await self._refresh(key, url, None, client, headers)
+        return result
+
+    async def _refresh(self, key: str, url: str, entry: Optional[CachedImage], client: "httpx.AsyncClient", headers: dict) -> FetchResult:
+        """
+        回源获取图片，有缓存时发送条件请求
+        """
+        import httpx
+        request_headers = dict(headers)
+        if entry is not None:
+            if entry.etag:
+                request_headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request_headers["If-Modified-Since"] = entry.last_modified
+        try:
+            response = await client.send(client.build_request("GET", url, headers=request_headers), stream=True)
+        except httpx.RequestError as e:
+            raise ProxyFetchError(500, f"请求远程图片失败: {str(e)}")
+
+        try:
+            max_age = self._parse_max_age(response.headers.get("cache-control", ""))
+            if response.status_code == 304 and entry is not None:
+                # 源站确认未修改，只刷新元数据
+                entry.fetched_at = time.time()
+                entry.max_age = max_age if max_age is not None else self.default_ttl
+                entry.etag = response.headers.get("etag", entry.etag)
+                entry.last_modified = response.headers.get("last-modified", entry.last_modified)
+                await response.aclose()
+                self.memory.put(entry)
+                await run_blocking(self.disk.store, entry, False)
+                self.stats["revalidated"] += 1
+                return FetchResult(image=entry, source="revalidated")
+
+            if response.status_code >= 400:
+                raise ProxyFetchError(response.status_code, f"获取远程图片失败: {response.status_code}")
+            content_type = response.headers.get("content-type", "")
+            if not content_type.startswith("image/"):
+                raise ProxyFetchError(400, "URL不是有效的图片资源")
+
+            content_length = response.headers.get("content-length")
+            if content_length is not None and int(content_length) > self.max_entry_bytes:
+                # 过大的图片不缓存，直接流式透传
+                self.stats["bypass"] += 1
+                return FetchResult(stream=response, source="bypass")
+
+            # 没有Content-Length（分块传输）时边读边检查大小，超过上限后不再缓存，
+            # 已读取的部分和剩余部分一起透传，不把整个响应体读入内存
+            chunks = response.aiter_bytes()
+            parts, size = [], 0
+            async for chunk in chunks:
+                parts.append(chunk)
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    self.stats["bypass"] += 1
+                    return FetchResult(stream=response, source="bypass", prefix=b"".join(parts), chunks=chunks)
+            body = b"".join(parts)
+        except BaseException:
+            await response.aclose()
+            raise
+        await response.aclose()
+
+        image = CachedImage(
+            key=key,
+            url=url,
+            body=body,
+            content_type=content_type,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            fetched_at=time.time(),
+            max_age=max_age if max_age is not None else self.default_ttl,
+        )
+        self.stats["miss"] += 1
+        if "no-store" not in response.headers.get("cache-control", "") and image.size <= self.max_entry_bytes:
+            self.memory.put(image)
+            try:
+                await run_blocking(self.disk.store, image)
+            except OSError as e:
+                logger.warning(f"写入代理图片磁盘缓存失败: {e}")
+        return FetchResult(image=image, source="miss")
+
+    @staticmethod
+    def _parse_max_age(cache_control: str) -> Optional[float]:
+        if "no-cache" in cache_control:
+            return 0.0
+        match = re.search(r"max-age=(\d+)", cache_control)
+        return float(match.group(1)) if match else None
+
+_proxy_cache = None
+
+def get_proxy_cache() -> ProxyImageCache:
+    """
+    获取全局代理图片缓存，懒加载模式
+
+    通过环境变量配置：
+        PROXY_CACHE_MEMORY_MB: 内存缓存预算，默认64MB
+        PROXY_CACHE_DISK_MB: 磁盘缓存预算，默认1024MB
+        PROXY_CACHE_MAX_ENTRY_MB: 单张图片缓存上限，默认8MB，超过时直接透传
+        PROXY_CACHE_TTL: 源站未指定max-age时的缓存有效期（秒），默认3600
+    """
+    global _proxy_cache
+    if _proxy_cache is None:
+        mb = 1024 * 1024
+        _proxy_cache = ProxyImageCache(
+            memory_bytes=int(float(os.getenv("PROXY_CACHE_MEMORY_MB", "64")) * mb),
+            disk_dir=os.path.join(CACHE_DIR, "proxy"),
+            disk_bytes=int(float(os.getenv("PROXY_CACHE_DISK_MB", "1024")) * mb),
+            max_entry_bytes=int(float(os.getenv("PROXY_CACHE_MAX_ENTRY_MB", "8")) * mb),
+            default_ttl=float(os.getenv("PROXY_CACHE_TTL", "3600")),
+        )
+    return _proxy_cache
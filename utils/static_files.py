@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+静态文件服务
+
+在 StaticFiles 基础上增加：
+- 文本类资源预压缩（gzip，安装 brotli 时同时生成 br），按 Accept-Encoding 协商返回
+- 基于内容哈希的强ETag和条件请求（304）
+- 按路径设置缓存策略，生成的输出文件使用 immutable 长缓存
+Range 请求由 FileResponse 处理，带 Range 的请求始终返回未压缩的原始文件
+"""
+
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from typing import Optional, Dict, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 生成的输出文件路径中包含任务ID，内容不会再变化
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 普通静态资源每次使用前向服务器验证，未变化时返回304
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# 需要预压缩的内容类型
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+
+# 小于该大小的文件不压缩
+MIN_COMPRESS_SIZE = 512
+
+class CompressedEntry:
+    """
+    预压缩的文件内容
+    """
+    def __init__(self, signature: Tuple[int, int], etag: str, content_type: str, encodings: Dict[str, bytes]):
+        self.signature = signature
+        self.etag = etag
+        self.content_type = content_type
+        self.encodings = encodings
+
+def negotiate_encoding(accept_encoding: str, available) -> Optional[str]:
+    """
+    根据 Accept-Encoding 选择压缩格式，优先 br
+
+    Args:
+        accept_encoding: 请求头 Accept-Encoding
+        available: 可用的压缩格式
+
+    Returns:
+        str: 选中的压缩格式，都不支持时返回None
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def is_not_modified(request_headers: Headers, etag: str) -> bool:
+    """
+    判断 If-None-Match 是否命中
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in [tag.strip(" W/") for tag in if_none_match.split(",")]
+
+def conditional_file_response(path: str, request_headers: Headers, media_type: Optional[str] = None,
+                              cache_control: str = IMMUTABLE_CACHE_CONTROL, headers: Optional[dict] = None) -> Response:
+    """
+    返回支持条件请求和Range的文件响应
+
+    Args:
+        path: 文件路径
+        request_headers: 请求头
+        media_type: 内容类型
+        cache_control: 缓存策略
+        headers: 额外响应头
+    """
+    response_headers = {"Cache-Control": cache_control}
+    if headers:
+        response_headers.update(headers)
+    response = FileResponse(path, media_type=media_type, headers=response_headers, stat_result=os.stat(path))
+    if is_not_modified(request_headers, response.headers["etag"]):
+        return NotModifiedResponse(response.headers)
+    return response
+
+class CachedStaticFiles(StaticFiles):
+    """
+    带预压缩、强ETag和缓存策略的静态文件服务
+    """
+    def __init__(self, *args, precompress: bool = False, immutable_prefixes: Tuple[str, ...] = (), **kwargs):
+        """
+        Args:
+            precompress: 是否预压缩文本类资源
+            immutable_prefixes: 使用 immutable 长缓存的相对路径前缀
+        """
+        super().__init__(*args, **kwargs)
+        self.precompress_enabled = precompress
+        self.immutable_prefixes = tuple(os.path.normpath(prefix) + os.sep for prefix in immutable_prefixes)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def precompress(self) -> int:
+        """
+        预压缩目录下所有文本类资源（启动时调用）
+
+        Returns:
+            int: 预压缩的文件数
+        """
+        count = 0
+        if not self.precompress_enabled or self.directory is None:
+            return count
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.realpath(os.path.join(root, name))
+                try:
+                    if self._get_entry(path, os.stat(path)) is not None:
+                        count += 1
+                except OSError:
+                    continue
+        return count
+
+    def _get_entry(self, full_path: str, stat_result: os.stat_result) -> Optional[CompressedEntry]:
+        """
+        获取文件的预压缩内容，文件变化后重新生成
+        """
+        content_type = mimetypes.guess_type(full_path)[0] or ""
+        if not content_type.startswith(COMPRESSIBLE_TYPES) or stat_result.st_size < MIN_COMPRESS_SIZE:
+            return None
+        signature = (stat_result.st_mtime_ns, stat_result.st_size)
+        entry = self._entries.get(full_path)
+        if entry is not None and entry.signature == signature:
+            return entry
+        with open(full_path, "rb") as f:
+            data = f.read()
+        encodings = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            encodings["br"] = brotli.compress(data, quality=11)
+        etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+        entry = CompressedEntry(signature, etag, content_type, encodings)
+        with self._lock:
+            self._entries[full_path] = entry
+        return entry
+
+    def _cache_control(self, full_path: str) -> str:
+        if self.directory is not None and self.immutable_prefixes:
+            relative = os.path.relpath(full_path, os.path.realpath(self.directory))
+            if relative.startswith(self.immutable_prefixes):
+                return IMMUTABLE_CACHE_CONTROL
+        return REVALIDATE_CACHE_CONTROL
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {"Cache-Control": self._cache_control(str(full_path))}
+        entry = None
+        if self.precompress_enabled and status_code == 200:
+            # 首次访问时才压缩的文件会在事件循环中读取，启动时预压缩可以避免这种情况
+            entry = self._get_entry(str(full_path), stat_result)
+        if entry is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+            if self.is_not_modified(response.headers, request_headers):
+                return NotModifiedResponse(response.headers)
+            return response
+
+        headers["ETag"] = entry.etag
+        headers["Vary"] = "Accept-Encoding"
+        if is_not_modified(request_headers, entry.etag):
+            return NotModifiedResponse(Headers(headers=headers))
+        encoding = None
+        if "range" not in request_headers:
+            encoding = negotiate_encoding(request_headers.get("accept-encoding", ""), entry.encodings)
+        if encoding is None:
+            return FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(entry.encodings[encoding], status_code=status_code, media_type=entry.content_type, headers=headers)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+耗时统计
+
+按分组（如工作流模板）和名称（如任务阶段）保存最近的耗时样本，
+用于查询平均值和分位数。每组只保留固定数量的样本，内存占用有上限
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+class LatencyStats:
+    """
+    分组耗时统计
+    """
+    def __init__(self, max_samples: int = 1000):
+        """
+        Args:
+            max_samples: 每个 (分组, 名称) 保留的最近样本数
+        """
+        self.max_samples = max_samples
+        self._samples = {}  # (分组, 名称) -> deque
+        self._counts = {}   # (分组, 名称) -> 累计样本数
+        self._lock = threading.Lock()
+
+    def record(self, group: str, name: str, seconds: float):
+        """
+        记录一个耗时样本
+        """
+        key = (group, name)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.max_samples)
+            samples.append(seconds)
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    @staticmethod
+    def _percentile(values, p: float) -> float:
+        index = min(len(values) - 1, int(len(values) * p / 100))
+        return values[index]
+
+    def summary(self, group: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        汇总统计结果
+
+        Args:
+            group: 只返回指定分组，为None时返回全部
+
+        Returns:
+            dict: 分组 -> 名称 -> {count, mean, p50, p95, p99, max}，
+                count 为累计样本数，其余基于最近的样本计算
+        """
+        with self._lock:
+            items = [(key, list(samples), self._counts[key]) for key, samples in self._samples.items()
+                     if group is None or key[0] == group]
+        result = {}
+        for (group_name, name), samples, count in sorted(items):
+            samples.sort()
+            result.setdefault(group_name, {})[name] = {
+                "count": count,
+                "mean": round(sum(samples) / len(samples), 4),
+                "p50": round(self._percentile(samples, 50), 4),
+                "p95": round(self._percentile(samples, 95), 4),
+                "p99": round(self._percentile(samples, 99), 4),
+                "max": round(samples[-1], 4),
+            }
+        return result
+
+_stage_stats = None
+_node_stats = None
+_stats_lock = threading.Lock()
+
+def get_stage_stats() -> LatencyStats:
+    """
+    获取全局任务阶段耗时统计（按工作流分组），懒加载模式
+
+    每组保留的样本数由环境变量 STATS_MAX_SAMPLES 控制，默认1000
+    """
+    global _stage_stats
+    if _stage_stats is None:
+        with _stats_lock:
+            if _stage_stats is None:
+                _stage_stats = LatencyStats(max_samples=int(os.getenv("STATS_MAX_SAMPLES", "1000")))
+    return _stage_stats
+
+def get_node_stats() -> LatencyStats:
+    """
+    获取全局节点执行耗时统计（按工作流分组，名称为节点ID），懒加载模式
+    """
+    global _node_stats
+    if _node_stats is None:
+        with _stats_lock:
+            if _node_stats is None:
+                _node_stats = LatencyStats(max_samples=int(os.getenv("STATS_MAX_SAMPLES", "1000")))
+    return _node_stats
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+流式ZIP打包
+
+边读文件边生成ZIP数据，不在内存或临时文件中构建整个压缩包。
+图片本身已压缩，使用STORE模式（不压缩）打包；
+输出流不可回写，文件的CRC和大小写在每个文件数据之后的数据描述符中
+"""
+
+import io
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+class _ChunkWriter(io.RawIOBase):
+    """
+    不可回写的输出流，暂存写入的数据块，由生成器及时取走
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b"".join(chunks)
+
+def iter_zip(entries: Iterable[Tuple[str, str]], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    逐块生成ZIP数据
+
+    Args:
+        entries: (压缩包内文件名, 文件路径) 列表，打包时已不存在的文件会被跳过
+        chunk_size: 每次读取的字节数
+
+    Returns:
+        Iterator[bytes]: ZIP数据块，内存占用与文件数量和大小无关
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in entries:
+            try:
+                src = open(path, "rb")
+            except OSError:
+                continue
+            with src:
+                # 按实际文件大小决定是否使用ZIP64，修改时间取自文件
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                info.compress_type = zipfile.ZIP_STORED
+                with archive.open(info, mode="w") as dest:
+                    while True:
+                        chunk = src.read(chunk_size)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        yield from writer.drain()
+            yield from writer.drain()
+    # 中央目录在关闭压缩包时写入
+    yield from writer.drain()